@@ -0,0 +1,221 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the IVFIndex class, an approximate nearest-neighbour index over the
+(standardized and normalized) numerical traits of all the songs in a MusicGraph. It lets
+MusicGraph recommend songs from the whole catalogue, not only songs that share a playlist with
+the input song.
+
+The index is an inverted file (IVF): the trait vectors are partitioned into lists by spherical
+k-means clustering, and a query only compares the input vector with the members of the n_probe
+lists whose centroids are most similar to it. Everything is done with NumPy.
+
+This module also contains recall_latency_report, which compares the index with a brute-force
+search. Running this module prints that report for the songs in the data directory.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import math
+import time
+from typing import Optional
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+
+# The default number of lists a query looks at.
+DEFAULT_N_PROBE = 8
+
+# The number of k-means iterations used to find the centroids of the lists.
+KMEANS_ITERATIONS = 10
+
+# The number of vectors per list that are sampled to train the centroids.
+KMEANS_SAMPLES_PER_LIST = 64
+
+# The number of vectors assigned to their lists at once, which bounds the memory used while building.
+ASSIGN_BATCH_SIZE = 65536
+
+
+# @check_contracts
+class IVFIndex:
+    """An inverted file index for finding the vectors with the highest cosine similarity to a query.
+
+    Representation Invariants:
+        - self._list_indptr[0] == 0 and self._list_indptr[-1] == len(self._vectors)
+        - sorted(self._list_members.tolist()) == list(range(len(self._vectors)))
+    """
+    # Private Instance Attributes:
+    #     - _vectors:
+    #         The indexed vectors (each of length 1), one per row.
+    #     - _centroids:
+    #         The centroid (of length 1) of each list, one per row.
+    #     - _list_indptr, _list_members:
+    #         The rows of _vectors in list p are _list_members[_list_indptr[p]:_list_indptr[p + 1]].
+    _vectors: numpy.ndarray
+    _centroids: numpy.ndarray
+    _list_indptr: numpy.ndarray
+    _list_members: numpy.ndarray
+
+    def __init__(self, vectors: numpy.ndarray, n_lists: Optional[int] = None, seed: int = 0) -> None:
+        """Initialize an index of the rows of vectors, partitioned into n_lists lists.
+
+        If n_lists is None, about the square root of the number of vectors is used. The centroids are
+        found by spherical k-means on a random sample of the vectors, so the index is deterministic
+        for a given seed.
+
+        Preconditions:
+            - every row of vectors has length 1
+            - n_lists is None or n_lists >= 1
+        """
+        n = len(vectors)
+        if n_lists is None:
+            n_lists = max(1, round(math.sqrt(n)))
+        n_lists = max(1, min(n_lists, n))
+
+        self._vectors = vectors
+        self._centroids = _train_centroids(vectors, n_lists, numpy.random.default_rng(seed))
+
+        assignments = numpy.empty(n, dtype=numpy.int64)
+        for start in range(0, n, ASSIGN_BATCH_SIZE):
+            batch = numpy.asarray(vectors[start:start + ASSIGN_BATCH_SIZE], dtype=numpy.float32)
+            assignments[start:start + len(batch)] = numpy.argmax(batch @ self._centroids.T, axis=1)
+
+        self._list_members = numpy.argsort(assignments, kind='stable').astype(numpy.int32)
+        self._list_indptr = numpy.zeros(len(self._centroids) + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(assignments, minlength=len(self._centroids)), out=self._list_indptr[1:])
+
+    def search(self, query: numpy.ndarray, k: int, n_probe: int = DEFAULT_N_PROBE,
+               exclude: Optional[int] = None) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the rows of (about) the k indexed vectors with the highest cosine similarity to
+        query, and those similarities, best first.
+
+        Only the members of the n_probe lists with the centroids most similar to query are compared
+        with it. The row exclude (usually the row of the query itself) is never returned.
+
+        Preconditions:
+            - query has length 1
+            - k >= 0 and n_probe >= 1
+        """
+        query = numpy.asarray(query, dtype=numpy.float32)
+        n_probe = min(n_probe, len(self._centroids))
+        probes = numpy.argpartition(-(self._centroids @ query), n_probe - 1)[:n_probe]
+
+        candidates = numpy.concatenate([self._list_members[self._list_indptr[p]:self._list_indptr[p + 1]]
+                                        for p in probes.tolist()])
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        return _top_k(candidates, self._vectors[candidates] @ query, k)
+
+
+# @check_contracts
+def brute_force_search(vectors: numpy.ndarray, query: numpy.ndarray, k: int,
+                       exclude: Optional[int] = None) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Return the rows of the k vectors with the highest cosine similarity to query, and those
+    similarities, best first, by comparing query with every vector. The row exclude is never returned.
+
+    Preconditions:
+        - every row of vectors and query have length 1
+        - k >= 0
+    """
+    candidates = numpy.arange(len(vectors))
+    if exclude is not None:
+        candidates = candidates[candidates != exclude]
+    return _top_k(candidates, numpy.asarray(vectors)[candidates] @ numpy.asarray(query, dtype=numpy.float32), k)
+
+
+# @check_contracts
+def recall_latency_report(vectors: numpy.ndarray, k: int = 50, n_queries: int = 200,
+                          probes: tuple[int, ...] = (1, 2, 4, 8, 16, 32), seed: int = 0) -> list[dict]:
+    """Return a report comparing IVFIndex searches with brute-force searches of vectors.
+
+    n_queries random rows of vectors are used as queries (each excluding itself). The report has
+    one row per n_probe value in probes, with the recall of the index (the fraction of the true top k
+    that it returned) and the mean search time of the index and of brute force, in milliseconds.
+
+    Preconditions:
+        - every row of vectors has length 1
+        - len(vectors) > 1
+    """
+    rng = numpy.random.default_rng(seed)
+    queries = rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False).tolist()
+    index = IVFIndex(vectors, seed=seed)
+
+    start = time.perf_counter()
+    truth = [set(brute_force_search(vectors, vectors[q], k, exclude=q)[0].tolist()) for q in queries]
+    brute_force_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = []
+    for n_probe in probes:
+        start = time.perf_counter()
+        found = [index.search(vectors[q], k, n_probe, exclude=q)[0] for q in queries]
+        index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        hits = sum(len(truth[i].intersection(found[i].tolist())) for i in range(len(queries)))
+        report.append({
+            'n_probe': n_probe,
+            'recall': hits / sum(len(t) for t in truth),
+            'index_ms': index_ms,
+            'brute_force_ms': brute_force_ms
+        })
+
+    return report
+
+
+# @check_contracts
+def _train_centroids(vectors: numpy.ndarray, n_lists: int, rng: numpy.random.Generator) -> numpy.ndarray:
+    """Return n_lists centroids (of length 1) for vectors, found with spherical k-means on a random sample.
+
+    A centroid that ends up with no sampled vectors keeps its previous position.
+    """
+    sample_size = min(len(vectors), n_lists * KMEANS_SAMPLES_PER_LIST)
+    sample = numpy.asarray(vectors[numpy.sort(rng.choice(len(vectors), sample_size, replace=False))],
+                           dtype=numpy.float32)
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)]
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = numpy.argmax(sample @ centroids.T, axis=1)
+        sums = numpy.zeros_like(centroids)
+        numpy.add.at(sums, assignments, sample)
+        lengths = numpy.linalg.norm(sums, axis=1)
+        moved = lengths > 0
+        centroids[moved] = sums[moved] / lengths[moved, None]
+
+    return centroids
+
+
+# @check_contracts
+def _top_k(candidates: numpy.ndarray, similarities: numpy.ndarray, k: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Return the k candidates with the highest similarities, and those similarities, best first."""
+    if k < len(candidates):
+        best = numpy.argpartition(-similarities, k)[:k]
+        candidates, similarities = candidates[best], similarities[best]
+
+    order = numpy.argsort(-similarities, kind='stable')
+    return candidates[order], similarities[order]
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    from build_music_graph import build_music_graph
+
+    music_graph = build_music_graph('data')
+    for row in recall_latency_report(music_graph.get_all_traits()):
+        print(f"n_probe={row['n_probe']:>3}  recall={row['recall']:.3f}  "
+              f"index={row['index_ms']:.3f} ms  brute force={row['brute_force_ms']:.3f} ms")
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['math', 'time', 'typing', 'numpy', 'build_music_graph'],
+        'allowed-io': [],
+        'max-line-length': 120
+    })
@@ -0,0 +1,244 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains a benchmark of the hot paths of MusicMapper: building a MusicGraph, looking
+up songs and recommending songs, on a synthetic data set (see synthetic_data) of a given size.
+
+The build is a build_music_graph call, whose stages are timed on their own by a BuildStats (see
+build_stats.STAGES), followed by the first query, which builds the neighbour index. The lookups
+are timed per call: get_spotify_id, building the Song and Edge views of MusicGraph.__getitem__,
+and get_recommendations with its cache turned off. The peak resident set size of the process is
+recorded too.
+
+Running this module with command-line arguments runs the benchmark and prints the results
+(without arguments, it runs the doctests and python_ta). Given --baseline, it also compares
+them with a JSON file of earlier results, and exits with status 1 if any metric is worse than the
+baseline by more than the threshold; with --save, it writes the results to that file instead.
+For example:
+
+    python benchmark.py --playlists 40 --size 100 --baseline bench_baseline.json --save
+    python benchmark.py --playlists 40 --size 100 --baseline bench_baseline.json
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+from build_music_graph import build_music_graph, get_folders
+from build_stats import BuildStats
+from dataset_check import read_song_ids
+from music_graph import EDGE_STORAGE, MusicGraph
+from synthetic_data import generate_dataset
+
+# The default fraction by which a metric may be worse than the baseline before it counts as a regression.
+DEFAULT_THRESHOLD = 0.2
+
+# The number of songs looked up and recommended for by default.
+DEFAULT_NUM_QUERIES = 1000
+
+
+# @check_contracts
+def run_benchmark(data_dir: str, num_queries: int = DEFAULT_NUM_QUERIES, num_recs: int = 10,
+                  repeats: int = 3, seed: int = 0) -> dict[str, float]:
+    """Return the results of benchmarking a build of the data directory data_dir and lookups in
+    the built graph, as a dictionary from the name of each metric to its value.
+
+    The build is timed stage by stage (in seconds) and the lookups per call (in microseconds), for
+    num_queries random songs, asking for num_recs recommendations. Every time is the best of
+    repeats runs. 'graph_bytes_per_song' and 'view_bytes_per_song' are the memory used per song
+    by a loaded MusicGraph and by the Song views returned by MusicGraph.__getitem__ (see
+    _measure_song_memory), and 'peak_rss_mb' is the peak resident set size of this process so far.
+
+    Preconditions:
+        - data_dir is a data directory that build_music_graph can read
+        - num_queries >= 1 and num_recs >= 0 and repeats >= 1
+    """
+    all_ids = list(dict.fromkeys(song_id for paths in get_folders(data_dir).values() for path in paths
+                                 for song_id in read_song_ids(path)))
+    results = {}
+    for _ in range(repeats):
+        music_graph, build_times = _time_build(data_dir, all_ids[0])
+        for name, seconds in build_times.items():
+            results[name] = min(results.get(name, float('inf')), seconds)
+
+    rng = numpy.random.default_rng(seed)
+    song_ids = rng.choice(all_ids, num_queries).tolist()
+    songs = [music_graph[song_id] for song_id in song_ids]
+    names = [(song.track_name, song.artist_names[0]) for song in songs]
+    music_graph.set_cache_limits(0)
+
+    lookups = {
+        'get_spotify_id_us': lambda: [music_graph.get_spotify_id(*name) for name in names],
+        'song_view_us': lambda: [music_graph[song_id] for song_id in song_ids],
+        'get_recommendations_us': lambda: [music_graph.get_recommendations(song_id, num_recs) for song_id in song_ids]
+    }
+    for name, lookup in lookups.items():
+        results[name] = _best_time(lookup, repeats) * 1e6 / num_queries
+
+    results['songs'] = len(music_graph.get_all_traits())
+    if music_graph.storage == EDGE_STORAGE:
+        results['edges'] = music_graph.get_num_edges()
+    results.update(_measure_song_memory(music_graph, song_ids))
+    results['peak_rss_mb'] = _get_peak_rss_mb()
+    return results
+
+
+# @check_contracts
+def compare_to_baseline(results: dict[str, float], baseline: dict[str, float],
+                        threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Return a description of every metric in results that is worse than in baseline by more than
+    the fraction threshold. Every metric is better when it is lower, except the sizes of the graph,
+    which are not compared.
+
+    >>> compare_to_baseline({'build_total_s': 1.5, 'songs': 20}, {'build_total_s': 1.0, 'songs': 10})
+    ['build_total_s: 1.5 vs. 1 in the baseline (+50%)']
+    >>> compare_to_baseline({'build_total_s': 1.1}, {'build_total_s': 1.0})
+    []
+    """
+    regressions = []
+    for name, value in results.items():
+        if name in ('songs', 'edges') or name not in baseline or baseline[name] <= 0:
+            continue
+        change = value / baseline[name] - 1
+        if change > threshold:
+            regressions.append(f'{name}: {value:.4g} vs. {baseline[name]:.4g} in the baseline ({change:+.0%})')
+    return regressions
+
+
+# @check_contracts
+def _time_build(data_dir: str, song_id: str) -> tuple[MusicGraph, dict[str, float]]:
+    """Build a MusicGraph of data_dir with build_music_graph, and return it along with the number of
+    seconds spent in each stage of the build (see build_stats.STAGES), in the whole build, and in
+    building the neighbour index for a first query about the song with the given song_id after it.
+
+    Preconditions:
+        - song_id is the Spotify ID of a song in data_dir
+    """
+    stats = BuildStats()
+    start = time.perf_counter()
+    music_graph = build_music_graph(data_dir, stats=stats)
+    times = {'build_total_s': time.perf_counter() - start}
+    times.update((f'{stage}_s', seconds) for stage, seconds in stats.stage_seconds.items())
+
+    start = time.perf_counter()
+    music_graph.get_recommendations(song_id, 1)
+    times['neighbour_index_s'] = time.perf_counter() - start
+    return music_graph, times
+
+
+# @check_contracts
+def _measure_song_memory(music_graph: MusicGraph, song_ids: list[str]) -> dict[str, float]:
+    """Return the number of bytes allocated per song by loading a copy of music_graph with
+    MusicGraph.from_arrays (not counting the arrays themselves, which a snapshot memory-maps), and
+    per Song view (including its edges) created by looking up the songs with the given song_ids."""
+    arrays = music_graph.to_arrays()
+    tracemalloc.start()
+    try:
+        loaded = MusicGraph.from_arrays(arrays)
+        graph_bytes = tracemalloc.get_traced_memory()[0]
+        songs = [loaded[song_id] for song_id in song_ids]
+        view_bytes = tracemalloc.get_traced_memory()[0] - graph_bytes
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'graph_bytes_per_song': graph_bytes / len(music_graph.get_all_traits()),
+        'view_bytes_per_song': view_bytes / sum(1 + len(song.edges) for song in songs)
+    }
+
+
+# @check_contracts
+def _best_time(function: Callable[[], object], repeats: int) -> float:
+    """Return the least number of seconds that a call to function took, out of repeats calls."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# @check_contracts
+def _get_peak_rss_mb() -> float:
+    """Return the peak resident set size of this process so far, in megabytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+# @check_contracts
+def main(argv: list[str]) -> int:
+    """Run the benchmark with the command-line arguments argv, print the results, and return the
+    exit status: 1 if there are regressions, and 0 otherwise."""
+    parser = argparse.ArgumentParser(description='Benchmark building and querying a MusicGraph.')
+    parser.add_argument('--genres', type=int, default=5, help='number of genre subfolders')
+    parser.add_argument('--playlists', type=int, default=20, help='number of playlists per genre')
+    parser.add_argument('--size', type=int, default=100, help='number of songs per playlist')
+    parser.add_argument('--overlap', type=float, default=0.2, help='fraction of songs shared between genres')
+    parser.add_argument('--queries', type=int, default=DEFAULT_NUM_QUERIES, help='number of songs looked up')
+    parser.add_argument('--repeats', type=int, default=3, help='number of runs each time is the best of')
+    parser.add_argument('--baseline', help='JSON file of baseline results')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='fraction by which a metric may be worse than the baseline')
+    args = parser.parse_args(argv)
+
+    dataset = {'genres': args.genres, 'playlists': args.playlists, 'size': args.size, 'overlap': args.overlap}
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate_dataset(data_dir, args.genres, args.playlists, args.size, args.overlap)
+        results = run_benchmark(data_dir, args.queries, repeats=args.repeats)
+
+    for name, value in results.items():
+        print(f'{name:>24}  {value:.4g}')
+
+    if args.baseline is None:
+        return 0
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf8') as f:
+            json.dump({'dataset': dataset, 'results': results}, f, indent=2)
+        return 0
+
+    with open(args.baseline, encoding='utf8') as f:
+        baseline = json.load(f)
+    if baseline['dataset'] != dataset:
+        print(f'The baseline is for a different data set: {baseline["dataset"]}')
+        return 1
+
+    regressions = compare_to_baseline(results, baseline['results'], args.threshold)
+    for regression in regressions:
+        print(f'Regression in {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    # with command-line arguments, run the benchmark; without, check this module like every other one
+    if len(sys.argv) > 1:
+        sys.exit(main(sys.argv[1:]))
+
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['argparse', 'json', 'resource', 'sys', 'tempfile', 'time', 'tracemalloc', 'typing', 'numpy',
+                          'build_music_graph', 'build_stats', 'dataset_check', 'music_graph', 'synthetic_data'],
+        'allowed-io': ['main'],
+        'max-line-length': 120
+    })
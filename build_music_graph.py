@@ -41,146 +41,676 @@ This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu
 from __future__ import annotations
 
 from glob import glob
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional, Union
 import os
-import csv
+import hashlib
+import sys
 import numpy
-from sklearn.preprocessing import StandardScaler
 
 # from python_ta.contracts import check_contracts
-from music_graph import MusicGraph
+from build_state import BuildState, FolderRecord, PlaylistRecord
+from build_stats import BuildStats
+from csv_ingest import PlaylistChunk, read_playlist_chunks
+from dataset_check import DisconnectedDataError, check_connectivity
+from edge_scoring import score_playlist_top_k, score_playlists
+from music_graph import EDGE_STORAGE, INCIDENCE_STORAGE, NUM_TRAITS, MusicGraph
 from music_graph_components import Song
 
+# How far the statistics checked by a validating build may be from their expected values.
+VALIDATION_TOLERANCE = 1e-4
+
+
+class GraphValidationError(ValueError):
+    """Raised by a validating build when the built MusicGraph breaks one of its invariants."""
+
 
 # @check_contracts
-def build_music_graph(data_dir: str) -> MusicGraph:
+def build_music_graph(data_dir: str, state: Optional[BuildState] = None, workers: int = 1,
+                      bad_rows: str = 'raise', max_neighbours: Optional[int] = None,
+                      min_similarity: Optional[float] = None, stats: Optional[BuildStats] = None,
+                      validate: bool = False, preflight: bool = False, storage: str = EDGE_STORAGE) -> MusicGraph:
     """
     Given a data directory, go through each subfolder in that directory and
     read the csv files under the subfolders. Use the information to create
     several new Songs, put them into a new MusicGraph, and return the new
     MusicGraph.
 
+    If state is given, the build is incremental: state must be empty or the BuildState of an
+    earlier build of data_dir. Only the CSV files that were added or whose contents changed since
+    then are read, and only the subfolders whose inputs changed are standardized and scored again.
+    The returned MusicGraph is identical to the one a full build would return, and state is
+    updated to record this build (dropping the records of deleted CSV files and subfolders).
+
+    If workers is greater than 1, a pool of that many processes reads the CSV files of each
+    subfolder and scores the edges of each subfolder's playlists. The standardization of a
+    subfolder depends on the traits written by earlier subfolders for the songs they share, so it
+    still happens in this process, one subfolder at a time and in order, while the workers read
+    and score the other subfolders. The returned MusicGraph is identical to a serial build's.
+
+    Within a subfolder, the pairs of songs of all the playlists are deduplicated together before
+    they are scored (see edge_scoring.score_playlists), so each pair is scored and added once, with
+    the number of playlists it is in (see MusicGraph.get_co_occurrences), however many playlists
+    share it.
+
+    The CSV files are read in chunks of rows (see csv_ingest), so a file is never held in memory
+    as text. Unless the build has a state or workers, the songs of each chunk are added to the graph
+    before the next chunk is read, so the rows of a subfolder are never all held in memory either.
+    Rows that do not have the format described in the module header are handled according to
+    bad_rows: 'raise' raises a csv_ingest.CSVFormatError, and 'skip' leaves the row out.
+
+    If max_neighbours or min_similarity is not None, the graph is built in sparse-edge mode: only
+    the edges with a similarity score of at least min_similarity that are among the max_neighbours
+    best edges of at least one of their songs are kept. Each playlist is first scored with
+    score_playlist_top_k, so the edges that cannot be among a song's best are never stored, and the
+    merged graph is then pruned with MusicGraph.prune_edges, since a song's best edges over all its
+    playlists are only known at the end. A pair of songs that already shared a playlist in an
+    earlier subfolder is left out of the later playlists, since the graph keeps the earliest edge
+    of a pair. So the best max_neighbours edges of every song are the same as in a full graph.
+
+    If validate is True, the invariants of the build are checked as it goes, with vectorized
+    checks over whole matrices: every subfolder's standardized traits must have a mean of 0 and a
+    standard deviation of 1 (or 0, for a trait that is the same for every song), every song's
+    traits must have length 1, and every edge must have a similarity score between 0 and 1. A
+    GraphValidationError is raised if one does not hold. The checks are skipped by default.
+
+    If preflight is True, the connectivity of data_dir is checked before anything is built (see
+    dataset_check.check_connectivity), and a dataset_check.DisconnectedDataError is raised if a
+    playlist is not linked to the other playlists of its subfolder by shared songs, or a subfolder
+    to the other subfolders.
+
+    If storage is music_graph.INCIDENCE_STORAGE, the returned MusicGraph only stores the playlists of
+    each subfolder, with the standardized traits of their songs, and scores their edges when they
+    are queried (see MusicGraph), so no edge is scored or stored during the build. Its
+    recommendations are the same as those of a graph with the default music_graph.EDGE_STORAGE.
+    Incidence storage cannot be combined with a state or with sparse-edge mode, which both work on
+    scored edges, and raises ValueError if it is.
+
+    If stats is given, it is filled in with statistics about the build, including the time spent
+    in each stage, and the build is profiled and its memory traced if stats asks for it (see
+    BuildStats).
+
     Preconditions:
     - data_dir and its subdirectories contain csv files of the correct format,
       as described by the module header
+    - workers >= 1
+    - bad_rows in csv_ingest.BAD_ROW_POLICIES
+    - max_neighbours is None or max_neighbours >= 1
+    - storage in music_graph.STORAGE_MODES
     """
-    music_graph = MusicGraph()
-    subdirectories = [info[0] for info in os.walk(data_dir)]
-    subdirectories = subdirectories[1:]
+    if storage == INCIDENCE_STORAGE and (state is not None or max_neighbours is not None or min_similarity is not None):
+        raise ValueError('incidence storage cannot be combined with a build state or sparse-edge mode')
+
+    stats = stats if stats is not None else BuildStats()
+    with stats.profiling():
+        if preflight:
+            with stats.stage('preflight'):
+                report = check_connectivity(get_folders(data_dir))
+            if not report.is_connected():
+                raise DisconnectedDataError(report)
+
+        music_graph = _build_music_graph(data_dir, state, workers, bad_rows, (max_neighbours, min_similarity), stats,
+                                         validate, storage)
+        if validate:
+            with stats.stage('validate'):
+                _validate_graph(music_graph)
+        return music_graph
 
-    for subdirectory in subdirectories:
-        _process_folder(subdirectory, music_graph)
+
+# @check_contracts
+def _build_music_graph(data_dir: str, state: Optional[BuildState], workers: int, bad_rows: str,
+                       edge_options: tuple[Optional[int], Optional[float]], stats: BuildStats,
+                       validate: bool, storage: str = EDGE_STORAGE) -> MusicGraph:
+    """Build and return the MusicGraph of data_dir as described in build_music_graph, given the
+    (max_neighbours, min_similarity) edge_options, filling in stats, and validating each
+    subfolder's standardization if validate is True."""
+    music_graph = MusicGraph(storage)
+    # in sparse-edge mode, maps each song to the (global) numbers of the playlists of earlier subfolders it is in
+    memberships = {} if edge_options != (None, None) else None
+    num_playlists = 0
+    previous = state if state is not None else BuildState()
+    current = BuildState() if state is not None else None
+
+    subdirectories = _get_subdirectories(data_dir)
+    folder_csv_files = [_get_folder_csv_files(subdirectory) for subdirectory in subdirectories]
+
+    with (ProcessPoolExecutor(max_workers=workers) if workers > 1 else _SerialExecutor()) as executor:
+        # only the CSV files that were modified since the previous build need to be read again, and
+        # a serial build without a state keeps no records, so it streams the files instead
+        streamed = workers == 1 and state is None
+        reads = [None if streamed else
+                 executor.submit(_read_playlists, [f for f in csv_files
+                                                   if _get_cached_playlist(f, data_dir, previous) is None],
+                                 bad_rows)
+                 for csv_files in folder_csv_files]
+
+        folders = []
+        scorings = []
+        for subdirectory, csv_files, read in zip(subdirectories, folder_csv_files, reads):
+            if read is None:
+                playlists = _stream_playlists(csv_files, bad_rows, music_graph, stats)
+            else:
+                with stats.stage('read'):
+                    records = read.result()
+                stats.files_read += len(records)
+                stats.files_reused += len(csv_files) - len(records)
+                stats.rows_read += sum(len(record.spotify_ids) for record in records)
+
+                with stats.stage('add_songs'):
+                    playlists = _add_songs(_get_playlists(csv_files, records, data_dir, previous, current),
+                                           music_graph)
+
+            folder_key = os.path.relpath(subdirectory, data_dir)
+            excluded = [_get_earlier_pairs(p, memberships) for p in playlists] if memberships is not None else None
+            with stats.stage('standardize'):
+                folder = _process_folder(playlists, music_graph, previous.folders.get(folder_key),
+                                         current is not None, edge_options, excluded, validate)
+            if current is not None:
+                current.folders[folder_key] = folder
+
+            if storage == INCIDENCE_STORAGE:
+                # the playlists must be added now, before later subfolders overwrite the traits of shared songs
+                with stats.stage('add_edges'):
+                    for playlist in playlists:
+                        music_graph.add_playlist_edges(playlist)
+                        stats.pairs += len(playlist) * (len(playlist) - 1) // 2
+                continue
+
+            # the traits must be taken now, before later subfolders overwrite those of shared songs
+            with stats.stage('score'):
+                if folder.playlist_edges is None:
+                    rows = {song_id: row for row, song_id in enumerate(folder.song_ids)}
+                    scorings.append(executor.submit(
+                        _score_playlists, music_graph.get_traits(folder.song_ids),
+                        [numpy.array([rows[song_id] for song_id in p], dtype=numpy.int64) for p in playlists],
+                        edge_options, excluded))
+                else:
+                    scorings.append(None)
+            folders.append((folder, playlists))
+
+            if memberships is not None:
+                for playlist in playlists:
+                    for song_id in set(playlist):
+                        memberships.setdefault(song_id, []).append(num_playlists)
+                    num_playlists += 1
+
+        with stats.stage('score'):
+            for (folder, _), scoring in zip(folders, scorings):
+                if scoring is not None:
+                    folder.playlist_edges = scoring.result()
+
+    with stats.stage('add_edges'):
+        for folder, playlists in folders:
+            # add the edges between all the songs of each playlist
+            for playlist, (first, second, scores, counts) in zip(playlists, folder.playlist_edges):
+                indices = music_graph.get_indices(playlist)
+                music_graph.add_edges(indices[first], indices[second], scores, counts)
+
+                pairs = len(playlist) * (len(playlist) - 1) // 2
+                stats.pairs += pairs
+                if edge_options == (None, None):
+                    stats.duplicate_pairs += pairs - len(scores)
+                else:
+                    stats.pairs_pruned += pairs - len(scores)
+                stats.edges_created += len(scores)
+
+    if storage == EDGE_STORAGE:
+        with stats.stage('merge'):
+            stats.duplicate_edges += stats.edges_created - music_graph.get_num_edges()
+
+    if edge_options != (None, None):
+        with stats.stage('prune'):
+            stats.edges_pruned += music_graph.prune_edges(*edge_options)
+    stats.songs = len(music_graph.get_all_traits())
+    if storage == EDGE_STORAGE:
+        # counting the edges of an incidence graph would score every pair of every playlist
+        stats.edges = music_graph.get_num_edges()
+
+    if state is not None:
+        state.playlists = current.playlists
+        state.folders = current.folders
 
     return music_graph
 
 
 # @check_contracts
-def _norm(v1: list[float]) -> float:
-    """Returns the norm of a vector."""
-    total = sum((item * item) for item in v1)
-    return total ** (1 / 2)
+def get_csv_files(data_dir: str) -> list[str]:
+    """Return the paths of all the CSV files that build_music_graph reads when given data_dir,
+    without duplicates.
+    """
+    csv_files = []
+    seen_so_far = set()
+    for subdirectory in _get_subdirectories(data_dir):
+        for csv_file in _get_folder_csv_files(subdirectory):
+            if csv_file not in seen_so_far:
+                seen_so_far.add(csv_file)
+                csv_files.append(csv_file)
+
+    return csv_files
+
+
+# @check_contracts
+def get_folders(data_dir: str) -> dict[str, list[str]]:
+    """Return a mapping from each subfolder of data_dir (relative to data_dir) to the paths of the
+    CSV files that build_music_graph reads for it, in the order they are built.
+    """
+    return {os.path.relpath(subdirectory, data_dir): _get_folder_csv_files(subdirectory)
+            for subdirectory in _get_subdirectories(data_dir)}
 
 
 # @check_contracts
-def _process_folder(subdirectory: str, music_graph: MusicGraph) -> None:
+def _get_subdirectories(data_dir: str) -> list[str]:
+    """Return the paths of the subfolders (at any depth) of data_dir, in the order they are processed."""
+    subdirectories = [info[0] for info in os.walk(data_dir)]
+    return subdirectories[1:]
+
+
+# @check_contracts
+def _get_folder_csv_files(subdirectory: str) -> list[str]:
+    """Return the paths of the CSV files in subdirectory and its own subfolders."""
+    return [file for path, _, _ in os.walk(subdirectory) for file in glob(os.path.join(path, '*.csv'))]
+
+
+# @check_contracts
+class _SerialExecutor:
+    """An executor that runs each submitted call in this process, when its result is first needed.
+
+    It is used in place of a ProcessPoolExecutor when build_music_graph runs without workers, so
+    that serial and parallel builds go through the same code.
     """
-    Given a subfolder in a data directory that ONLY contains CSV files of the format
-    specified in the module header, iterate through each CSV file and add it to the
-    song graph.
+    def __enter__(self) -> _SerialExecutor:
+        """Return this executor."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Do nothing, since this executor holds no resources."""
+
+    def submit(self, function: Callable, *args: Any) -> _DeferredCall:
+        """Return a future-like object whose result is function(*args)."""
+        return _DeferredCall(function, args)
+
 
-    In addition, standardize and normalize the numerical traits based on song
-    data in the FOLDER, and add edges between each song that share a PLAYLIST.
+# @check_contracts
+class _DeferredCall(Future):
+    """A Future whose result is computed by calling a function the first time it is requested."""
+    # Private Instance Attributes:
+    #     - _call: The function to call and its arguments, or None once it has been called.
+    _call: Optional[tuple[Callable, tuple]]
+
+    def __init__(self, function: Callable, args: tuple) -> None:
+        """Initialize a deferred call of function(*args)."""
+        super().__init__()
+        self._call = (function, args)
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """Return the result of the call, making it first if it has not been made yet."""
+        if self._call is not None:
+            function, args = self._call
+            self._call = None
+            self.set_result(function(*args))
+        return super().result(timeout)
+
+
+# @check_contracts
+def _process_folder(playlists: list[list[str]], music_graph: MusicGraph, cached: Optional[FolderRecord],
+                    with_digest: bool, edge_options: tuple[Optional[int], Optional[float]],
+                    excluded: Optional[list[numpy.ndarray]], validate: bool = False) -> FolderRecord:
+    """
+    Given the playlists (already added to music_graph) of a subfolder in a data
+    directory, standardize and normalize the numerical traits based on song
+    data in the FOLDER, and return the FolderRecord of the subfolder, in which
+    the edges between each song that share a PLAYLIST are still to be scored
+    (with _score_playlists) unless they can be reused from cached.
     (Note: the reasoning is that two songs might share more than one playlist
     within a genre (subfolder), but not across different subfolders. Also, bell
     shape can be assumed when operating on subfolders but not necessarily
     across different folders, so standardization works only on the subfolder
     level.)
 
+    If cached is the record of the same subfolder from the previous build and the folder's
+    standardization inputs are unchanged, its standardized traits and edges are reused instead.
+    The digest of the returned record is only computed if with_digest is True. edge_options are
+    the (max_neighbours, min_similarity) options of the build, and excluded are the pairs left out
+    of each playlist in sparse-edge mode (see _get_earlier_pairs), which the edges depend on.
+    The standardization is validated if validate is True (see _standardize_data).
+
     Preconditions:
-    - data directory only contains CSV file of the format specified in the module header
+    - all(all(song in music_graph for song in playlist) for playlist in playlists)
     """
-    csv_files = [file for path, _, _ in os.walk(
-        subdirectory) for file in glob(os.path.join(path, '*.csv'))]
+    if with_digest or cached is not None:
+        digest = _get_folder_digest(playlists, music_graph, edge_options, excluded)
+    else:
+        digest = ''
+
+    if cached is not None and cached.digest == digest:
+        # the inputs are unchanged, so the standardized traits and edges would be too
+        music_graph.set_traits(cached.song_ids, cached.numerical_traits)
+        return cached
+
+    # process data
+    _standardize_data(playlists, music_graph, validate)
+
+    song_ids = list(dict.fromkeys(song_id for playlist in playlists for song_id in playlist))
+    return FolderRecord(
+        digest=digest,
+        song_ids=song_ids,
+        numerical_traits=music_graph.get_traits(song_ids),
+        playlist_edges=None
+    )
+
+
+# @check_contracts
+def _get_playlists(csv_files: list[str], read: list[PlaylistRecord], data_dir: str, previous: BuildState,
+                   current: Optional[BuildState]) -> list[PlaylistRecord]:
+    """Return the records of the given CSV files of one subfolder, in order.
 
-    playlists = []  # list that contains lists that represent playlists of songs
+    read contains the records of the CSV files that _get_cached_playlist did not find in previous,
+    in order. A record in read whose file contents turn out to be unchanged is replaced by the
+    cached one. If current is not None, the record of every CSV file is added to it.
+
+    Preconditions:
+    - read is the result of _read_playlists for
+      [f for f in csv_files if _get_cached_playlist(f, data_dir, previous) is None]
+    """
+    playlists = []
+    read_so_far = iter(read)
 
     for f in csv_files:
-        with open(f, encoding="utf8") as csv_file:
-            songs_so_far = []
-            reader = csv.reader(csv_file)
+        playlist_key = os.path.relpath(f, data_dir)
+        playlist = _get_cached_playlist(f, data_dir, previous)
+        if playlist is None:
+            playlist = next(read_so_far)
+            cached = previous.playlists.get(playlist_key)
+            if cached is not None and cached.sha256 == playlist.sha256:
+                # the file was touched, but not changed
+                cached.mtime_ns = playlist.mtime_ns
+                playlist = cached
 
-            next(reader)
+        if current is not None:
+            current.playlists[playlist_key] = playlist
+        playlists.append(playlist)
 
-            for line in reader:
-                song_id = line[0]
+    return playlists
 
-                if song_id not in music_graph:
-                    song_numerical_traits = [float(line[7])] + [float(line[k]) for k in range(11, 23)]
 
-                    song = Song(
-                        spotify_id=line[0],
-                        track_name=line[2],
-                        artist_names=line[4].split(','),
-                        numerical_traits=song_numerical_traits
-                    )
+# @check_contracts
+def _add_songs(playlists: list[Union[PlaylistRecord, PlaylistChunk]], music_graph: MusicGraph) -> list[list[str]]:
+    """Add the songs of the given playlists (or chunks of playlists) that are not in music_graph
+    yet to music_graph, and return the playlists as lists of Spotify IDs."""
+    for playlist in playlists:
+        for row, song_id in enumerate(playlist.spotify_ids):
+            if song_id not in music_graph:
+                song = Song(
+                    spotify_id=song_id,
+                    track_name=playlist.track_names[row],
+                    artist_names=playlist.artist_names[row],
+                    numerical_traits=playlist.numerical_traits[row]
+                )
 
-                    music_graph.add_song(song)
-                songs_so_far.append(song_id)
-            playlists.append(songs_so_far)
+                music_graph.add_song(song)
+
+    return [playlist.spotify_ids for playlist in playlists]
 
-    # process data
-    _standardize_data(playlists, music_graph)
 
-    # iterate through each playlist and add edges
+# @check_contracts
+def _get_cached_playlist(csv_path: str, data_dir: str, previous: BuildState) -> Optional[PlaylistRecord]:
+    """Return the record in previous of the CSV file at csv_path if the file has not been modified
+    since then, or None otherwise."""
+    cached = previous.playlists.get(os.path.relpath(csv_path, data_dir))
+    if cached is not None and cached.mtime_ns == os.stat(csv_path).st_mtime_ns:
+        return cached
+    return None
+
+
+# @check_contracts
+def _stream_playlists(csv_paths: list[str], bad_rows: str, music_graph: MusicGraph,
+                      stats: BuildStats) -> list[list[str]]:
+    """Read the playlist CSV files at the given paths one chunk at a time, add the songs of each
+    chunk that are not in music_graph yet to music_graph, and return the playlists as lists of
+    Spotify IDs, filling in the 'read' and 'add_songs' stages and the counts of stats.
+
+    Unlike _read_playlists, no record of the files is kept, so apart from the returned lists (whose
+    Spotify IDs are interned, so that a song in many playlists is stored once), the memory used
+    is bounded by the size of a chunk, however many rows the files have.
+
+    Bad rows are handled according to bad_rows, as described in csv_ingest.read_playlist_chunks.
+
+    >>> import shutil
+    >>> import tempfile
+    >>> from synthetic_data import generate_dataset
+    >>> def get_read_peak(copies: int) -> int:
+    ...     with tempfile.TemporaryDirectory() as data_dir:
+    ...         (csv_path,) = generate_dataset(data_dir, 1, 1, 500)
+    ...         for k in range(copies):
+    ...             _ = shutil.copy(csv_path, f'{csv_path[:-4]}_{k}.csv')
+    ...         stats = BuildStats(trace_memory=True)
+    ...         _ = build_music_graph(data_dir, stats=stats)
+    ...     return stats.memory_peaks['read']
+    >>> get_read_peak(40) - get_read_peak(0) < 2 ** 20  # 20000 more rows, of the same 500 songs
+    True
+
+    Preconditions:
+    - every file in csv_paths is a CSV file of the format specified in the module header
+    - bad_rows in csv_ingest.BAD_ROW_POLICIES
+    """
+    playlists = []
+    for csv_path in csv_paths:
+        playlist = []
+        chunks = read_playlist_chunks(csv_path, bad_rows=bad_rows)
+        while True:
+            with stats.stage('read'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            stats.rows_read += len(chunk.spotify_ids)
+
+            chunk.spotify_ids = [sys.intern(song_id) for song_id in chunk.spotify_ids]
+            with stats.stage('add_songs'):
+                playlist.extend(_add_songs([chunk], music_graph)[0])
+
+        stats.files_read += 1
+        playlists.append(playlist)
+
+    return playlists
+
+
+# @check_contracts
+def _read_playlists(csv_paths: list[str], bad_rows: str) -> list[PlaylistRecord]:
+    """Read the playlist CSV files at the given paths and return their records, in order.
+
+    The records of all the files are returned together, since they are kept in a BuildState or
+    sent back from a worker process; a serial build without a state uses _stream_playlists instead.
+
+    Bad rows are handled according to bad_rows, as described in csv_ingest.read_playlist_chunks.
+
+    Preconditions:
+    - every file in csv_paths is a CSV file of the format specified in the module header
+    - bad_rows in csv_ingest.BAD_ROW_POLICIES
+    """
+    records = []
+    for csv_path in csv_paths:
+        mtime_ns = os.stat(csv_path).st_mtime_ns
+        file_hash = hashlib.sha256()
+        spotify_ids, track_names, artist_names, trait_chunks = [], [], [], []
+
+        for chunk in read_playlist_chunks(csv_path, bad_rows=bad_rows, file_hash=file_hash):
+            spotify_ids.extend(chunk.spotify_ids)
+            track_names.extend(chunk.track_names)
+            artist_names.extend(chunk.artist_names)
+            trait_chunks.append(chunk.numerical_traits)
+
+        records.append(PlaylistRecord(
+            sha256=file_hash.hexdigest(),
+            mtime_ns=mtime_ns,
+            spotify_ids=spotify_ids,
+            track_names=track_names,
+            artist_names=artist_names,
+            numerical_traits=numpy.concatenate(trait_chunks) if trait_chunks else numpy.zeros((0, NUM_TRAITS))
+        ))
+
+    return records
+
+
+# @check_contracts
+def _score_playlists(traits: numpy.ndarray, playlists: list[numpy.ndarray],
+                     edge_options: tuple[Optional[int], Optional[float]], excluded: Optional[list[numpy.ndarray]]) \
+        -> list[tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]]:
+    """Return the edges between the songs of each playlist of a subfolder, given the standardized
+    traits of the subfolder's songs and the rows of those traits of each playlist's songs, as
+    returned by score_playlists.
+
+    If either of the (max_neighbours, min_similarity) edge_options is not None, the edges of each
+    playlist are instead those of score_playlist_top_k without the pairs in excluded, each with a
+    playlist count of 1, since the pairs a playlist keeps depend on all of its songs."""
+    if edge_options == (None, None):
+        return score_playlists(traits, playlists)
+
+    edges = []
+    for rows, pairs in zip(playlists, excluded):
+        first, second, scores = score_playlist_top_k(traits[rows], *edge_options, pairs)
+        edges.append((first, second, scores, numpy.ones(len(scores), dtype=numpy.int64)))
+    return edges
+
+
+# @check_contracts
+def _get_earlier_pairs(playlist: list[str], memberships: dict[str, list[int]]) -> numpy.ndarray:
+    """Return the pairs of positions of the songs in playlist that already share an earlier
+    playlist, given the numbers of the earlier playlists each song is in, as a sorted array of
+    first * len(playlist) + second, with first < second.
+
+    >>> _get_earlier_pairs(['a', 'b', 'c', 'd'], {'a': [0], 'c': [0, 1], 'd': [1]})
+    array([ 2, 11])
+    """
+    rows, numbers = [], []
+    for row, song_id in enumerate(playlist):
+        for number in memberships.get(song_id, []):
+            rows.append(row)
+            numbers.append(number)
+
+    rows, numbers = numpy.array(rows, dtype=numpy.int64), numpy.array(numbers, dtype=numpy.int64)
+    order = numpy.lexsort((rows, numbers))
+    rows, numbers = rows[order], numbers[order]
+
+    keys = [numpy.zeros(0, dtype=numpy.int64)]
+    for group in numpy.split(rows, numpy.flatnonzero(numpy.diff(numbers)) + 1):
+        first, second = numpy.triu_indices(len(group), k=1)
+        keys.append(group[first] * len(playlist) + group[second])
+
+    return numpy.unique(numpy.concatenate(keys))
+
+
+# @check_contracts
+def _get_folder_digest(playlists: list[list[str]], music_graph: MusicGraph,
+                       edge_options: tuple[Optional[int], Optional[float]],
+                       excluded: Optional[list[numpy.ndarray]]) -> str:
+    """Return a hash of the standardization inputs of a folder: the songs in each of its playlists
+    and their current numerical traits in music_graph, along with the edge_options of the build and
+    the excluded pairs of each playlist if it is in sparse-edge mode.
+
+    Preconditions:
+      - all(all(song in music_graph for song in playlist) for playlist in playlists)
+    """
+    digest = hashlib.sha256()
     for playlist in playlists:
-        for i in range(0, len(playlist)):
-            for j in range(i + 1, len(playlist)):
-                music_graph.add_edge(
-                    music_graph[playlist[i]], music_graph[playlist[j]])
+        digest.update('\x00'.join(playlist).encode('utf-8'))
+        digest.update(b'\x01')
+
+    occurrences = [song_id for playlist in playlists for song_id in playlist]
+    digest.update(music_graph.get_traits(occurrences).tobytes())
+    if excluded is not None:
+        digest.update(repr(edge_options).encode('utf-8'))
+        for pairs in excluded:
+            digest.update(pairs.tobytes())
+            digest.update(b'\x01')
+    return digest.hexdigest()
 
 
 # @check_contracts
-def _standardize_data(playlists: list[list[str]], music_graph: MusicGraph) -> None:
+def _standardize_data(playlists: list[list[str]], music_graph: MusicGraph, validate: bool = False) -> None:
     """Given a list that contains each playlist and a MusicGraph, mutate each
     song's numerical traits so that they're standardized and normalized.
 
+    If validate is True, raise GraphValidationError if the standardized traits do not have a mean
+    of 0 and a standard deviation of 1 (or 0), or the normalized traits do not have length 1.
+
     Precondition:
       - all(all(song in music_graph for song in playlist) for playlist in playlists)
     """
-    # process data
-    all_vectors = []  # list that contains sublists for all numerical traits of all songs
-    for playlist in playlists:
-        for song_id in playlist:
-            all_vectors.append(music_graph[song_id].numerical_traits)
-
-    # cast data from a list of list to a 2D array for preprocessing
-    song_array = numpy.array(all_vectors)
-
-    # standardization
-    st_scalar = StandardScaler()
-    standardized_data = st_scalar.fit_transform(song_array)
-    # check that the means are close to 0 and standard deviations are 1
-    assert all(-0.0001 < value < 0.0001 for value in standardized_data.mean(axis=0))
-    assert all(0.9999 < value < 1.0001 for value in standardized_data.std(axis=0))
-
-    # cast 2D array to a list of lists
-    list_of_traits = standardized_data.tolist()
-
-    # normalization by scaling to length 1
-    for i in range(0, len(list_of_traits)):
-        v = list_of_traits[i]
-        prod = _norm(v)
-        list_of_traits[i] = [item / prod for item in v]
-
-    # update each song's numerical trait
-    m = 0
-    for playlist in playlists:
-        for song_id in playlist:
-            music_graph[song_id].numerical_traits = list_of_traits[m]
-            m += 1
+    # one row per occurrence of a song, so a song in several playlists is weighted once per playlist.
+    # The work is done in float64 so that the float32 traits written back are exactly those that
+    # sklearn's StandardScaler gave before it was replaced.
+    occurrences = [song_id for playlist in playlists for song_id in playlist]
+    traits = music_graph.get_traits(occurrences).astype(numpy.float64)
+
+    # standardization, like sklearn's StandardScaler: a trait with no variance is only centred
+    means = traits.mean(axis=0, dtype=numpy.float64)
+    stds = traits.std(axis=0, dtype=numpy.float64)
+    stds[stds == 0.0] = 1.0
+    traits -= means
+    traits /= stds
+    if validate:
+        _validate_standardization(traits)
+
+    # normalization by scaling to length 1 (a row of zeros is left as it is)
+    lengths = numpy.linalg.norm(traits, axis=1, keepdims=True)
+    numpy.divide(traits, lengths, out=traits, where=lengths > 0)
+
+    # every occurrence of a song has the same traits, so it does not matter which one is written last
+    music_graph.set_traits(occurrences, traits)
+
+    if validate:
+        _validate_lengths(music_graph.get_traits(occurrences))
+
+
+# @check_contracts
+def _validate_standardization(standardized: numpy.ndarray) -> None:
+    """Raise GraphValidationError unless every column of standardized has a mean of 0 and a
+    standard deviation of 1, or 0 if every value of the column is the same.
+
+    >>> _validate_standardization(numpy.array([[-1.0, 0.0], [1.0, 0.0]]))
+    >>> _validate_standardization(numpy.array([[0.0], [2.0]]))
+    Traceback (most recent call last):
+    ...
+    build_music_graph.GraphValidationError: standardized traits [0] have a mean of [1.] and a standard deviation of [1.]
+    """
+    means, stds = standardized.mean(axis=0), standardized.std(axis=0)
+    bad = (numpy.abs(means) >= VALIDATION_TOLERANCE) | ((numpy.abs(stds - 1.0) >= VALIDATION_TOLERANCE)
+                                                        & (stds >= VALIDATION_TOLERANCE))
+    if bad.any():
+        columns = numpy.flatnonzero(bad)
+        raise GraphValidationError(f'standardized traits {columns} have a mean of {means[columns]} and a '
+                                   f'standard deviation of {stds[columns]}')
+
+
+# @check_contracts
+def _validate_lengths(traits: numpy.ndarray) -> None:
+    """Raise GraphValidationError unless every row of traits has length 1."""
+    lengths = numpy.linalg.norm(traits, axis=1)
+    bad = ~(numpy.abs(lengths - 1.0) < VALIDATION_TOLERANCE)
+    if bad.any():
+        raise GraphValidationError(f'{bad.sum()} songs have traits that do not have length 1, '
+                                   f'such as song {numpy.flatnonzero(bad)[0]} with length {lengths[bad][0]}')
+
+
+# @check_contracts
+def _validate_graph(music_graph: MusicGraph) -> None:
+    """Raise GraphValidationError unless the traits of every song in music_graph have length 1 and
+    the similarity score of every edge is between 0 and 1.
+
+    With incidence storage, the edges are scored from the traits stored with the playlists, so it
+    is those traits that must have length 1."""
+    _validate_lengths(music_graph.get_all_traits())
+
+    arrays = music_graph.to_arrays()
+    if music_graph.storage == INCIDENCE_STORAGE:
+        _validate_lengths(arrays['version_traits'])
+        return
 
-    # should be true if all numerical_traits are correctly scaled to have length 1
-    assert all(all(0.9999 < _norm(music_graph[s_id].numerical_traits) < 1.0001 for s_id in plst)
-               for plst in playlists)
+    scores = arrays['edge_scores']
+    bad = ~((scores >= 0.0) & (scores <= 1.0))
+    if bad.any():
+        raise GraphValidationError(f'{bad.sum()} edges have a similarity score outside [0, 1], '
+                                   f'such as {scores[bad][0]}')
 
 
 if __name__ == "__main__":
@@ -191,8 +721,9 @@ if __name__ == "__main__":
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['glob', 'os', 'csv', 'datetime', 'music_graph', 'music_graph_components',
-                          "sklearn.preprocessing", "numpy"],
-        'allowed-io': ['_process_folder'],
+        'extra-imports': ['glob', 'concurrent.futures', 'typing', 'os', 'hashlib', 'sys', 'datetime', 'build_state',
+                          'build_stats', 'csv_ingest', 'dataset_check', 'edge_scoring', 'music_graph',
+                          'music_graph_components', "numpy"],
+        'allowed-io': [],
         'max-line-length': 120
     })
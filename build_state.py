@@ -0,0 +1,222 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the BuildState class, which records the intermediate results of a
+build_music_graph call so that the next build of the same data directory can be incremental.
+
+A BuildState holds a manifest of the content hash of every CSV file that was read, along with
+its parsed contents, so that unchanged files are not read again. For every subfolder, it also
+holds a digest of the folder's standardization inputs, the resulting standardized traits, and
+the edges contributed by each of the folder's playlists. A folder whose digest is unchanged is
+neither standardized nor scored again, and the edges of a playlist that was deleted are simply
+not added back, which subtracts exactly that playlist's contribution from the graph.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Optional
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+from music_graph import ARTIST_SEPARATOR, encode_strings, decode_strings
+
+# The name of the file inside a build state directory that lists the saved playlists and folders.
+STATE_FILE = 'state.json'
+
+
+# @check_contracts
+class PlaylistRecord:
+    """The parsed contents of one playlist CSV file.
+
+    Instance Attributes:
+        - sha256: The SHA-256 hash of the contents of the file.
+        - mtime_ns: The modification time of the file when it was read, in nanoseconds.
+        - spotify_ids: The Spotify ID of each song in the playlist, in file order.
+        - track_names: The track name of each song in the playlist.
+        - artist_names: The artist name(s) of each song in the playlist.
+        - numerical_traits: A matrix whose rows are the (unstandardized) numerical traits of each song.
+
+    Representation Invariants:
+        - len(self.spotify_ids) == len(self.track_names) == len(self.artist_names)
+        - self.numerical_traits.shape[0] == len(self.spotify_ids)
+    """
+    sha256: str
+    mtime_ns: int
+    spotify_ids: list[str]
+    track_names: list[str]
+    artist_names: list[list[str]]
+    numerical_traits: numpy.ndarray
+
+    def __init__(self, sha256: str, mtime_ns: int, spotify_ids: list[str], track_names: list[str],
+                 artist_names: list[list[str]], numerical_traits: numpy.ndarray) -> None:
+        """Initialize a new playlist record with the given file hash, modification time and contents."""
+        self.sha256 = sha256
+        self.mtime_ns = mtime_ns
+        self.spotify_ids = spotify_ids
+        self.track_names = track_names
+        self.artist_names = artist_names
+        self.numerical_traits = numerical_traits
+
+
+# @check_contracts
+class FolderRecord:
+    """The results of standardizing and scoring the playlists of one subfolder.
+
+    Instance Attributes:
+        - digest: A hash of the folder's standardization inputs (its playlists and their traits).
+        - song_ids: The Spotify IDs of the distinct songs in the folder.
+        - numerical_traits: A matrix whose rows are the standardized traits of each song in song_ids.
+        - playlist_edges:
+            The edges contributed by each playlist of the folder, in order, as
+            (first positions, second positions, similarity scores, playlist counts) arrays (see
+            edge_scoring.score_playlists). The positions refer to rows of the playlist. This is None
+            while the edges are still being scored.
+
+    Representation Invariants:
+        - self.numerical_traits.shape[0] == len(self.song_ids)
+    """
+    digest: str
+    song_ids: list[str]
+    numerical_traits: numpy.ndarray
+    playlist_edges: Optional[list[tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]]]
+
+    def __init__(self, digest: str, song_ids: list[str], numerical_traits: numpy.ndarray,
+                 playlist_edges: Optional[list[tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray,
+                                                     numpy.ndarray]]]) -> None:
+        """Initialize a new folder record with the given digest and results."""
+        self.digest = digest
+        self.song_ids = song_ids
+        self.numerical_traits = numerical_traits
+        self.playlist_edges = playlist_edges
+
+
+# @check_contracts
+class BuildState:
+    """The recorded intermediate results of a build of a data directory.
+
+    Instance Attributes:
+        - playlists: Maps the path of each CSV file (relative to the data directory) to its record.
+        - folders: Maps the path of each subfolder (relative to the data directory) to its record.
+    """
+    playlists: dict[str, PlaylistRecord]
+    folders: dict[str, FolderRecord]
+
+    def __init__(self) -> None:
+        """Initialize an empty build state, which makes the next build a full build."""
+        self.playlists = {}
+        self.folders = {}
+
+    def get_manifest(self) -> dict[str, str]:
+        """Return a mapping from the path of each CSV file in this build state to its content hash."""
+        return {path: record.sha256 for path, record in self.playlists.items()}
+
+    def save(self, state_dir: str) -> None:
+        """Save this build state in state_dir, which is created if it does not exist yet.
+
+        Each record is saved as its own .npz file, and STATE_FILE lists which file holds which record.
+        """
+        os.makedirs(state_dir, exist_ok=True)
+        index = {'playlists': {}, 'folders': {}}
+
+        for n, (path, playlist) in enumerate(self.playlists.items()):
+            file_name = f'playlist_{n}.npz'
+            numpy.savez(os.path.join(state_dir, file_name),
+                        spotify_ids=encode_strings(playlist.spotify_ids),
+                        track_names=encode_strings(playlist.track_names),
+                        artist_names=encode_strings([ARTIST_SEPARATOR.join(a) for a in playlist.artist_names]),
+                        numerical_traits=playlist.numerical_traits)
+            index['playlists'][path] = {'sha256': playlist.sha256, 'mtime_ns': playlist.mtime_ns,
+                                        'file': file_name}
+
+        for n, (path, folder) in enumerate(self.folders.items()):
+            file_name = f'folder_{n}.npz'
+            lengths = [len(edges[0]) for edges in folder.playlist_edges]
+            numpy.savez(os.path.join(state_dir, file_name),
+                        song_ids=encode_strings(folder.song_ids),
+                        numerical_traits=folder.numerical_traits,
+                        edge_counts=numpy.array(lengths, dtype=numpy.int64),
+                        edge_first=_concatenate([edges[0] for edges in folder.playlist_edges], numpy.int64),
+                        edge_second=_concatenate([edges[1] for edges in folder.playlist_edges], numpy.int64),
+                        edge_scores=_concatenate([edges[2] for edges in folder.playlist_edges], numpy.float32),
+                        pair_counts=_concatenate([edges[3] for edges in folder.playlist_edges], numpy.int64))
+            index['folders'][path] = {'digest': folder.digest, 'file': file_name}
+
+        with open(os.path.join(state_dir, STATE_FILE), 'w', encoding='utf8') as state_file:
+            json.dump(index, state_file, indent=1)
+
+    @classmethod
+    def load(cls, state_dir: str) -> BuildState:
+        """Return the build state saved in state_dir, or an empty build state if there is none.
+
+        The records of folders saved without playlist counts, by an older version, are left out,
+        so those folders are standardized and scored again.
+        """
+        state = cls()
+        index_path = os.path.join(state_dir, STATE_FILE)
+        if not os.path.isfile(index_path):
+            return state
+
+        with open(index_path, encoding='utf8') as state_file:
+            index = json.load(state_file)
+
+        for path, info in index['playlists'].items():
+            with numpy.load(os.path.join(state_dir, info['file'])) as arrays:
+                state.playlists[path] = PlaylistRecord(
+                    sha256=info['sha256'],
+                    mtime_ns=info['mtime_ns'],
+                    spotify_ids=decode_strings(arrays['spotify_ids']),
+                    track_names=decode_strings(arrays['track_names']),
+                    artist_names=[a.split(ARTIST_SEPARATOR) for a in decode_strings(arrays['artist_names'])],
+                    numerical_traits=arrays['numerical_traits']
+                )
+
+        for path, info in index['folders'].items():
+            with numpy.load(os.path.join(state_dir, info['file'])) as arrays:
+                if 'pair_counts' not in arrays:
+                    continue
+                bounds = numpy.cumsum(arrays['edge_counts'])[:-1]
+                playlist_edges = list(zip(numpy.split(arrays['edge_first'], bounds),
+                                          numpy.split(arrays['edge_second'], bounds),
+                                          numpy.split(arrays['edge_scores'], bounds),
+                                          numpy.split(arrays['pair_counts'], bounds)))
+                playlist_edges = playlist_edges[:len(arrays['edge_counts'])]
+                state.folders[path] = FolderRecord(
+                    digest=info['digest'],
+                    song_ids=decode_strings(arrays['song_ids']),
+                    numerical_traits=arrays['numerical_traits'],
+                    playlist_edges=playlist_edges
+                )
+
+        return state
+
+
+# @check_contracts
+def _concatenate(arrays: list[numpy.ndarray], dtype: type) -> numpy.ndarray:
+    """Return the concatenation of the given arrays as an array of the given dtype, which is
+    empty if there are no arrays."""
+    if not arrays:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.concatenate(arrays).astype(dtype)
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'os', 'typing', 'numpy', 'music_graph'],
+        'allowed-io': ['save', 'load'],
+        'max-line-length': 120,
+        'max-args': 7
+    })
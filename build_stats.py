@@ -0,0 +1,199 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the BuildStats class, which collects statistics about a build_music_graph
+call, such as how many edges sparse-edge mode pruned and how long each stage of the build took.
+
+A BuildStats can also have the build profiled with cProfile, and its memory use traced with
+tracemalloc. Both are off by default, since they slow the build down; the timers and counters
+that are always collected cost a few clock reads per subfolder.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import cProfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+# from python_ta.contracts import check_contracts
+
+# The stages of a build, in the order they happen in (for each subfolder, from 'read' to 'score').
+STAGES = ('preflight', 'read', 'add_songs', 'standardize', 'score', 'add_edges', 'merge', 'prune', 'validate')
+
+
+# @check_contracts
+class BuildStats:
+    """Statistics about a build of a MusicGraph.
+
+    Pass a new BuildStats to build_music_graph to have it filled in.
+
+    Instance Attributes:
+        - trace_memory:
+            Whether the peak memory allocated by Python during each stage is recorded in
+            memory_peaks, using tracemalloc.
+        - profile_path: The file the cProfile statistics of the build are dumped to, if any.
+        - snapshot_path:
+            The file a tracemalloc snapshot of the memory allocated at the end of the build is
+            dumped to, if any (implies trace_memory).
+        - stage_seconds:
+            The number of seconds spent in each stage of the build (see STAGES). With worker
+            processes, 'read' and 'score' are the time spent waiting for the workers.
+        - memory_peaks:
+            The peak number of bytes allocated by this process during each stage, if trace_memory.
+        - files_read: The number of CSV files that were read.
+        - files_reused: The number of CSV files whose records were reused from an earlier build.
+        - rows_read: The number of songs (rows) in the CSV files that were read.
+        - songs: The number of songs in the built graph.
+        - pairs: The number of pairs of songs that share a playlist, counted once per playlist they share.
+        - duplicate_pairs:
+            The number of those pairs that were not scored because an earlier playlist of the same
+            subfolder already has them (see edge_scoring.score_playlists), or because they are a
+            song paired with itself.
+        - pairs_pruned:
+            The number of those pairs that were left out while scoring each playlist, because
+            neither song of the pair kept the pair among its best neighbours.
+        - edges_created: The number of edges added to the graph, one per scored pair.
+        - duplicate_edges:
+            The number of those edges that were dropped because their songs already had an edge.
+        - edges_pruned:
+            The number of edges removed from the graph after all the playlists were added, when
+            each song's best neighbours over all the playlists were known.
+        - edges:
+            The number of edges in the built graph, or 0 if it uses incidence storage, whose edges
+            are not counted (pairs is an upper bound on their number).
+
+    Representation Invariants:
+        - self.songs >= 0 and self.edges >= 0
+        - 0 <= self.pairs_pruned + self.duplicate_pairs <= self.pairs
+        - 0 <= self.duplicate_edges <= self.edges_created
+        - self.edges_pruned >= 0
+        - all(seconds >= 0 for seconds in self.stage_seconds.values())
+    """
+    trace_memory: bool
+    profile_path: Optional[str]
+    snapshot_path: Optional[str]
+    stage_seconds: dict[str, float]
+    memory_peaks: dict[str, int]
+    files_read: int
+    files_reused: int
+    rows_read: int
+    songs: int
+    pairs: int
+    duplicate_pairs: int
+    pairs_pruned: int
+    edges_created: int
+    duplicate_edges: int
+    edges_pruned: int
+    edges: int
+
+    def __init__(self, trace_memory: bool = False, profile_path: Optional[str] = None,
+                 snapshot_path: Optional[str] = None) -> None:
+        """Initialize statistics with every count at 0, for a build that is profiled and traced as
+        described by the arguments (see the instance attributes)."""
+        self.trace_memory = trace_memory or snapshot_path is not None
+        self.profile_path = profile_path
+        self.snapshot_path = snapshot_path
+        self.stage_seconds = {}
+        self.memory_peaks = {}
+        self.files_read = 0
+        self.files_reused = 0
+        self.rows_read = 0
+        self.songs = 0
+        self.pairs = 0
+        self.duplicate_pairs = 0
+        self.pairs_pruned = 0
+        self.edges_created = 0
+        self.duplicate_edges = 0
+        self.edges_pruned = 0
+        self.edges = 0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Return a context manager that adds the time spent in it to the stage with the given
+        name, and records the peak memory allocated in it if self.trace_memory.
+
+        >>> stats = BuildStats()
+        >>> with stats.stage('read'):
+        ...     pass
+        >>> stats.stage_seconds['read'] >= 0
+        True
+        """
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + time.perf_counter() - start
+            if self.trace_memory and tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1]
+                self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), peak)
+
+    @contextmanager
+    def profiling(self) -> Iterator[None]:
+        """Return a context manager that profiles and traces the code run in it, as set up by the
+        instance attributes, and dumps the results when it exits.
+
+        tracemalloc is started if self.trace_memory and it is not tracing yet, and stopped again
+        at the end.
+        """
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        profiler = cProfile.Profile() if self.profile_path is not None else None
+        if profiler is not None:
+            profiler.enable()
+
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.profile_path)
+            if self.snapshot_path is not None:
+                tracemalloc.take_snapshot().dump(self.snapshot_path)
+            if started_tracing:
+                tracemalloc.stop()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return these statistics as a dictionary, for reports.
+
+        >>> BuildStats().as_dict()['edges']
+        0
+        """
+        return {
+            'stage_seconds': dict(self.stage_seconds),
+            'memory_peaks': dict(self.memory_peaks),
+            'files_read': self.files_read,
+            'files_reused': self.files_reused,
+            'rows_read': self.rows_read,
+            'songs': self.songs,
+            'pairs': self.pairs,
+            'duplicate_pairs': self.duplicate_pairs,
+            'pairs_pruned': self.pairs_pruned,
+            'edges_created': self.edges_created,
+            'duplicate_edges': self.duplicate_edges,
+            'edges_pruned': self.edges_pruned,
+            'edges': self.edges
+        }
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['cProfile', 'time', 'tracemalloc', 'contextlib', 'typing'],
+        'allowed-io': [],
+        'max-line-length': 120
+    })
@@ -0,0 +1,195 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains functions for reading playlist CSV files created by Exportify.net in
+chunks of rows, with bounded memory, for build_music_graph. See the header of build_music_graph
+for the format of the rows.
+
+The numerical traits of a chunk are not converted cell by cell: the 13 trait cells of each row
+are copied into a preallocated NumPy array of strings, which is converted to a float64 matrix in
+one vectorized step once the chunk is full. Rows are only converted one at a time when that step
+fails, to find the bad rows, which are then skipped or reported depending on the bad row policy.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import csv
+from operator import itemgetter
+from typing import Any, Iterator, Optional
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+from music_graph import NUM_TRAITS
+
+# The indices of the columns holding the numerical traits of a song: popularity, then the 12 audio features.
+TRAIT_COLUMNS = (7,) + tuple(range(11, 23))
+
+# The number of columns a row must have.
+NUM_COLUMNS = 23
+
+# The default number of rows in a chunk.
+DEFAULT_CHUNK_ROWS = 8192
+
+# The most characters a trait cell can have. Longer cells are truncated by the string buffer, so a
+# cell that fills it is always converted on its own.
+TRAIT_CELL_WIDTH = 32
+
+# The policies for rows that do not have the expected format: 'raise' raises a CSVFormatError and
+# 'skip' leaves the row out. Blank lines are always skipped.
+BAD_ROW_POLICIES = ('raise', 'skip')
+
+_get_trait_cells = itemgetter(*TRAIT_COLUMNS)
+
+
+# @check_contracts
+class CSVFormatError(ValueError):
+    """Raised when a row of a playlist CSV file does not have the expected format."""
+
+
+# @check_contracts
+class PlaylistChunk:
+    """A chunk of consecutive rows of a playlist CSV file.
+
+    Instance Attributes:
+        - spotify_ids: The Spotify ID of the song in each row.
+        - track_names: The track name of the song in each row.
+        - artist_names: The artist name(s) of the song in each row.
+        - numerical_traits: A float64 matrix whose rows are the numerical traits of the song in each row.
+
+    Representation Invariants:
+        - len(self.spotify_ids) == len(self.track_names) == len(self.artist_names)
+        - self.numerical_traits.shape == (len(self.spotify_ids), NUM_TRAITS)
+    """
+    spotify_ids: list[str]
+    track_names: list[str]
+    artist_names: list[list[str]]
+    numerical_traits: numpy.ndarray
+
+    def __init__(self, spotify_ids: list[str], track_names: list[str], artist_names: list[list[str]],
+                 numerical_traits: numpy.ndarray) -> None:
+        """Initialize a new chunk with the given rows."""
+        self.spotify_ids = spotify_ids
+        self.track_names = track_names
+        self.artist_names = artist_names
+        self.numerical_traits = numerical_traits
+
+
+# @check_contracts
+def read_playlist_chunks(csv_path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS, bad_rows: str = 'raise',
+                         file_hash: Optional[Any] = None) -> Iterator[PlaylistChunk]:
+    """Yield the rows of the playlist CSV file at csv_path (without its header), in chunks of at
+    most chunk_rows rows.
+
+    A UTF-8 byte order mark at the start of the file is ignored. Rows with too few columns, an
+    empty Spotify ID or a numerical trait that is not a number are handled according to bad_rows,
+    one of BAD_ROW_POLICIES. If file_hash (a hashlib hash object) is given, it is updated with every
+    byte of the file, so that the file does not have to be read twice to be hashed.
+
+    Preconditions:
+        - chunk_rows >= 1
+        - bad_rows in BAD_ROW_POLICIES
+    """
+    with open(csv_path, 'rb') as csv_file:
+        reader = csv.reader(_decode_lines(csv_file, file_hash))
+        next(reader, None)
+
+        cells = numpy.empty((chunk_rows, NUM_TRAITS), dtype=f'U{TRAIT_CELL_WIDTH}')
+        spotify_ids, track_names, artist_names, line_numbers = [], [], [], []
+
+        for line in reader:
+            if not line:
+                continue
+            if len(line) < NUM_COLUMNS or line[0] == '':
+                _handle_bad_row(csv_path, reader.line_num, bad_rows, f'expected {NUM_COLUMNS} columns '
+                                                                     f'and a Spotify ID, got {line!r}')
+                continue
+
+            cells[len(spotify_ids)] = _get_trait_cells(line)
+            spotify_ids.append(line[0])
+            track_names.append(line[2])
+            artist_names.append(line[4].split(','))
+            line_numbers.append(reader.line_num)
+
+            if len(spotify_ids) == chunk_rows:
+                yield _make_chunk(csv_path, cells, spotify_ids, track_names, artist_names, line_numbers, bad_rows)
+                spotify_ids, track_names, artist_names, line_numbers = [], [], [], []
+
+        if spotify_ids:
+            yield _make_chunk(csv_path, cells, spotify_ids, track_names, artist_names, line_numbers, bad_rows)
+
+
+# @check_contracts
+def _decode_lines(csv_file: Any, file_hash: Optional[Any]) -> Iterator[str]:
+    """Yield the lines of the binary file csv_file decoded as UTF-8, without a byte order mark,
+    updating file_hash (if it is not None) with every byte read."""
+    first = True
+    for line in csv_file:
+        if file_hash is not None:
+            file_hash.update(line)
+        if first and line.startswith(b'\xef\xbb\xbf'):
+            line = line[3:]
+        first = False
+        yield line.decode('utf-8')
+
+
+# @check_contracts
+def _make_chunk(csv_path: str, cells: numpy.ndarray, spotify_ids: list[str], track_names: list[str],
+                artist_names: list[list[str]], line_numbers: list[int], bad_rows: str) -> PlaylistChunk:
+    """Return the chunk made of the given rows, whose trait cells are the first rows of cells,
+    converting all the trait cells to floats at once.
+
+    Rows whose trait cells cannot be converted are handled according to bad_rows.
+    """
+    rows = len(spotify_ids)
+    numerical_traits = numpy.empty((rows, NUM_TRAITS), dtype=numpy.float64)
+
+    try:
+        if (numpy.char.str_len(cells[:rows]) >= TRAIT_CELL_WIDTH).any():
+            raise ValueError('a trait cell may have been truncated')
+        numerical_traits[:] = cells[:rows].astype(numpy.float64)
+        return PlaylistChunk(spotify_ids, track_names, artist_names, numerical_traits)
+    except ValueError:
+        pass
+
+    # some rows could not be converted, so convert the rows one at a time to find them
+    good = []
+    for row in range(rows):
+        try:
+            if (numpy.char.str_len(cells[row]) >= TRAIT_CELL_WIDTH).any():
+                raise ValueError(f'a trait has {TRAIT_CELL_WIDTH} characters or more')
+            numerical_traits[row] = cells[row].astype(numpy.float64)
+            good.append(row)
+        except ValueError as error:
+            _handle_bad_row(csv_path, line_numbers[row], bad_rows, str(error))
+
+    return PlaylistChunk([spotify_ids[row] for row in good], [track_names[row] for row in good],
+                         [artist_names[row] for row in good], numerical_traits[good])
+
+
+# @check_contracts
+def _handle_bad_row(csv_path: str, line_number: int, bad_rows: str, reason: str) -> None:
+    """Raise a CSVFormatError about the bad row ending on line line_number of the file at csv_path,
+    unless bad_rows is 'skip'."""
+    if bad_rows == 'raise':
+        raise CSVFormatError(f'{csv_path}, line {line_number}: {reason}')
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['csv', 'operator', 'typing', 'numpy', 'music_graph'],
+        'allowed-io': ['read_playlist_chunks'],
+        'max-line-length': 120,
+        'max-args': 7
+    })
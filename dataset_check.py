@@ -0,0 +1,254 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains check_connectivity, which checks that a data directory is connected
+enough for MusicMapper to work properly: within each subfolder, every playlist must be linked to
+the others by shared songs, and every subfolder must be linked to the others in the same way.
+
+Each CSV file is read once, and an inverted index from each song to the first playlist of the
+current subfolder (and the first subfolder) it was seen in joins the playlists (and subfolders)
+that share it in a UnionFind. So the check takes time linear in the number of rows, and reports
+every disconnected playlist and subfolder, not only the first one.
+
+Running this module on a data directory prints the report as JSON, and exits with status 1 if
+the data directory is not connected (without arguments, it runs the doctests and python_ta).
+For example:
+
+    python dataset_check.py data
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sys
+from typing import Any
+
+# from python_ta.contracts import check_contracts
+
+
+class DisconnectedDataError(ValueError):
+    """Raised when a data directory that must be connected is not.
+
+    Instance Attributes:
+        - report: The ConnectivityReport of the data directory.
+    """
+    report: ConnectivityReport
+
+    def __init__(self, report: ConnectivityReport) -> None:
+        """Initialize the error for the data directory with the given report."""
+        super().__init__(f'{len(report.get_disconnected_playlists())} playlists and '
+                         f'{len(report.get_disconnected_folders())} subfolders are disconnected')
+        self.report = report
+
+
+# @check_contracts
+class UnionFind:
+    """A union-find (disjoint-set) structure over the integers 0 to n - 1.
+
+    Representation Invariants:
+        - len(self._parents) == len(self._sizes)
+        - all(0 <= parent < len(self._parents) for parent in self._parents)
+    """
+    # Private Instance Attributes:
+    #     - _parents:
+    #         The parent of each element in its set's tree. The root of a tree is its own parent.
+    #     - _sizes:
+    #         The number of elements in the tree of each root (and stale values for the other elements).
+    _parents: list[int]
+    _sizes: list[int]
+
+    def __init__(self, n: int) -> None:
+        """Initialize n singleton sets, of each of the integers 0 to n - 1.
+
+        Preconditions:
+            - n >= 0
+        """
+        self._parents = list(range(n))
+        self._sizes = [1] * n
+
+    def find(self, x: int) -> int:
+        """Return the representative of the set containing x.
+
+        Preconditions:
+            - 0 <= x < len(self._parents)
+        """
+        parents = self._parents
+        while parents[x] != x:
+            # path halving: every other node on the path is linked to its grandparent
+            parents[x] = parents[parents[x]]
+            x = parents[x]
+        return x
+
+    def union(self, x: int, y: int) -> None:
+        """Merge the sets containing x and y.
+
+        >>> sets = UnionFind(3)
+        >>> sets.union(0, 2)
+        >>> sets.get_sets()
+        [[0, 2], [1]]
+
+        Preconditions:
+            - 0 <= x < len(self._parents) and 0 <= y < len(self._parents)
+        """
+        x, y = self.find(x), self.find(y)
+        if x != y:
+            if self._sizes[x] < self._sizes[y]:
+                x, y = y, x
+            self._parents[y] = x
+            self._sizes[x] += self._sizes[y]
+
+    def get_sets(self) -> list[list[int]]:
+        """Return every set, each in increasing order, from largest to smallest (and, among sets of
+        the same size, by their smallest element)."""
+        sets = {}
+        for x in range(len(self._parents)):
+            sets.setdefault(self.find(x), []).append(x)
+        return sorted(sets.values(), key=lambda members: (-len(members), members[0]))
+
+
+# @check_contracts
+class ConnectivityReport:
+    """The result of checking the connectivity of a data directory.
+
+    Instance Attributes:
+        - folders: The subfolders of the data directory, in the order they are built.
+        - playlist_components:
+            Maps each subfolder to the groups of its playlists (CSV file paths) that are linked to
+            each other by shared songs, largest first.
+        - folder_components:
+            The groups of subfolders that are linked to each other by shared songs, largest first.
+
+    Representation Invariants:
+        - all(folder in self.playlist_components for folder in self.folders)
+        - sorted(f for component in self.folder_components for f in component) == sorted(self.folders)
+    """
+    folders: list[str]
+    playlist_components: dict[str, list[list[str]]]
+    folder_components: list[list[str]]
+
+    def __init__(self, folders: list[str], playlist_components: dict[str, list[list[str]]],
+                 folder_components: list[list[str]]) -> None:
+        """Initialize a report with the given components."""
+        self.folders = folders
+        self.playlist_components = playlist_components
+        self.folder_components = folder_components
+
+    def get_disconnected_playlists(self) -> list[tuple[str, str]]:
+        """Return the (subfolder, playlist) pairs of every playlist that is not in the largest
+        component of its subfolder."""
+        return [(folder, playlist) for folder in self.folders
+                for component in self.playlist_components[folder][1:] for playlist in component]
+
+    def get_disconnected_folders(self) -> list[str]:
+        """Return every subfolder that is not in the largest component of subfolders."""
+        return [folder for component in self.folder_components[1:] for folder in component]
+
+    def is_connected(self) -> bool:
+        """Return whether the playlists of every subfolder, and the subfolders, are all connected."""
+        return not self.get_disconnected_playlists() and not self.get_disconnected_folders()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return this report as a dictionary that can be written as JSON."""
+        return {
+            'connected': self.is_connected(),
+            'disconnected_playlists': [{'folder': folder, 'playlist': playlist}
+                                       for folder, playlist in self.get_disconnected_playlists()],
+            'disconnected_folders': self.get_disconnected_folders(),
+            'playlist_components': self.playlist_components,
+            'folder_components': self.folder_components
+        }
+
+
+# @check_contracts
+def check_connectivity(folders: dict[str, list[str]]) -> ConnectivityReport:
+    """Return the connectivity report of a data directory, given the paths of the CSV files of each
+    of its subfolders, in the order they are built (see build_music_graph.get_folders).
+
+    Two playlists of a subfolder are connected if they share a song, or are both connected to a
+    third playlist of the subfolder; subfolders are connected in the same way. A CSV file in
+    several subfolders (a nested subfolder's file is also in its parent) is only read once.
+
+    Preconditions:
+        - every path in folders is a CSV file in the format described in build_music_graph
+    """
+    folder_names = list(folders)
+    song_ids = {}  # maps each CSV file to the Spotify IDs of its songs
+    folder_sets = UnionFind(len(folder_names))
+    first_folders = {}  # maps each song to the first subfolder it was seen in
+    playlist_components = {}
+
+    for f, folder in enumerate(folder_names):
+        csv_files = list(dict.fromkeys(folders[folder]))
+        playlist_sets = UnionFind(len(csv_files))
+        first_playlists = {}  # maps each song to the first playlist of this subfolder it was seen in
+
+        for p, csv_file in enumerate(csv_files):
+            if csv_file not in song_ids:
+                song_ids[csv_file] = read_song_ids(csv_file)
+
+            for song_id in song_ids[csv_file]:
+                playlist_sets.union(p, first_playlists.setdefault(song_id, p))
+                folder_sets.union(f, first_folders.setdefault(song_id, f))
+
+        playlist_components[folder] = [[csv_files[p] for p in component] for component in playlist_sets.get_sets()]
+
+    return ConnectivityReport(
+        folders=folder_names,
+        playlist_components=playlist_components,
+        folder_components=[[folder_names[f] for f in component] for component in folder_sets.get_sets()]
+    )
+
+
+# @check_contracts
+def read_song_ids(csv_path: str) -> list[str]:
+    """Return the Spotify IDs of the songs in the playlist CSV file at csv_path, skipping its
+    header, blank lines and rows without a Spotify ID.
+
+    A UTF-8 byte order mark at the start of the file is ignored.
+    """
+    with open(csv_path, encoding='utf-8-sig', newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader, None)
+        return [line[0] for line in reader if line and line[0] != '']
+
+
+# @check_contracts
+def main(argv: list[str]) -> int:
+    """Check the connectivity of the data directory given by the command-line arguments argv, print
+    the report as JSON, and return the exit status: 1 if the data directory is not connected, and 0
+    otherwise."""
+    # imported here, since build_music_graph imports this module
+    from build_music_graph import get_folders
+
+    parser = argparse.ArgumentParser(description='Check that the playlists of a data directory are connected.')
+    parser.add_argument('data_dir', help='the data directory to check')
+    args = parser.parse_args(argv)
+
+    connectivity = check_connectivity(get_folders(args.data_dir))
+    print(json.dumps(connectivity.as_dict(), indent=2))
+    return 0 if connectivity.is_connected() else 1
+
+
+if __name__ == '__main__':
+    # with command-line arguments, run the check; without, check this module like every other one
+    if len(sys.argv) > 1:
+        sys.exit(main(sys.argv[1:]))
+
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['argparse', 'csv', 'json', 'sys', 'typing', 'build_music_graph'],
+        'allowed-io': ['read_song_ids', 'main'],
+        'max-line-length': 120
+    })
@@ -0,0 +1,268 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the functions that score the edges of a MusicGraph, and the array helpers
+that its storages (see edge_storage and incidence_storage) use to merge and rank those edges.
+
+The similarity score of two songs is (1 + the cosine similarity of their traits) / 2. Since the
+traits of every song have length 1, this is (1 + the dot product of the traits) / 2, which is
+computed in float64 and then rounded to float32, so that an edge gets the same score however it
+is computed.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+
+# The most similarity scores score_playlist_top_k holds in memory at once.
+SCORE_BLOCK_SIZE = 1 << 22
+
+
+# @check_contracts
+def score_playlist(vectors: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Return the edges between every pair of rows of vectors, the numerical traits of the songs
+    in a playlist, as (first positions, second positions, similarity scores) arrays.
+
+    The similarity score of two songs is (1 + the cosine similarity of their traits) / 2. All the
+    scores are computed with a single matrix product, in float64 (see score_pairs).
+
+    Preconditions:
+        - every row of vectors has length 1
+    """
+    vectors = numpy.asarray(vectors, dtype=numpy.float64)
+    similarities = vectors @ vectors.T
+    first, second = numpy.triu_indices(len(vectors), k=1)
+    scores = (1.0 + similarities[first, second]) / 2.0
+    return first, second, scores.astype(numpy.float32)
+
+
+# @check_contracts
+def score_playlists(vectors: numpy.ndarray, playlists: list[numpy.ndarray]) \
+        -> list[tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]]:
+    """Return the edges contributed by each of the given playlists, where playlists[p] holds the
+    rows of vectors (the numerical traits of the songs of a subfolder) of the songs of playlist p.
+
+    The edges of each playlist are (first positions, second positions, similarity scores,
+    playlist counts) arrays, like those of score_playlist, but each pair of distinct songs is only
+    kept by the first playlist it is in, and its count is the number of playlists it is in. The
+    pairs of all the playlists are deduplicated together (see get_first_occurrences), so adding
+    the edges of every playlist in order gives the same graph as adding those of score_playlist,
+    without adding any pair twice.
+
+    >>> vectors = numpy.array([[1.0, 0.0], [0.0, 1.0], [-1.0, 0.0]])
+    >>> edges = score_playlists(vectors, [numpy.array([0, 1]), numpy.array([1, 0, 2])])
+    >>> [(first.tolist(), second.tolist(), scores.tolist(), counts.tolist()) for first, second, scores, counts in edges]
+    [([0], [1], [0.5], [2]), ([0, 1], [2, 2], [0.5, 0.0], [1, 1])]
+
+    Preconditions:
+        - every row of vectors has length 1
+        - all(all(0 <= row < len(vectors) for row in playlist) for playlist in playlists)
+    """
+    if not playlists:
+        return []
+
+    n = len(vectors)
+    firsts, seconds, scores, keys = [], [], [], []
+    for rows in playlists:
+        # scoring every pair of a playlist at once is much cheaper than gathering the traits of its new pairs
+        first, second, playlist_scores = score_playlist(vectors[rows])
+        pair_keys = numpy.minimum(rows[first], rows[second]).astype(numpy.int64) * n \
+            + numpy.maximum(rows[first], rows[second])
+        if len(numpy.unique(rows)) < len(rows):
+            # a song is in the playlist more than once, so keep the first of its repeated pairs,
+            # and leave out the song paired with itself
+            distinct, _ = get_first_occurrences(pair_keys)
+            distinct = distinct[rows[first[distinct]] != rows[second[distinct]]]
+            first, second, playlist_scores, pair_keys = \
+                first[distinct], second[distinct], playlist_scores[distinct], pair_keys[distinct]
+        firsts.append(first)
+        seconds.append(second)
+        scores.append(playlist_scores)
+        keys.append(pair_keys)
+
+    new, counts = get_first_occurrences(numpy.concatenate(keys))
+    owners = numpy.repeat(numpy.arange(len(playlists)), [len(pair_keys) for pair_keys in keys])
+    bounds = numpy.searchsorted(owners[new], numpy.arange(1, len(playlists)))
+    return list(zip(numpy.split(numpy.concatenate(firsts)[new], bounds),
+                    numpy.split(numpy.concatenate(seconds)[new], bounds),
+                    numpy.split(numpy.concatenate(scores)[new], bounds),
+                    numpy.split(counts, bounds)))
+
+
+# @check_contracts
+def score_pairs(first_vectors: numpy.ndarray, second_vectors: numpy.ndarray) -> numpy.ndarray:
+    """Return the similarity scores of the pairs of songs with traits first_vectors[k] and
+    second_vectors[k], as a float32 array.
+
+    The scores are computed in float64 and then rounded, like those of score_playlist, so that an
+    edge gets the same score however it is computed.
+
+    >>> score_pairs(numpy.array([[1.0, 0.0]]), numpy.array([[0.0, 1.0]]))
+    array([0.5], dtype=float32)
+
+    Preconditions:
+        - first_vectors.shape == second_vectors.shape
+    """
+    similarities = numpy.einsum('ij,ij->i', numpy.asarray(first_vectors, dtype=numpy.float64),
+                                numpy.asarray(second_vectors, dtype=numpy.float64))
+    return ((1.0 + similarities) / 2.0).astype(numpy.float32)
+
+
+# @check_contracts
+def score_playlist_top_k(vectors: numpy.ndarray, max_neighbours: Optional[int], min_similarity: Optional[float],
+                         excluded: Optional[numpy.ndarray] = None) \
+        -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Return the edges of score_playlist(vectors) that sparse-edge mode keeps, in the same form
+    and order.
+
+    The edges between the pairs of positions in excluded (given as first * len(vectors) + second,
+    with first < second) are left out first. The other edges are kept if their similarity score is
+    at least min_similarity (when it is not None) and, when max_neighbours is not None, if they are
+    among the max_neighbours best remaining edges of at least one of their endpoints. Edges that tie
+    with the last of those best edges are kept too, so that the result does not depend on how ties
+    are broken.
+
+    The scores are computed in blocks of rows, and only the selected edges of each block are
+    kept, so that at most about SCORE_BLOCK_SIZE scores are in memory at once.
+
+    Preconditions:
+        - every row of vectors has length 1
+        - max_neighbours is None or max_neighbours >= 1
+    """
+    n = len(vectors)
+    if excluded is None:
+        excluded = numpy.zeros(0, dtype=numpy.int64)
+    excluded_rows, excluded_columns = numpy.divmod(excluded, max(n, 1))
+    excluded_rows, excluded_columns = (numpy.concatenate([excluded_rows, excluded_columns]),
+                                       numpy.concatenate([excluded_columns, excluded_rows]))
+
+    block_rows = max(1, SCORE_BLOCK_SIZE // max(n, 1))
+    keys = [numpy.zeros(0, dtype=numpy.int64)]
+
+    for start in range(0, n, block_rows):
+        scores = (1.0 + vectors[start:start + block_rows] @ vectors.T) / 2.0
+        rows = numpy.arange(len(scores))
+        scores[rows, rows + start] = -numpy.inf
+        in_block = (start <= excluded_rows) & (excluded_rows < start + len(scores))
+        scores[excluded_rows[in_block] - start, excluded_columns[in_block]] = -numpy.inf
+
+        selected = scores >= min_similarity if min_similarity is not None else numpy.isfinite(scores)
+        if max_neighbours is not None and max_neighbours < n - 1:
+            kth_best = numpy.partition(scores, n - 1 - max_neighbours, axis=1)[:, n - 1 - max_neighbours]
+            selected &= scores >= kth_best[:, None]
+
+        rows, columns = numpy.nonzero(selected)
+        rows += start
+        keys.append(numpy.minimum(rows, columns).astype(numpy.int64) * n + numpy.maximum(rows, columns))
+
+    # sorted keys list the pairs in the same order as numpy.triu_indices
+    first, second = numpy.divmod(numpy.unique(numpy.concatenate(keys)), max(n, 1))
+    return first, second, score_pairs(vectors[first], vectors[second])
+
+
+# @check_contracts
+def get_first_occurrences(keys: numpy.ndarray, weights: Optional[numpy.ndarray] = None) \
+        -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Return the positions of the first occurrence of each distinct value of keys, in increasing
+    order, along with the number of occurrences of each value (or the sum of their weights, if
+    weights is not None).
+
+    >>> get_first_occurrences(numpy.array([5, 3, 5, 7, 3, 5]))
+    (array([0, 1, 3]), array([3, 2, 1]))
+
+    Preconditions:
+        - all(key >= 0 for key in keys)
+        - weights is None or len(weights) == len(keys)
+    """
+    order = get_stable_order(keys)
+    sorted_keys = keys[order]
+    starts = numpy.flatnonzero(numpy.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]))
+    if weights is None:
+        totals = numpy.diff(numpy.append(starts, len(keys)))
+    else:
+        totals = numpy.add.reduceat(weights[order], starts) if len(keys) > 0 else weights[:0]
+
+    # put the first occurrences back in order without sorting them again
+    firsts = order[starts]
+    is_first = numpy.zeros(len(keys), dtype=bool)
+    is_first[firsts] = True
+    first_totals = numpy.zeros(len(keys), dtype=totals.dtype)
+    first_totals[firsts] = totals
+    return numpy.flatnonzero(is_first), first_totals[is_first]
+
+
+# @check_contracts
+def get_stable_order(keys: numpy.ndarray) -> numpy.ndarray:
+    """Return the permutation that sorts keys stably, like numpy.argsort(keys, kind='stable').
+
+    When they fit, each key and its position are packed into a single int64 and sorted together,
+    which is several times faster than a stable argsort.
+
+    >>> get_stable_order(numpy.array([2, 0, 2, 1]))
+    array([1, 3, 0, 2])
+
+    Preconditions:
+        - all(key >= 0 for key in keys)
+    """
+    bits = max(len(keys) - 1, 1).bit_length()
+    if len(keys) > 0 and int(keys.max()) < 1 << (63 - bits):
+        return numpy.sort((keys.astype(numpy.int64) << bits) | numpy.arange(len(keys))) & ((1 << bits) - 1)
+    return numpy.argsort(keys, kind='stable')
+
+
+# @check_contracts
+def get_ranges(starts: numpy.ndarray, counts: numpy.ndarray) -> numpy.ndarray:
+    """Return the concatenation of the ranges starts[k], ..., starts[k] + counts[k] - 1, for every k.
+
+    >>> get_ranges(numpy.array([5, 0]), numpy.array([2, 3]))
+    array([5, 6, 0, 1, 2])
+    """
+    offsets = numpy.cumsum(counts) - counts
+    return numpy.repeat(starts - offsets, counts) + numpy.arange(counts.sum())
+
+
+# @check_contracts
+def get_top_k_mask(scores: numpy.ndarray, k: int) -> numpy.ndarray:
+    """Return a mask of the k highest finite entries of each row of the 2-D array scores, or of all
+    the finite entries of a row with fewer than k of them. Among equal entries, the ones further
+    right are picked first.
+
+    >>> get_top_k_mask(numpy.array([[1.0, 3.0, 2.0, 3.0], [1.0, -numpy.inf, 1.0, 1.0]]), 2)
+    array([[False,  True, False,  True],
+           [False, False,  True,  True]])
+    """
+    finite = numpy.isfinite(scores)
+    if k >= scores.shape[1]:
+        return finite
+    if k == 0:
+        return numpy.zeros(scores.shape, dtype=bool)
+
+    kth = numpy.take_along_axis(scores, numpy.argpartition(-scores, k - 1, axis=1)[:, k - 1:k], axis=1)
+    mask = scores > kth
+    ties = finite & (scores == kth)
+    missing = k - mask.sum(axis=1, keepdims=True)
+    mask |= ties & (numpy.cumsum(ties[:, ::-1], axis=1)[:, ::-1] <= missing)
+    return mask
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'numpy'],
+        'allowed-io': [],
+        'max-line-length': 120
+    })
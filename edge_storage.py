@@ -0,0 +1,325 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the EdgeStorage class, the default way a MusicGraph stores its edges: every
+edge is scored when it is added, and the edges are kept as CSR-style (compressed sparse row)
+arrays of neighbour indices and similarity scores, along with a neighbour index of the best
+neighbours of every song, pre-sorted.
+
+EdgeStorage and IncidenceStorage (see incidence_storage) have the same methods, which MusicGraph
+calls without knowing how the edges are stored.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+from edge_scoring import get_first_occurrences, get_ranges, get_stable_order, get_top_k_mask, score_playlist
+
+# The number of best neighbours of each song kept, pre-sorted, in the neighbour index. This is the
+# largest number of recommendations the GUI asks for; larger requests rank all the song's edges.
+NEIGHBOUR_INDEX_DEPTH = 50
+
+
+# @check_contracts
+class EdgeStorage:
+    """The scored edges between the songs of a MusicGraph.
+
+    Representation Invariants:
+        - self._num_songs >= 0
+        - len(self._edge_first) == len(self._edge_second) == len(self._edge_scores) == len(self._edge_counts)
+    """
+    # Private Instance Attributes:
+    #     - _num_songs:
+    #         The number of songs of the music graph, whose indices are 0 to _num_songs - 1.
+    #     - _edge_first, _edge_second, _edge_scores, _edge_counts:
+    #         The merged edges, in the order they were created. Edge k connects songs _edge_first[k]
+    #         and _edge_second[k] with similarity score _edge_scores[k], and its songs share
+    #         _edge_counts[k] playlists.
+    #     - _pending:
+    #         Edges (as (first indices, second indices, scores, counts) arrays) added since the last
+    #         time the edges were merged. These may contain edges that already exist.
+    #     - _indptr, _indices, _scores, _counts:
+    #         The CSR adjacency built from the merged edges. The neighbours of song i are
+    #         _indices[_indptr[i]:_indptr[i + 1]], in the order their edges were created, with the
+    #         matching similarity scores in _scores and playlist counts in _counts. _indptr is None
+    #         if it needs to be rebuilt.
+    #     - _top_indptr, _top_indices, _top_scores:
+    #         The neighbour index: the same layout as the CSR adjacency, but row i only holds the
+    #         (at most NEIGHBOUR_INDEX_DEPTH) best neighbours of song i, sorted by decreasing similarity
+    #         score, and among equal scores, by most recently created edge first.
+    #         _top_indptr is None if the index needs to be rebuilt.
+    _num_songs: int
+    _edge_first: numpy.ndarray
+    _edge_second: numpy.ndarray
+    _edge_scores: numpy.ndarray
+    _edge_counts: numpy.ndarray
+    _pending: list[tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]]
+    _indptr: numpy.ndarray | None
+    _indices: numpy.ndarray
+    _scores: numpy.ndarray
+    _counts: numpy.ndarray
+    _top_indptr: numpy.ndarray | None
+    _top_indices: numpy.ndarray
+    _top_scores: numpy.ndarray
+
+    def __init__(self) -> None:
+        """Initialize the storage of a music graph without any songs."""
+        self._num_songs = 0
+        self._edge_first = numpy.zeros(0, dtype=numpy.int32)
+        self._edge_second = numpy.zeros(0, dtype=numpy.int32)
+        self._edge_scores = numpy.zeros(0, dtype=numpy.float32)
+        self._edge_counts = numpy.zeros(0, dtype=numpy.int32)
+        self._pending = []
+        self._indptr = None
+        self._indices = numpy.zeros(0, dtype=numpy.int32)
+        self._scores = numpy.zeros(0, dtype=numpy.float32)
+        self._counts = numpy.zeros(0, dtype=numpy.int32)
+        self._top_indptr = None
+        self._top_indices = numpy.zeros(0, dtype=numpy.int32)
+        self._top_scores = numpy.zeros(0, dtype=numpy.float32)
+
+    def set_num_songs(self, num_songs: int) -> None:
+        """Record that the music graph now has num_songs songs.
+
+        Preconditions:
+            - num_songs >= self._num_songs
+        """
+        self._num_songs = num_songs
+        self._indptr = None
+
+    def set_traits_changed(self, indices: numpy.ndarray) -> None:
+        """Record that the traits of the songs with the given indices changed. The edges that have
+        already been added keep the similarity score they were created with."""
+
+    def add_playlist(self, indices: numpy.ndarray, traits: numpy.ndarray) -> None:
+        """Add an edge between every pair of the songs with the given indices, scored from the rows
+        of traits, the trait matrix of the music graph.
+
+        Preconditions:
+            - all(0 <= i < self._num_songs for i in indices)
+        """
+        first, second, scores = score_playlist(traits[indices])
+        self.add_edges(indices[first], indices[second], scores)
+
+    def add_edges(self, first: numpy.ndarray, second: numpy.ndarray, scores: numpy.ndarray,
+                  counts: Optional[numpy.ndarray] = None) -> None:
+        """Add the given edges, as described in MusicGraph.add_edges.
+
+        Preconditions:
+            - len(first) == len(second) == len(scores)
+            - counts is None or len(counts) == len(scores)
+        """
+        distinct = first != second
+        counts = numpy.ones(len(scores), dtype=numpy.int32) if counts is None else counts
+        self._pending.append((first[distinct].astype(numpy.int32), second[distinct].astype(numpy.int32),
+                              scores[distinct].astype(numpy.float32), counts[distinct].astype(numpy.int32)))
+        self._indptr = None
+
+    def prune_edges(self, max_neighbours: Optional[int], min_similarity: Optional[float]) -> int:
+        """Remove the edges that are not worth keeping, as described in MusicGraph.prune_edges, and
+        return how many were removed.
+
+        Preconditions:
+            - max_neighbours is None or max_neighbours >= 1
+        """
+        if self._indptr is None:
+            self._merge_edges()
+
+        keep = numpy.arange(len(self._edge_scores))
+        if min_similarity is not None:
+            keep = keep[self._edge_scores >= min_similarity]
+
+        if max_neighbours is not None:
+            # rank the edges of each song by decreasing score, then by most recently created first
+            rows = numpy.concatenate([self._edge_first[keep], self._edge_second[keep]])
+            edges = numpy.tile(keep, 2)
+            order = numpy.lexsort((-edges, -self._edge_scores[edges], rows))
+            row_starts = numpy.zeros(self._num_songs + 1, dtype=numpy.int64)
+            numpy.cumsum(numpy.bincount(rows, minlength=self._num_songs), out=row_starts[1:])
+            ranks = numpy.arange(len(order)) - row_starts[rows[order]]
+            keep = numpy.unique(edges[order[ranks < max_neighbours]])
+
+        removed = len(self._edge_scores) - len(keep)
+        if removed > 0:
+            self._edge_first, self._edge_second = self._edge_first[keep], self._edge_second[keep]
+            self._edge_scores, self._edge_counts = self._edge_scores[keep], self._edge_counts[keep]
+            self._merge_edges()
+        return removed
+
+    def get_num_edges(self) -> int:
+        """Return the number of edges."""
+        if self._indptr is None:
+            self._merge_edges()
+        return len(self._edge_scores)
+
+    def get_edges(self, sources: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """Return (rows, neighbours, scores): every edge of each song with an index in sources, in
+        the order they were created, where the edge to neighbours[e] with score scores[e] is an
+        edge of the song with index sources[rows[e]]."""
+        if self._indptr is None:
+            self._merge_edges()
+        starts = self._indptr[sources]
+        degrees = self._indptr[sources + 1] - starts
+        positions = get_ranges(starts, degrees)
+        return numpy.repeat(numpy.arange(len(sources)), degrees), self._indices[positions], self._scores[positions]
+
+    def get_best_edges(self, sources: numpy.ndarray, k: int) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """Return (rows, neighbours, scores) like get_edges, but only for the k best edges of each
+        song, best first: by decreasing score, and among equal scores, most recently created first.
+
+        At most NEIGHBOUR_INDEX_DEPTH edges are sliced from the neighbour index; more are picked
+        from every edge of each song with numpy.argpartition.
+        """
+        if k <= NEIGHBOUR_INDEX_DEPTH:
+            if self._top_indptr is None:
+                self._build_neighbour_index()
+            # the rows of the neighbour index are already sorted, so the best edges are their first entries
+            starts = self._top_indptr[sources]
+            counts = numpy.minimum(self._top_indptr[sources + 1] - starts, k)
+            positions = get_ranges(starts, counts)
+            return numpy.repeat(numpy.arange(len(sources)), counts), self._top_indices[positions], \
+                self._top_scores[positions]
+
+        # past the neighbour index, the k best edges are picked with argpartition rather than with
+        # heapq.nlargest over each song's edges: sources can hold many songs (see recommend_batch),
+        # and one argpartition over all their rows replaces a Python-level heap per song, with the
+        # same ranking and tie order
+        if self._indptr is None:
+            self._merge_edges()
+        starts = self._indptr[sources]
+        degrees = self._indptr[sources + 1] - starts
+        width = int(degrees.max(initial=0))
+
+        # lay the edges of each song out in a row, in creation order, padded with -inf
+        rows = numpy.repeat(numpy.arange(len(sources)), degrees)
+        columns = numpy.arange(len(rows)) - numpy.repeat(numpy.cumsum(degrees) - degrees, degrees)
+        padded = numpy.full((len(sources), width), -numpy.inf, dtype=numpy.float32)
+        padded[rows, columns] = self._scores[starts[rows] + columns]
+
+        # among equal scores, the most recently created edge (the one further right) comes first
+        rows, columns = numpy.nonzero(get_top_k_mask(padded, k))
+        order = numpy.lexsort((-columns, -padded[rows, columns], rows))
+        rows, columns = rows[order], columns[order]
+        return rows, self._indices[starts[rows] + columns], padded[rows, columns]
+
+    def get_co_occurrences(self, i: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the indices of the neighbours of the song with index i, in the order their edges
+        were created, and the number of playlists the song shares with each of them."""
+        if self._indptr is None:
+            self._merge_edges()
+        start, end = self._indptr[i], self._indptr[i + 1]
+        return self._indices[start:end], self._counts[start:end]
+
+    def to_arrays(self) -> dict[str, numpy.ndarray]:
+        """Return the edges as a mapping of names to NumPy arrays (see MusicGraph.to_arrays)."""
+        if self._top_indptr is None:
+            self._build_neighbour_index()
+        return {
+            'edge_first': self._edge_first,
+            'edge_second': self._edge_second,
+            'edge_scores': self._edge_scores,
+            'edge_counts': self._edge_counts,
+            'indptr': self._indptr,
+            'indices': self._indices,
+            'scores': self._scores,
+            'counts': self._counts,
+            'top_indptr': self._top_indptr,
+            'top_indices': self._top_indices,
+            'top_scores': self._top_scores
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, numpy.ndarray], num_songs: int) -> EdgeStorage:
+        """Return the storage of a music graph of num_songs songs with the edges given by arrays, as
+        returned by to_arrays, without copying them.
+
+        Preconditions:
+            - arrays has the keys and shapes produced by EdgeStorage.to_arrays
+        """
+        storage = cls()
+        storage._num_songs = num_songs
+        storage._edge_first = arrays['edge_first']
+        storage._edge_second = arrays['edge_second']
+        storage._edge_scores = arrays['edge_scores']
+        storage._edge_counts = arrays['edge_counts']
+        storage._indptr = arrays['indptr']
+        storage._indices = arrays['indices']
+        storage._scores = arrays['scores']
+        storage._counts = arrays['counts']
+        storage._top_indptr = arrays['top_indptr']
+        storage._top_indices = arrays['top_indices']
+        storage._top_scores = arrays['top_scores']
+        return storage
+
+    def _merge_edges(self) -> None:
+        """Merge the pending edges into the edges and rebuild the CSR adjacency.
+
+        When the same pair of songs was connected more than once, only the earliest edge is kept,
+        with the sum of the playlist counts of all the edges.
+        """
+        n = self._num_songs
+        first = numpy.concatenate([self._edge_first] + [edges[0] for edges in self._pending])
+        second = numpy.concatenate([self._edge_second] + [edges[1] for edges in self._pending])
+        scores = numpy.concatenate([self._edge_scores] + [edges[2] for edges in self._pending])
+        counts = numpy.concatenate([self._edge_counts] + [edges[3] for edges in self._pending])
+        self._pending = []
+
+        keys = numpy.minimum(first, second).astype(numpy.int64) * n + numpy.maximum(first, second)
+        keep, totals = get_first_occurrences(keys, counts)
+        self._edge_first, self._edge_second, self._edge_scores = first[keep], second[keep], scores[keep]
+        self._edge_counts = totals.astype(numpy.int32)
+
+        # every undirected edge appears in the adjacency of both of its endpoints, and with its two
+        # directions next to each other, a stable sort by row keeps each row in creation order
+        rows = numpy.stack([self._edge_first, self._edge_second], axis=1).ravel()
+        columns = numpy.stack([self._edge_second, self._edge_first], axis=1).ravel()
+        order = get_stable_order(rows)
+
+        self._indices = columns[order]
+        self._scores = numpy.repeat(self._edge_scores, 2)[order]
+        self._counts = numpy.repeat(self._edge_counts, 2)[order]
+        self._indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(rows, minlength=n), out=self._indptr[1:])
+        self._top_indptr = None
+
+    def _build_neighbour_index(self) -> None:
+        """Build the neighbour index from the CSR adjacency, merging the pending edges first if needed."""
+        if self._indptr is None:
+            self._merge_edges()
+
+        n = self._num_songs
+        degrees = numpy.diff(self._indptr)
+        rows = numpy.repeat(numpy.arange(n), degrees)
+        positions = numpy.arange(len(self._indices))
+
+        # sort each row by decreasing score, then by decreasing creation order, then keep its first entries
+        order = numpy.lexsort((-positions, -self._scores, rows))
+        keep = order[positions - self._indptr[rows] < NEIGHBOUR_INDEX_DEPTH]
+
+        self._top_indices = self._indices[keep]
+        self._top_scores = self._scores[keep]
+        self._top_indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.minimum(degrees, NEIGHBOUR_INDEX_DEPTH), out=self._top_indptr[1:])
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'numpy', 'edge_scoring'],
+        'allowed-io': [],
+        'max-line-length': 120
+    })
@@ -0,0 +1,200 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains functions for saving a MusicGraph to an on-disk snapshot and loading it
+back, so that the graph does not have to be rebuilt from the CSV files every time the program starts.
+
+A snapshot is a directory containing one .npy file for each array returned by
+MusicGraph.to_arrays, along with a manifest.json file that records the snapshot format version
+and the modification time and content hash of every CSV file the graph was built from. The .npy
+files are loaded with numpy.load(mmap_mode='r'), so loading a snapshot only maps the files into
+memory, and several processes that load the same snapshot share the same pages.
+
+A snapshot is stale (and is rebuilt by load_music_graph) if its format version is not
+SNAPSHOT_VERSION, if CSV files were added to or removed from the data directory, or if the
+modification time or content hash of any CSV file changed. A snapshot also keeps the BuildState
+of the build it was made from (in its BUILD_STATE_DIR subdirectory), so that rebuilding a stale
+snapshot only re-reads and re-scores what changed.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Optional
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+from build_music_graph import build_music_graph, get_csv_files
+from build_state import BuildState
+from music_graph import MusicGraph
+
+# The version of the snapshot format. Snapshots with a different version are never loaded.
+SNAPSHOT_VERSION = 4
+
+# The name of the manifest file inside a snapshot directory.
+MANIFEST_FILE = 'manifest.json'
+
+# The name of the subdirectory of a snapshot directory that holds the BuildState of the snapshot.
+BUILD_STATE_DIR = 'build_state'
+
+
+# @check_contracts
+def load_music_graph(data_dir: str, snapshot_dir: str) -> MusicGraph:
+    """Return the MusicGraph for the CSV files in data_dir, loading it from the snapshot in
+    snapshot_dir if the snapshot is up to date.
+
+    Otherwise, build the MusicGraph from data_dir (incrementally, starting from the build state
+    saved with the old snapshot, if there is one), save it as a new snapshot in snapshot_dir
+    (replacing the old snapshot), and return the graph loaded from the new snapshot.
+
+    Preconditions:
+        - data_dir is a data directory in the format required by build_music_graph
+    """
+    if not is_snapshot_fresh(snapshot_dir, data_dir):
+        state = BuildState.load(os.path.join(snapshot_dir, BUILD_STATE_DIR))
+        music_graph = build_music_graph(data_dir, state)
+        save_snapshot(music_graph, snapshot_dir, data_dir, state)
+
+    return load_snapshot(snapshot_dir)
+
+
+# @check_contracts
+def save_snapshot(music_graph: MusicGraph, snapshot_dir: str, data_dir: str,
+                  state: Optional[BuildState] = None) -> None:
+    """Save music_graph as a snapshot in snapshot_dir, recording the state of the CSV files in
+    data_dir that it was built from. Any existing snapshot in snapshot_dir is replaced.
+
+    If state is given, it is the BuildState of the build of music_graph, and it is saved with the
+    snapshot so that the next rebuild can be incremental.
+
+    The snapshot is first written to a temporary directory next to snapshot_dir, so a snapshot
+    that was only partially written is never loaded.
+
+    Preconditions:
+        - music_graph was built from the CSV files in data_dir
+    """
+    temporary_dir = snapshot_dir.rstrip(os.sep) + '.tmp'
+    if os.path.exists(temporary_dir):
+        shutil.rmtree(temporary_dir)
+    os.makedirs(temporary_dir)
+
+    arrays = music_graph.to_arrays()
+    for name, array in arrays.items():
+        numpy.save(os.path.join(temporary_dir, name + '.npy'), numpy.ascontiguousarray(array))
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'arrays': sorted(arrays),
+        'files': _describe_csv_files(data_dir, with_hashes=True)
+    }
+    with open(os.path.join(temporary_dir, MANIFEST_FILE), 'w', encoding='utf8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+
+    if state is not None:
+        state.save(os.path.join(temporary_dir, BUILD_STATE_DIR))
+
+    if os.path.exists(snapshot_dir):
+        shutil.rmtree(snapshot_dir)
+    os.replace(temporary_dir, snapshot_dir)
+
+
+# @check_contracts
+def load_snapshot(snapshot_dir: str) -> MusicGraph:
+    """Return the MusicGraph saved in snapshot_dir, with its arrays memory-mapped read-only.
+
+    Raise ValueError if snapshot_dir does not contain a snapshot of version SNAPSHOT_VERSION.
+    """
+    manifest = _read_manifest(snapshot_dir)
+    if manifest is None:
+        raise ValueError(f'{snapshot_dir} does not contain a version {SNAPSHOT_VERSION} snapshot')
+
+    arrays = {name: numpy.load(os.path.join(snapshot_dir, name + '.npy'), mmap_mode='r')
+              for name in manifest['arrays']}
+    return MusicGraph.from_arrays(arrays)
+
+
+# @check_contracts
+def is_snapshot_fresh(snapshot_dir: str, data_dir: str) -> bool:
+    """Return whether snapshot_dir contains a snapshot of version SNAPSHOT_VERSION that was built
+    from exactly the CSV files currently in data_dir, with the same modification times and contents.
+    """
+    manifest = _read_manifest(snapshot_dir)
+    if manifest is None:
+        return False
+
+    # compare modification times first, so that no file is hashed if any file was touched
+    current_files = _describe_csv_files(data_dir, with_hashes=False)
+    saved_files = manifest['files']
+    if current_files.keys() != saved_files.keys() or \
+            any(current_files[f]['mtime_ns'] != saved_files[f]['mtime_ns'] for f in current_files):
+        return False
+
+    return all(_hash_file(os.path.join(data_dir, f)) == saved_files[f]['sha256'] for f in current_files)
+
+
+# @check_contracts
+def _read_manifest(snapshot_dir: str) -> dict | None:
+    """Return the manifest of the snapshot in snapshot_dir, or None if there is no snapshot there or
+    its version is not SNAPSHOT_VERSION.
+    """
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+        return None
+
+    with open(manifest_path, encoding='utf8') as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        return None
+    return manifest
+
+
+# @check_contracts
+def _describe_csv_files(data_dir: str, with_hashes: bool) -> dict[str, dict]:
+    """Return a mapping from the path (relative to data_dir) of each CSV file that
+    build_music_graph reads from data_dir to its modification time and, if with_hashes is True,
+    the SHA-256 hash of its contents.
+    """
+    description = {}
+    for csv_file in get_csv_files(data_dir):
+        file_info = {'mtime_ns': os.stat(csv_file).st_mtime_ns}
+        if with_hashes:
+            file_info['sha256'] = _hash_file(csv_file)
+        description[os.path.relpath(csv_file, data_dir)] = file_info
+
+    return description
+
+
+# @check_contracts
+def _hash_file(path: str) -> str:
+    """Return the hexadecimal SHA-256 hash of the contents of the file at path."""
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['hashlib', 'json', 'os', 'shutil', 'typing', 'numpy', 'build_music_graph',
+                          'build_state', 'music_graph'],
+        'allowed-io': ['save_snapshot', '_read_manifest', '_hash_file'],
+        'max-line-length': 120
+    })
@@ -3,6 +3,15 @@
 This module contains the code responsible for using the Python libraries Networkx, MatPlotLib, and Tkinter
 to create the MusicMapper GUI and integrate the functionality.
 
+Finding the recommendations and laying out their graph happen on a worker thread, so the window
+stays responsive while they run. The worker sends its results back through a queue, which the Tk
+event loop polls with after(), since only the thread running the event loop may touch the widgets.
+
+The recommendations always form a star around the input song, so they are laid out with a cheap
+radial layout by default, and the positions are cached per input song, so that changing the number
+of songs does not move the songs already shown. The graph is drawn by a PlaylistPlot, which keeps
+its matplotlib artists and updates them in place instead of clearing the axes and drawing again.
+
 Copyright and Usage Information
 ===============================
 This file is provided solely for the personal and private use of the CSC111
@@ -10,25 +19,48 @@ community at the University of Toronto St. George campus.
 
 This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
 """
+from __future__ import annotations
 
 # imports for tkinter
-from tkinter import ttk, Tk, StringVar
+from tkinter import ttk, Tk, StringVar, messagebox
 import tkinter
 
-from typing import Any
+import math
+import queue
+import threading
+from typing import Any, Callable, Optional, Union
 
 # imports for networkx
 import networkx as nx
+import numpy
 
 # imports for matplotlib
 from matplotlib.backends.backend_tkagg import (
     FigureCanvasTkAgg, NavigationToolbar2Tk)
+from matplotlib.collections import LineCollection
 from matplotlib.figure import Figure
 
 # imports for MusicMapper
 # from python_ta.contracts import check_contracts
 from music_graph import MusicGraph
 
+# How often (in milliseconds) the event loop checks whether the worker thread has finished a request.
+POLL_INTERVAL_MS = 50
+
+# The most songs that can be recommended at once.
+MAX_SONGS = 50
+
+# The layouts the recommendations can be drawn with: 'radial' (see radial_layout) or 'spring'
+# (networkx's spring layout, started from the cached positions).
+LAYOUTS = ('radial', 'spring')
+
+# The angle between consecutive songs in radial_layout: the golden angle, which spreads any number
+# of songs evenly around the input song without depending on how many there are.
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+# The x and y limits of the axes. Both layouts place every node within distance 1 of the centre.
+AXES_LIMIT = 1.3
+
 
 # @check_contracts
 class MainFrame:
@@ -42,9 +74,22 @@ class MainFrame:
         - artist_input: Represents the user artist input.
         - num_songs_input: Represents the desired song number input.
         - artist_entry: Creates an entry box for the user to input artist name.
-        - song_entry: Creates an entry box for the user to input song name.
+        - song_entry: Creates an entry box for the user to input song name, which suggests matching songs.
+        - suggestions: The songs currently suggested by song_entry, as returned by MusicGraph.search.
         - num_songs_entry: Creates a spinbox for the user to choose the number of recommended songs.
         - create_playlist_button: Creates a button object.
+        - progress_bar: Shows that recommendations are being found while a request is in progress.
+        - request_number:
+            The number of the latest request for recommendations. The results of earlier requests
+            are superseded, so they are dropped (or never computed).
+        - requests: The requests the worker thread has not started yet, with their numbers.
+        - results: The results the worker thread has finished but the event loop has not shown yet.
+        - worker: The thread that finds the recommendations and lays out their graph.
+        - layout: The layout the recommendations are drawn with, one of LAYOUTS.
+        - layouts:
+            Maps the Spotify ID of each input song to the positions of the nodes of its graphs laid
+            out so far. Only the worker thread uses it.
+        - plot: The artists that draw the graph on ax.
         - playlists_graph: Creates a networkx graph object.
         - fig: Creates a figure object.
         - canvas: Creates a canvas object.
@@ -62,17 +107,29 @@ class MainFrame:
     artist_input: StringVar
     num_songs_input: StringVar
     artist_entry: ttk.Entry
-    song_entry: ttk.Entry
+    song_entry: ttk.Combobox
+    suggestions: list[tuple[str, str, list[str]]]
     num_songs_entry: ttk.Spinbox
     create_playlist_button: ttk.Button
+    progress_bar: ttk.Progressbar
+    request_number: int
+    requests: queue.Queue
+    results: queue.Queue
+    worker: threading.Thread
+    layout: str
+    layouts: dict[str, dict]
+    plot: PlaylistPlot
     playlists_graph: nx.Graph
     fig: Figure
     canvas: FigureCanvasTkAgg
     toolbar: NavigationToolbar2Tk
     ax: Any
 
-    def __init__(self, main_frm: Tk, music_graph: MusicGraph) -> None:
-        """Initialize the tkinter interface.
+    def __init__(self, main_frm: Tk, music_graph: MusicGraph, layout: str = 'radial') -> None:
+        """Initialize the tkinter interface, which draws the recommendations with the given layout.
+
+        Preconditions:
+            - layout in LAYOUTS
         """
         # initialize root frame
         self.main_frm = main_frm
@@ -89,9 +146,13 @@ class MainFrame:
 
         # (user-input) song entry
         self.song_input = StringVar()
-        self.song_entry = ttk.Entry(main_frm, textvariable=self.song_input)
+        self.song_entry = ttk.Combobox(main_frm, textvariable=self.song_input)
         # entry textbox placeholder
         self.song_entry.insert(0, 'Enter a Song')
+        # suggest matching songs as the user types, and fill in both entries when one is picked
+        self.suggestions = []
+        self.song_entry.bind('<KeyRelease>', self.update_suggestions)
+        self.song_entry.bind('<<ComboboxSelected>>', self.select_suggestion)
 
         # (user-input) artist entry
         self.artist_input = StringVar()
@@ -102,15 +163,26 @@ class MainFrame:
         # (user-input) number of songs
         self.num_songs_input = StringVar()
         self.num_songs_entry = ttk.Spinbox(
-            main_frm, from_=1, to=50, textvariable=self.num_songs_input, state='readonly')
+            main_frm, from_=1, to=MAX_SONGS, textvariable=self.num_songs_input, state='readonly')
         self.num_songs_entry.insert(0, '1')
 
         # create playlist button
         self.create_playlist_button = ttk.Button(
             main_frm, text='Create Playlist')
         # add button functionality
-        self.create_playlist_button['command'] = lambda: [
-            self.graph_playlist()]
+        self.create_playlist_button['command'] = self.graph_playlist
+
+        # busy indicator, shown while a request is in progress
+        self.progress_bar = ttk.Progressbar(main_frm, mode='indeterminate')
+
+        # the worker thread, and the queues to and from it
+        self.request_number = 0
+        self.layout = layout
+        self.layouts = {}
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = threading.Thread(target=self.run_requests, daemon=True)
+        self.worker.start()
 
         # ********** graph elements
         # create graph object
@@ -126,6 +198,8 @@ class MainFrame:
         self.ax = self.fig.add_axes([0, 0, 1, 1])
         # removes axis frame that obscures graph
         self.ax.axis('off')
+        # the artists of the graph, which are updated for every new graph
+        self.plot = PlaylistPlot(self.ax)
 
         # adjust widget positions
         self.title_label.pack()
@@ -134,31 +208,90 @@ class MainFrame:
         self.num_songs_entry.pack()
         self.create_playlist_button.pack()
 
+    def update_suggestions(self, event: tkinter.Event) -> None:
+        """Replace the songs suggested by the song entry with those that best match what has been typed.
+        """
+        # keys that move through the suggestions do not change what has been typed
+        if event.keysym in ('Up', 'Down', 'Return', 'Escape'):
+            return
+
+        self.suggestions = self.music_graph.search(self.song_entry.get(), 10)
+        self.song_entry['values'] = [f'{track_name} - {", ".join(artist_names)}'
+                                     for _, track_name, artist_names in self.suggestions]
+
+    def select_suggestion(self, _event: tkinter.Event) -> None:
+        """Fill in the song entry and the artist entry with the suggested song that was picked.
+        """
+        _, track_name, artist_names = self.suggestions[self.song_entry.current()]
+        self.song_entry.set(track_name)
+        self.artist_entry.delete(0, tkinter.END)
+        self.artist_entry.insert(0, artist_names[0])
+
     def graph_playlist(self) -> None:
         """Executes MusicMapper's playlist recommendation algorithm via a button click and represents the results as an
         undirected graph.
-        """
-        # clears axis and graph to remove the previous graph
-        self.ax.clear()
-        self.playlists_graph.clear()
 
+        The recommendations are found on the worker thread, and show_playlist draws them once they
+        are ready. A click supersedes the requests of the earlier clicks that are still in progress.
+        """
         # ********** recommendation algorithm
-        input_song = self.button_click()[0]
-        input_artist = self.button_click()[1]
-        num_songs = self.button_click()[2]
+        input_song, input_artist, num_songs = self.button_click()
 
-        spotify_id = self.music_graph.get_spotify_id(input_song, input_artist)
+        self.request_number += 1
+        self.requests.put((self.request_number, input_song, input_artist, num_songs))
 
-        songs = self.music_graph.get_recommendations(spotify_id, num_songs)
+        # unless the results are already being polled for, start polling
+        if not self.progress_bar.winfo_manager():
+            self.progress_bar.pack()
+            self.progress_bar.start()
+            self.main_frm.after(POLL_INTERVAL_MS, self.check_results)
 
-        # use loop to create the graph nodes and edges
-        for song in songs:
-            self.playlists_graph.add_edge(input_song, song[0], weight=song[1])
+    def run_requests(self) -> None:
+        """Answer the requests put in self.requests, forever. This runs on the worker thread.
+
+        A request that was superseded before it started is skipped, and one that is superseded while
+        it runs is abandoned between its steps. A request that fails sends its exception back as its
+        result, so that the thread keeps answering the later requests.
+        """
+        while True:
+            number, input_song, input_artist, num_songs = self.requests.get()
+            if number != self.request_number:
+                continue
+
+            result = answer_request(self.music_graph, input_song, input_artist, num_songs,
+                                    lambda: number != self.request_number, self.layouts, self.layout)
+            self.results.put((number, result))
+
+    def check_results(self) -> None:
+        """Show the result of the latest request if the worker thread has finished it, or check
+        again later if it has not. This runs on the event loop.
+        """
+        while not self.results.empty():
+            number, result = self.results.get()
+            if number != self.request_number:
+                # superseded by a later click
+                continue
+
+            self.progress_bar.stop()
+            self.progress_bar.pack_forget()
+            if isinstance(result, ValueError):
+                messagebox.showerror('Song not found', str(result))
+            elif isinstance(result, Exception):
+                messagebox.showerror('Could not find recommendations', f'{type(result).__name__}: {result}')
+            elif result is not None:
+                self.show_playlist(*result)
+            return
+
+        self.main_frm.after(POLL_INTERVAL_MS, self.check_results)
+
+    def show_playlist(self, playlist_graph: nx.Graph, pos: dict) -> None:
+        """Replace the graph shown with playlist_graph, with its nodes at the positions in pos."""
+        self.playlists_graph = playlist_graph
 
         # produce graph with weighted edges
-        self.create_weighted_edges(self.playlists_graph)
+        self.create_weighted_edges(self.playlists_graph, pos)
 
-    def create_weighted_edges(self, playlist_graph: nx.Graph()) -> None:
+    def create_weighted_edges(self, playlist_graph: nx.Graph(), pos: dict) -> None:
         """Produces the graph's weighted edges and embeds the graph in the tkinter interface.
         """
         # filter edges with high v.s. low similarity scores into two separate lists
@@ -167,37 +300,17 @@ class MainFrame:
         esmall = [(song1, song2) for (song1, song2, weights) in playlist_graph.edges(data=True) if
                   weights["weight"] <= 50]
 
-        # node positions (dict where each key is a node that corresponds to its position)
-        pos = nx.spring_layout(playlist_graph, seed=7)
         # adds canvas to interface
         self.canvas.get_tk_widget().pack(side=tkinter.TOP, fill=tkinter.BOTH, expand=1)
 
         # call to draw_graph
         self.draw_graph(playlist_graph, pos, elarge, esmall)
-        self.canvas.draw()
+        self.canvas.draw_idle()
 
     def draw_graph(self, playlist_graph: nx.Graph(), pos: dict, elarge: list, esmall: list) -> None:
-        """Draws the nodes, edges, and labels of the graph.
+        """Draws the nodes, edges, and labels of the graph, by updating the artists of self.plot.
         """
-        # draw graph nodes
-        nx.draw_networkx_nodes(playlist_graph, pos,
-                               node_size=850, node_color="#2a9d8f", ax=self.ax)
-        # draw node labels
-        nx.draw_networkx_labels(
-            playlist_graph, pos, font_size=23, font_family="Times New Roman", ax=self.ax)
-
-        # draw the solid edges (high similarity score)
-        nx.draw_networkx_edges(
-            playlist_graph, pos, edgelist=elarge, width=6, edge_color="#e76f51", ax=self.ax)
-        # draw the dashed edges (low similarity score)
-        nx.draw_networkx_edges(playlist_graph, pos, edgelist=esmall, width=6, alpha=0.5, edge_color="#264653",
-                               style="dashed", ax=self.ax)
-
-        # gets similarity score for each edge via the "weight" attribute. {(song1, song2): similarity_score)}
-        edge_labels = nx.get_edge_attributes(playlist_graph, "weight")
-        # display the similarity score on the edges
-        nx.draw_networkx_edge_labels(playlist_graph, pos, edge_labels, font_family="Times New Roman",
-                                     font_size=17, ax=self.ax)
+        self.plot.update(playlist_graph, pos, elarge, esmall)
 
     def button_click(self) -> tuple[str, str, int]:
         """Records and returns the song input and artist input upon button click.
@@ -210,6 +323,180 @@ class MainFrame:
         return (retrieve_song_input, retrieve_artist_input, retrieve_num_songs_input)
 
 
+# @check_contracts
+class PlaylistPlot:
+    """The matplotlib artists that draw a graph of recommendations on an axes.
+
+    The artists are created once and updated in place for every new graph, which is much faster
+    than clearing the axes and drawing the graph with networkx again.
+
+    Instance Attributes:
+        - ax: The axes the graph is drawn on.
+        - nodes: The nodes of the graph.
+        - strong_edges: The solid edges (high similarity score).
+        - weak_edges: The dashed edges (low similarity score).
+        - node_labels: The labels of the nodes. The ones past the number of nodes are hidden.
+        - edge_labels: The similarity scores of the edges. The ones past the number of edges are hidden.
+    """
+    ax: Any
+    nodes: Any
+    strong_edges: LineCollection
+    weak_edges: LineCollection
+    node_labels: list
+    edge_labels: list
+
+    def __init__(self, ax: Any) -> None:
+        """Initialize the (empty) artists of a graph drawn on ax."""
+        self.ax = ax
+        self.strong_edges = LineCollection([], linewidths=6, colors="#e76f51", zorder=1)
+        self.weak_edges = LineCollection([], linewidths=6, alpha=0.5, colors="#264653", linestyles="dashed",
+                                         zorder=1)
+        ax.add_collection(self.strong_edges)
+        ax.add_collection(self.weak_edges)
+        self.nodes = ax.scatter([], [], s=850, c="#2a9d8f", zorder=2)
+        self.node_labels = []
+        self.edge_labels = []
+
+        ax.set_xlim(-AXES_LIMIT, AXES_LIMIT)
+        ax.set_ylim(-AXES_LIMIT, AXES_LIMIT)
+
+    def update(self, playlist_graph: nx.Graph, pos: dict, elarge: list, esmall: list) -> None:
+        """Draw playlist_graph, with its nodes at the positions in pos, and the edges in elarge
+        solid and the edges in esmall dashed.
+        """
+        self.nodes.set_offsets([pos[node] for node in playlist_graph] or numpy.zeros((0, 2)))
+        self.strong_edges.set_segments([(pos[song1], pos[song2]) for song1, song2 in elarge])
+        self.weak_edges.set_segments([(pos[song1], pos[song2]) for song1, song2 in esmall])
+
+        _set_texts(self.ax, self.node_labels, [(pos[node], str(node), 0.0) for node in playlist_graph],
+                   {'fontsize': 23, 'fontfamily': "Times New Roman", 'zorder': 3})
+
+        # display the similarity score on the middle of each edge, along the edge
+        edge_labels = []
+        for song1, song2, weights in playlist_graph.edges(data=True):
+            (x1, y1), (x2, y2) = pos[song1], pos[song2]
+            angle = math.degrees(math.atan2(y2 - y1, x2 - x1))
+            if angle > 90:
+                angle -= 180
+            elif angle <= -90:
+                angle += 180
+            edge_labels.append((((x1 + x2) / 2, (y1 + y2) / 2), str(weights["weight"]), angle))
+
+        _set_texts(self.ax, self.edge_labels, edge_labels,
+                   {'fontsize': 17, 'fontfamily': "Times New Roman", 'zorder': 3, 'rotation_mode': 'anchor',
+                    'bbox': {'boxstyle': 'round', 'ec': (1.0, 1.0, 1.0), 'fc': (1.0, 1.0, 1.0)}})
+
+
+# @check_contracts
+def _set_texts(ax: Any, texts: list, contents: list[tuple[tuple[float, float], str, float]], style: dict) -> None:
+    """Make the first len(contents) Text artists in texts show contents, as (position, text, rotation)
+    tuples, and hide the rest. New Text artists with the given style are added to ax (and texts) if
+    there are not enough of them."""
+    while len(texts) < len(contents):
+        texts.append(ax.text(0.0, 0.0, '', horizontalalignment='center', verticalalignment='center', **style))
+
+    for text, (position, content, rotation) in zip(texts, contents):
+        text.set_position(position)
+        text.set_text(content)
+        text.set_rotation(rotation)
+        text.set_visible(True)
+    for text in texts[len(contents):]:
+        text.set_visible(False)
+
+
+# @check_contracts
+def radial_layout(input_song: str, song_names: list[str]) -> dict:
+    """Return the positions of the nodes of the graph of the recommendations named song_names (best
+    first) for input_song: input_song is at the centre, and the k-th recommendation is at angle
+    k * GOLDEN_ANGLE, further from the centre the worse it is.
+
+    The position of a recommendation only depends on its rank, so asking for more recommendations
+    does not move the ones that were already shown.
+
+    >>> positions = radial_layout('a', ['b', 'c'])
+    >>> positions['a'], positions['b']
+    ((0.0, 0.0), (0.5, 0.0))
+    """
+    positions = {input_song: (0.0, 0.0)}
+    for rank, name in enumerate(song_names):
+        if name not in positions:
+            radius = 0.5 + 0.5 * math.sqrt(rank / (MAX_SONGS - 1))
+            positions[name] = (radius * math.cos(rank * GOLDEN_ANGLE), radius * math.sin(rank * GOLDEN_ANGLE))
+
+    return positions
+
+
+# @check_contracts
+def find_playlist(music_graph: MusicGraph, input_song: str, input_artist: str, num_songs: int,
+                  is_cancelled: Callable[[], bool], layouts: dict[str, dict],
+                  layout: str = 'radial') -> Optional[tuple[nx.Graph, dict]]:
+    """Return the graph of the num_songs recommendations for the given song and artist in
+    music_graph, along with the positions of its nodes (a dict where each key is a node that
+    corresponds to its position). This does not touch the GUI, so it can run on any thread.
+
+    The nodes are laid out with the given layout, one of LAYOUTS. layouts maps the Spotify ID of
+    each input song to the positions of the nodes laid out for it so far: they are reused (as the
+    initial positions, for the spring layout), and the new positions are added to it.
+
+    is_cancelled is a function that returns whether the request was superseded. It is checked
+    between the steps, and None is returned as soon as it returns True.
+
+    Raise ValueError if the song is not in music_graph.
+
+    Preconditions:
+        - layout in LAYOUTS
+    """
+    spotify_id = music_graph.get_spotify_id(input_song, input_artist)
+    if is_cancelled():
+        return None
+
+    songs = music_graph.get_recommendations(spotify_id, num_songs)
+    if is_cancelled():
+        return None
+
+    # use loop to create the graph nodes and edges
+    playlist_graph = nx.Graph()
+    for song in songs:
+        playlist_graph.add_edge(input_song, song[0], weight=song[1])
+
+    # node positions, reusing the ones found for the same input song before
+    cached = layouts.setdefault(spotify_id, {})
+    if layout == 'spring':
+        initial = {node: cached[node] for node in playlist_graph if node in cached}
+        pos = nx.spring_layout(playlist_graph, pos=initial or None, seed=7)
+    else:
+        pos = {node: cached.get(node, position)
+               for node, position in radial_layout(input_song, [song[0] for song in songs]).items()}
+    cached.update(pos)
+
+    return playlist_graph, pos
+
+
+# @check_contracts
+def answer_request(music_graph: MusicGraph, input_song: str, input_artist: str, num_songs: int,
+                   is_cancelled: Callable[[], bool], layouts: dict[str, dict],
+                   layout: str = 'radial') -> Union[tuple[nx.Graph, dict], Exception, None]:
+    """Return the result of find_playlist with the given arguments, or the exception it raised if
+    it failed, so that the worker thread can send it to the event loop instead of dying.
+
+    >>> from music_graph import NUM_TRAITS
+    >>> from music_graph_components import Song
+    >>> music_graph = MusicGraph()
+    >>> music_graph.add_song(Song('id', 'Song', ['Artist'], [0.5] * NUM_TRAITS))
+    >>> answer_request(music_graph, 'Other Song', 'Artist', 5, lambda: False, {})
+    ValueError("There is no song called 'Other Song' by 'Artist'.")
+    >>> answer_request(music_graph, 'Song', 'Artist', 5, lambda: 1 / 0, {})
+    ZeroDivisionError('division by zero')
+
+    Preconditions:
+        - layout in LAYOUTS
+    """
+    try:
+        return find_playlist(music_graph, input_song, input_artist, num_songs, is_cancelled, layouts, layout)
+    except Exception as error:  # pylint: disable=broad-except
+        return error
+
+
 if __name__ == '__main__':
     import doctest
 
@@ -218,8 +505,9 @@ if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['networkx', 'matplotlib.backends.backend_tkagg', 'tkinter', 'matplotlib.figure',
-                          'matplotlib', 'music_graph', 'build_music_graph'],
+        'extra-imports': ['math', 'queue', 'threading', 'typing', 'networkx', 'numpy',
+                          'matplotlib.backends.backend_tkagg', 'matplotlib.collections', 'tkinter',
+                          'matplotlib.figure', 'matplotlib', 'music_graph', 'build_music_graph'],
         'allowed-io': [],
         'disable': ['R0902'],
         'max-line-length': 120,
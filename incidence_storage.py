@@ -0,0 +1,288 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the IncidenceStorage class, a way for a MusicGraph to store its edges
+without keeping any edges at all: only which songs are in which playlist, and the traits each
+song had when each of its playlists was added.
+
+Since the traits have length 1, the score of an edge is (1 + the dot product of the traits of its
+songs) / 2, so the edges of a song are scored when it is queried, from the songs that share a
+playlist with it. This takes memory linear in the total length of the playlists, instead of
+quadratic in the length of each playlist, and gives the same recommendations as EdgeStorage
+(see edge_storage), whose methods IncidenceStorage shares.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+from edge_scoring import get_ranges, score_pairs
+
+
+# @check_contracts
+class IncidenceStorage:
+    """The playlists of a MusicGraph, from which its edges are scored when they are queried.
+
+    Representation Invariants:
+        - self._num_songs >= 0
+        - len(self._current_versions) >= self._num_songs
+        - len(self._playlist_members) == len(self._member_versions) == self._playlist_indptr[-1]
+    """
+    # Private Instance Attributes:
+    #     - _num_songs:
+    #         The number of songs of the music graph, whose indices are 0 to _num_songs - 1.
+    #     - _playlist_indptr, _playlist_members, _member_versions:
+    #         The merged playlists, in the order they were added, as a CSR song-playlist incidence
+    #         matrix: the songs of playlist p are _playlist_members[_playlist_indptr[p]:_playlist_indptr[p + 1]],
+    #         in order, and the song at entry e had the traits in row _member_versions[e] of
+    #         _version_traits when the playlist was added.
+    #     - _version_traits:
+    #         A float32 matrix of every version of the songs' traits that a playlist was added with.
+    #     - _current_versions:
+    #         The row of _version_traits holding the current traits of each song, by index, or -1 if
+    #         the song's traits have not been used by a playlist since they last changed.
+    #     - _num_versions:
+    #         The number of versions of the songs' traits, including the pending ones.
+    #     - _pending_playlists, _pending_versions:
+    #         The (songs, trait versions) of the playlists added since the playlists were last
+    #         merged, and the rows of _version_traits added since then.
+    #     - _song_indptr, _song_entries:
+    #         The transposed incidence matrix: _song_entries[_song_indptr[i]:_song_indptr[i + 1]] are
+    #         the entries of _playlist_members of the first occurrence of song i in each of its
+    #         playlists, in playlist order. _song_indptr is None if it needs to be rebuilt.
+    _num_songs: int
+    _playlist_indptr: numpy.ndarray
+    _playlist_members: numpy.ndarray
+    _member_versions: numpy.ndarray
+    _version_traits: numpy.ndarray
+    _current_versions: numpy.ndarray
+    _num_versions: int
+    _pending_playlists: list[tuple[numpy.ndarray, numpy.ndarray]]
+    _pending_versions: list[numpy.ndarray]
+    _song_indptr: numpy.ndarray | None
+    _song_entries: numpy.ndarray
+
+    def __init__(self, num_traits: int) -> None:
+        """Initialize the storage of a music graph without any songs or playlists, whose songs have
+        num_traits numerical traits."""
+        self._num_songs = 0
+        self._playlist_indptr = numpy.zeros(1, dtype=numpy.int64)
+        self._playlist_members = numpy.zeros(0, dtype=numpy.int32)
+        self._member_versions = numpy.zeros(0, dtype=numpy.int32)
+        self._version_traits = numpy.zeros((0, num_traits), dtype=numpy.float32)
+        self._current_versions = numpy.zeros(0, dtype=numpy.int64)
+        self._num_versions = 0
+        self._pending_playlists = []
+        self._pending_versions = []
+        self._song_indptr = None
+        self._song_entries = numpy.zeros(0, dtype=numpy.int64)
+
+    def set_num_songs(self, num_songs: int) -> None:
+        """Record that the music graph now has num_songs songs.
+
+        Preconditions:
+            - num_songs >= self._num_songs
+        """
+        if num_songs > len(self._current_versions):
+            # grow geometrically so that adding n songs takes O(n) time overall
+            versions = numpy.full(max(2 * len(self._current_versions), num_songs, 16), -1, dtype=numpy.int64)
+            versions[:self._num_songs] = self._current_versions[:self._num_songs]
+            self._current_versions = versions
+        self._num_songs = num_songs
+        self._song_indptr = None
+
+    def set_traits_changed(self, indices: numpy.ndarray) -> None:
+        """Record that the traits of the songs with the given indices changed, so that the playlists
+        added from now on are scored with their new traits, and the earlier ones with their old traits."""
+        self._current_versions[indices] = -1
+
+    def add_playlist(self, indices: numpy.ndarray, traits: numpy.ndarray) -> None:
+        """Record a playlist of the songs with the given indices, along with their current traits,
+        the rows of traits, the trait matrix of the music graph. The traits of a song are only
+        copied if no playlist was added with them yet.
+
+        Preconditions:
+            - all(0 <= i < self._num_songs for i in indices)
+        """
+        new = numpy.unique(indices[self._current_versions[indices] < 0])
+        if len(new) > 0:
+            self._current_versions[new] = numpy.arange(self._num_versions, self._num_versions + len(new))
+            self._num_versions += len(new)
+            self._pending_versions.append(traits[new])
+
+        self._pending_playlists.append((indices, self._current_versions[indices].astype(numpy.int32)))
+        self._song_indptr = None
+
+    def add_edges(self, first: numpy.ndarray, second: numpy.ndarray, scores: numpy.ndarray,
+                  counts: Optional[numpy.ndarray] = None) -> None:
+        """Raise ValueError, since incidence storage cannot store scored edges."""
+        raise ValueError('a music graph with incidence storage only stores playlists')
+
+    def prune_edges(self, max_neighbours: Optional[int], min_similarity: Optional[float]) -> int:
+        """Raise ValueError, since the edges of incidence storage cannot be removed."""
+        raise ValueError('the edges of a music graph with incidence storage cannot be pruned')
+
+    def get_num_edges(self) -> int:
+        """Return the number of edges.
+
+        The edges of every song are found to count them, which takes time quadratic in the length
+        of each playlist.
+        """
+        return sum(len(self._get_neighbours(i)[0]) for i in range(self._num_songs)) // 2
+
+    def get_edges(self, sources: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """Return (rows, neighbours, scores): every edge of each song with an index in sources, in
+        the order they were created, where the edge to neighbours[e] with score scores[e] is an
+        edge of the song with index sources[rows[e]]. The edges are scored one song at a time."""
+        edges = [self._get_neighbours(i) for i in sources.tolist()]
+        return self._concatenate(edges)
+
+    def get_best_edges(self, sources: numpy.ndarray, k: int) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """Return (rows, neighbours, scores) like get_edges, but only for the k best edges of each
+        song, best first: by decreasing score, and among equal scores, most recently created first."""
+        edges = []
+        for i in sources.tolist():
+            neighbours, scores = self._get_neighbours(i)
+            order = numpy.lexsort((-numpy.arange(len(scores)), -scores))[:k]
+            edges.append((neighbours[order], scores[order]))
+        return self._concatenate(edges)
+
+    def get_co_occurrences(self, i: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the indices of the neighbours of the song with index i, in the order their edges
+        were created, and the number of playlists the song shares with each of them."""
+        neighbours, _ = self._get_neighbours(i)
+        seed_entries, _, entries, owners = self._get_shared_entries(i)
+        # count each song once per playlist, even if it is in the playlist more than once
+        shared = numpy.unique(self._playlist_members[entries].astype(numpy.int64) * len(seed_entries) + owners)
+        songs, totals = numpy.unique(shared // max(len(seed_entries), 1), return_counts=True)
+        return neighbours, totals[numpy.searchsorted(songs, neighbours)]
+
+    def to_arrays(self) -> dict[str, numpy.ndarray]:
+        """Return the playlists as a mapping of names to NumPy arrays (see MusicGraph.to_arrays)."""
+        if self._song_indptr is None:
+            self._merge_playlists()
+        return {
+            'playlist_indptr': self._playlist_indptr,
+            'playlist_members': self._playlist_members,
+            'member_versions': self._member_versions,
+            'version_traits': self._version_traits,
+            'song_indptr': self._song_indptr,
+            'song_entries': self._song_entries
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, numpy.ndarray], num_songs: int) -> IncidenceStorage:
+        """Return the storage of a music graph of num_songs songs with the playlists given by
+        arrays, as returned by to_arrays, without copying them.
+
+        Preconditions:
+            - arrays has the keys and shapes produced by IncidenceStorage.to_arrays
+        """
+        storage = cls(arrays['version_traits'].shape[1])
+        storage.set_num_songs(num_songs)
+        storage._playlist_indptr = arrays['playlist_indptr']
+        storage._playlist_members = arrays['playlist_members']
+        storage._member_versions = arrays['member_versions']
+        storage._version_traits = arrays['version_traits']
+        storage._num_versions = len(storage._version_traits)
+        storage._song_indptr = arrays['song_indptr']
+        storage._song_entries = arrays['song_entries']
+        return storage
+
+    def _get_neighbours(self, i: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the indices of the neighbours of the song with index i and the similarity scores of
+        the edges leading to them, in the order the edges were created.
+
+        The edges are found and scored from the playlists of the song. An edge is created by the
+        first playlist the two songs share, with the traits they had when that playlist was added,
+        and a playlist creates its edges in the order of edge_scoring.score_playlist.
+        """
+        seed_entries, starts, entries, owners = self._get_shared_entries(i)
+        members = self._playlist_members[entries]
+
+        # the first occurrence of each other song creates its edge
+        _, first = numpy.unique(members, return_index=True)
+        first = first[members[first] != i]
+        which = owners[first]
+        seed_positions = (seed_entries - starts)[which]
+        positions = entries[first] - starts[which]
+
+        # score_playlist creates the edge of positions x < y of a playlist in (x, y) order
+        order = numpy.lexsort((numpy.maximum(seed_positions, positions), numpy.minimum(seed_positions, positions),
+                               which))
+        first, which = first[order], which[order]
+        scores = score_pairs(self._version_traits[self._member_versions[seed_entries[which]]],
+                             self._version_traits[self._member_versions[entries[first]]])
+        return members[first], scores
+
+    def _get_shared_entries(self, i: int) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """Return (seed_entries, starts, entries, owners) for the playlists of the song with index i:
+        the entry of the first occurrence of the song and the first entry of each of its playlists,
+        in playlist order, and the entries of every song of those playlists, where entries[e]
+        belongs to the playlist of seed_entries[owners[e]]."""
+        if self._song_indptr is None:
+            self._merge_playlists()
+
+        seed_entries = self._song_entries[self._song_indptr[i]:self._song_indptr[i + 1]]
+        playlists = numpy.searchsorted(self._playlist_indptr, seed_entries, side='right') - 1
+        starts = self._playlist_indptr[playlists]
+        counts = self._playlist_indptr[playlists + 1] - starts
+        return seed_entries, starts, get_ranges(starts, counts), numpy.repeat(numpy.arange(len(playlists)), counts)
+
+    def _merge_playlists(self) -> None:
+        """Merge the pending playlists into the incidence matrix, and rebuild its transpose."""
+        self._playlist_members = numpy.concatenate([self._playlist_members]
+                                                   + [playlist[0] for playlist in self._pending_playlists])
+        self._member_versions = numpy.concatenate([self._member_versions]
+                                                  + [playlist[1] for playlist in self._pending_playlists])
+        lengths = numpy.array([len(playlist[0]) for playlist in self._pending_playlists], dtype=numpy.int64)
+        self._playlist_indptr = numpy.concatenate([self._playlist_indptr,
+                                                   self._playlist_indptr[-1] + numpy.cumsum(lengths)])
+        self._version_traits = numpy.concatenate([self._version_traits] + self._pending_versions)
+        self._pending_playlists, self._pending_versions = [], []
+
+        # sort the entries by song, then by entry, and keep the first entry of each (song, playlist)
+        n = self._num_songs
+        entries = numpy.arange(len(self._playlist_members))
+        playlists = numpy.repeat(numpy.arange(len(self._playlist_indptr) - 1), numpy.diff(self._playlist_indptr))
+        order = numpy.lexsort((entries, self._playlist_members))
+        keys = self._playlist_members[order].astype(numpy.int64) * (len(self._playlist_indptr) - 1) + playlists[order]
+        first = numpy.ones(len(order), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+
+        self._song_entries = order[first]
+        self._song_indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(self._playlist_members[self._song_entries], minlength=n),
+                     out=self._song_indptr[1:])
+
+    @staticmethod
+    def _concatenate(edges: list[tuple[numpy.ndarray, numpy.ndarray]]) \
+            -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """Return the (neighbours, scores) pairs of edges as a single (rows, neighbours, scores) triple,
+        where rows[e] is the position in edges of the pair that neighbours[e] and scores[e] come from."""
+        counts = [len(neighbours) for neighbours, _ in edges]
+        return numpy.repeat(numpy.arange(len(edges)), counts), \
+            numpy.concatenate([numpy.zeros(0, dtype=numpy.int32)] + [neighbours for neighbours, _ in edges]), \
+            numpy.concatenate([numpy.zeros(0, dtype=numpy.float32)] + [scores for _, scores in edges])
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'numpy', 'edge_scoring'],
+        'allowed-io': [],
+        'max-line-length': 120
+    })
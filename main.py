@@ -12,11 +12,11 @@ This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu
 """
 from tkinter import Tk
 from gui import MainFrame
-from build_music_graph import build_music_graph
+from graph_snapshot import load_music_graph
 
 if __name__ == '__main__':
-    # Create our MusicGraph.
-    music_graph = build_music_graph('data')
+    # Create our MusicGraph, reusing the saved snapshot of it if the data has not changed.
+    music_graph = load_music_graph('data', 'data_snapshot')
 
     root = Tk()
     main_frame_window = MainFrame(root, music_graph)
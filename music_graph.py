@@ -2,6 +2,18 @@
 ===============================
 This module contains the MusicGraph class, which is used to represent the network of Songs.
 
+Internally, a MusicGraph does not keep one Python object per Song or per Edge. Each song is
+given an integer index, the numerical traits of all songs live in a single 2-D float32 NumPy
+matrix, and the edges are kept by a storage object: by default, an EdgeStorage (see edge_storage),
+which keeps them as CSR-style (compressed sparse row) arrays of neighbour indices and similarity
+scores, or an IncidenceStorage (see incidence_storage), which only keeps the playlists and scores
+the edges when they are queried. The Song and Edge classes are still available as views:
+indexing a MusicGraph by Spotify ID builds a Song (along with its Edges) on demand.
+
+Artist names are deduplicated: songs with the same artist(s) share a single tuple of names in
+the graph's artist table, and each name is interned, so it is stored once however many songs
+credit it.
+
 Copyright and Usage Information
 ===============================
 This file is provided solely for the personal and private use of the CSC111
@@ -10,26 +22,124 @@ community at the University of Toronto St. George campus.
 This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
 """
 from __future__ import annotations
+
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+import numpy
+
 # from python_ta.contracts import check_contracts
+from ann_index import DEFAULT_N_PROBE, IVFIndex
+from edge_scoring import get_top_k_mask
+from edge_storage import NEIGHBOUR_INDEX_DEPTH, EdgeStorage
+from incidence_storage import IncidenceStorage
 from music_graph_components import Song, Edge
+from recommendation_cache import DEFAULT_MAX_ENTRIES, RecommendationCache
+from song_search import SongSearchIndex, normalize_name
+
+# The number of numerical traits stored for every song (popularity followed by the 12 audio features).
+NUM_TRAITS = 13
+
+# The default factor by which the score of a path is multiplied for every hop after the first, in
+# multi-hop recommendations (see MusicGraph.get_recommendations).
+HOP_DECAY = 0.9
+
+# The default number of seed songs recommend_batch answers at once.
+BATCH_CHUNK_SIZE = 1024
+
+# The separator used to join the artist names of a song when a MusicGraph is converted to arrays.
+ARTIST_SEPARATOR = '\x1f'
+
+# The ways a MusicGraph can store its edges: as scored edges (see EdgeStorage), or as a
+# song-playlist incidence matrix whose edges are scored when they are queried (see IncidenceStorage).
+EDGE_STORAGE, INCIDENCE_STORAGE = 'edges', 'incidence'
+STORAGE_MODES = (EDGE_STORAGE, INCIDENCE_STORAGE)
 
 
 # @check_contracts
 class MusicGraph:
     """A graph that represents the network of all the Songs from the inputted data set.
 
+    Instance Attributes:
+        - storage: How this music graph stores its edges, one of STORAGE_MODES.
+
     Representation Invariants:
-        - all(s == self._songs[s].spotify_id for s in self._songs)
+        - self.storage in STORAGE_MODES
+        - all(self._index[self._ids[i]] == i for i in range(len(self._ids)))
+        - len(self._track_names) == len(self._ids) == len(self._artist_names)
+        - self._traits.shape[0] >= len(self._ids) and self._traits.shape[1] == NUM_TRAITS
+        - isinstance(self._storage, IncidenceStorage) == (self.storage == INCIDENCE_STORAGE)
     """
+    storage: str
     # Private Instance Attributes:
-    #     - _songs:
-    #         A collection of the songs contained in this music graph.
-    #         Maps the spotify_id of the Song to the Song object.
-    _songs: dict[str, Song]
+    #     - _ids:
+    #         The Spotify IDs of the songs in this music graph. The position of a Spotify ID
+    #         in this list is the index of that song.
+    #     - _index:
+    #         Maps the spotify_id of a Song to its index.
+    #     - _track_names:
+    #         The track name of each song, by index.
+    #     - _artist_names:
+    #         The artist name(s) of each song, by index, as tuples from _artist_credits.
+    #     - _artist_credits:
+    #         The artist table: maps each distinct tuple of artist names to itself, so that every
+    #         song with the same artists refers to the same tuple.
+    #     - _traits:
+    #         A float32 matrix whose first len(self._ids) rows are the numerical traits of each song,
+    #         by index. Extra rows are spare capacity for songs that have not been added yet.
+    #     - _storage:
+    #         The edges of this music graph, as an EdgeStorage or an IncidenceStorage. Both have the
+    #         same methods, which take and return songs by index.
+    #     - _name_index:
+    #         Maps each normalized (track name, artist name) pair to the indices of the songs with that
+    #         track name and artist, in index order. It is None until the first lookup by name, and
+    #         add_song keeps it up to date after that.
+    #     - _search_index:
+    #         The index used by search, or None if it needs to be (re)built.
+    #     - _ann_index:
+    #         The approximate nearest-neighbour index of the songs' traits used by
+    #         get_catalogue_recommendations, or None if it needs to be (re)built.
+    #     - _cache:
+    #         The cache of the results of get_recommendations. Adding an edge removes the cached
+    #         results of both of its songs.
+    #     - _query_stats:
+    #         The counters of the multi-hop recommendations answered so far (see get_query_stats).
+    _ids: list[str]
+    _index: dict[str, int]
+    _track_names: list[str]
+    _artist_names: list[tuple[str, ...]]
+    _artist_credits: dict[tuple[str, ...], tuple[str, ...]]
+    _traits: numpy.ndarray
+    _storage: EdgeStorage | IncidenceStorage
+    _name_index: dict[tuple[str, str], list[int]] | None
+    _search_index: SongSearchIndex | None
+    _ann_index: IVFIndex | None
+    _cache: RecommendationCache
+    _query_stats: dict[str, float]
 
-    def __init__(self) -> None:
-        """Initialize an empty music graph."""
-        self._songs = {}
+    def __init__(self, storage: str = EDGE_STORAGE) -> None:
+        """Initialize an empty music graph that stores its edges as described by storage.
+
+        Preconditions:
+            - storage in STORAGE_MODES
+        """
+        self.storage = storage
+        self._ids = []
+        self._index = {}
+        self._track_names = []
+        self._artist_names = []
+        self._artist_credits = {}
+        self._traits = numpy.zeros((16, NUM_TRAITS), dtype=numpy.float32)
+        self._storage = IncidenceStorage(NUM_TRAITS) if storage == INCIDENCE_STORAGE else EdgeStorage()
+        self._name_index = None
+        self._search_index = None
+        self._ann_index = None
+        self._cache = RecommendationCache()
+        self._query_stats = {}
 
     def add_song(self, song: Song) -> None:
         """Add a Song object to this music graph.
@@ -37,22 +147,226 @@ class MusicGraph:
         The added Song is not adjacent to any other songs.
 
         Preconditions:
-            - song.spotify_id not in self._songs
+            - song.spotify_id not in self._index
+            - len(song.numerical_traits) == NUM_TRAITS
         """
-        self._songs[song.spotify_id] = song
+        i = len(self._ids)
+        if i == self._traits.shape[0] or not self._traits.flags.writeable:
+            # grow the trait matrix geometrically so that adding n songs takes O(n) time overall
+            grown = numpy.zeros((max(2 * i, 16), NUM_TRAITS), dtype=numpy.float32)
+            grown[:i] = self._traits
+            self._traits = grown
+
+        self._traits[i] = song.numerical_traits
+        self._ids.append(song.spotify_id)
+        self._index[song.spotify_id] = i
+        self._track_names.append(song.track_name)
+        self._artist_names.append(self._intern_artists(song.artist_names))
+        self._storage.set_num_songs(i + 1)
+        if self._name_index is not None:
+            self._index_names(i)
+        self._search_index = None
+        self._ann_index = None
 
     def add_edge(self, first_song: Song, second_song: Song) -> None:
         """Add an edge between two Songs in this music graph.
 
-        Do nothing if the Spotify ID of the first_song is contained in the edges of second_song.
+        Do nothing if the two songs are already connected by an edge. With incidence storage, the
+        two songs are added as a playlist of their own.
 
         Preconditions:
             - first_song != second_song
-            - first_song.spotify_id in self._songs
-            - second_song.spotify_id in self._songs
+            - first_song.spotify_id in self._index
+            - second_song.spotify_id in self._index
+        """
+        first = self._index[first_song.spotify_id]
+        second = self._index[second_song.spotify_id]
+        self._storage.add_playlist(numpy.array([first, second], dtype=numpy.int32), self._traits)
+        self._cache.invalidate([first_song.spotify_id, second_song.spotify_id])
+
+    def add_playlist_edges(self, song_ids: list[str]) -> None:
+        """Add an edge between every pair of songs in the given playlist.
+
+        All the similarity scores are computed at once with a single matrix product of the
+        songs' numerical traits. Pairs of songs that are already connected keep their existing edge.
+
+        With incidence storage, the playlist is only recorded, along with the current traits of
+        its songs, and its edges are scored from those traits when they are queried.
+
+        Preconditions:
+            - all(song_id in self._index for song_id in song_ids)
+        """
+        self._storage.add_playlist(self.get_indices(song_ids), self._traits)
+        if len(self._cache) > 0:
+            self._cache.invalidate(list(dict.fromkeys(song_ids)))
+
+    def add_edges(self, first: numpy.ndarray, second: numpy.ndarray, scores: numpy.ndarray,
+                  counts: Optional[numpy.ndarray] = None) -> None:
+        """Add an edge with similarity score scores[k] between the songs with indices first[k] and
+        second[k], which share counts[k] playlists (1 if counts is None), for every k.
+
+        Pairs of songs that are already connected (including pairs that appear more than once in the
+        given arrays) keep their earliest edge, with the sum of the playlist counts of all the edges
+        between them, and pairs of a song with itself are ignored.
+
+        Raise ValueError if this music graph uses incidence storage, which cannot store scores.
+
+        Preconditions:
+            - len(first) == len(second) == len(scores)
+            - counts is None or len(counts) == len(scores)
+            - all(0 <= i < len(self._ids) for i in first) and all(0 <= i < len(self._ids) for i in second)
+        """
+        self._storage.add_edges(first, second, scores, counts)
+        if len(self._cache) > 0:
+            distinct = first != second
+            touched = numpy.unique(numpy.concatenate([first[distinct], second[distinct]]))
+            self._cache.invalidate([self._ids[i] for i in touched.tolist()])
+
+    def prune_edges(self, max_neighbours: Optional[int], min_similarity: Optional[float]) -> int:
+        """Remove the edges of this music graph that are not worth keeping, and return how many were removed.
+
+        If min_similarity is not None, every edge with a similarity score below it is removed. If
+        max_neighbours is not None, every remaining edge that is not among the max_neighbours best
+        edges of either of its endpoints (ranked like get_recommendations ranks them) is removed too.
+
+        Raise ValueError if this music graph uses incidence storage, whose edges cannot be removed.
+
+        Preconditions:
+            - max_neighbours is None or max_neighbours >= 1
+        """
+        removed = self._storage.prune_edges(max_neighbours, min_similarity)
+        if removed > 0:
+            self._cache.clear()
+        return removed
+
+    def get_num_edges(self) -> int:
+        """Return the number of edges in this music graph.
+
+        With incidence storage, the edges of every song are found to count them, which takes time
+        quadratic in the length of each playlist, so build_music_graph does not count them.
+        """
+        return self._storage.get_num_edges()
+
+    def get_co_occurrences(self, song_id: str) -> dict[str, int]:
+        """Return a mapping from the Spotify ID of each neighbour of the song with the given
+        spotify_id to the number of playlists the two songs share, in the order their edges were
+        created.
+
+        In sparse-edge mode (see build_music_graph), only the playlists whose edge between the two
+        songs was kept are counted.
+
+        Preconditions:
+            - song_id in self._index
+        """
+        neighbours, counts = self._storage.get_co_occurrences(self._index[song_id])
+        return {self._ids[j]: count for j, count in zip(neighbours.tolist(), counts.tolist())}
+
+    def get_indices(self, song_ids: list[str]) -> numpy.ndarray:
+        """Return an array of the indices of the songs with the given spotify_ids.
+
+        Preconditions:
+            - all(song_id in self._index for song_id in song_ids)
+        """
+        return numpy.fromiter((self._index[song_id] for song_id in song_ids),
+                              dtype=numpy.int32, count=len(song_ids))
+
+    def get_traits(self, song_ids: list[str]) -> numpy.ndarray:
+        """Return a new float32 matrix whose rows are the numerical traits of the songs with the
+        given spotify_ids.
+
+        Preconditions:
+            - all(song_id in self._index for song_id in song_ids)
+        """
+        return self._traits[self.get_indices(song_ids)]
+
+    def set_traits(self, song_ids: list[str], traits: numpy.ndarray) -> None:
+        """Replace the numerical traits of the songs with the given spotify_ids by the rows of traits.
+
+        Edges that have already been added keep the similarity score they were created with.
+
+        Preconditions:
+            - all(song_id in self._index for song_id in song_ids)
+            - traits.shape == (len(song_ids), NUM_TRAITS)
+        """
+        if not self._traits.flags.writeable:
+            self._traits = numpy.array(self._traits)
+        indices = self.get_indices(song_ids)
+        self._traits[indices] = traits
+        self._storage.set_traits_changed(indices)
+        self._ann_index = None
+
+    def set_numerical_traits(self, spotify_id: str, numerical_traits: list[float]) -> None:
+        """Replace the numerical traits of the song with the given spotify_id.
+
+        Edges that have already been added keep the similarity score they were created with.
+
+        Preconditions:
+            - spotify_id in self._index
+            - len(numerical_traits) == NUM_TRAITS
+        """
+        if not self._traits.flags.writeable:
+            self._traits = numpy.array(self._traits)
+        self._traits[self._index[spotify_id]] = numerical_traits
+        self._storage.set_traits_changed(numpy.array([self._index[spotify_id]]))
+        self._ann_index = None
+
+    def get_all_traits(self) -> numpy.ndarray:
+        """Return the float32 matrix whose rows are the numerical traits of every song, by index.
+
+        The returned matrix is not a copy, so it must not be mutated.
+        """
+        return self._traits[:len(self._ids)]
+
+    def get_numerical_traits(self, spotify_id: str) -> list[float]:
+        """Return the numerical traits of the song with the given spotify_id.
+
+        Preconditions:
+            - spotify_id in self._index
+        """
+        return self._traits[self._index[spotify_id]].tolist()
+
+    def to_arrays(self) -> dict[str, numpy.ndarray]:
+        """Return the contents of this music graph as a mapping of names to NumPy arrays.
+
+        String columns are stored as UTF-8 byte arrays, so every value is a flat array that can be
+        written to disk and memory-mapped back. The artist table is stored once, with the position
+        of each song's artists in it. The edge arrays depend on the storage of this music graph.
+        MusicGraph.from_arrays is the inverse of this method.
+        """
+        n = len(self._ids)
+        credit_numbers = {credit: k for k, credit in enumerate(self._artist_credits)}
+        arrays = {
+            'ids': encode_strings(self._ids),
+            'track_names': encode_strings(self._track_names),
+            'artist_credits': encode_strings([ARTIST_SEPARATOR.join(credit) for credit in self._artist_credits]),
+            'song_credits': numpy.fromiter((credit_numbers[credit] for credit in self._artist_names),
+                                           dtype=numpy.int32, count=n),
+            'traits': self._traits[:n]
+        }
+
+        arrays.update(self._storage.to_arrays())
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, numpy.ndarray]) -> MusicGraph:
+        """Return a new music graph with the contents given by arrays, as returned by to_arrays.
+
+        The numerical arrays are used as they are, without being copied, so they may be read-only
+        (for example, memory-mapped) arrays. They are only copied if the graph is later mutated.
+
+        Preconditions:
+            - arrays has the keys and shapes produced by MusicGraph.to_arrays
         """
-        if first_song.spotify_id not in second_song.edges:
-            Edge(first_song, second_song)
+        graph = cls(INCIDENCE_STORAGE if 'playlist_indptr' in arrays else EDGE_STORAGE)
+        graph._ids = decode_strings(arrays['ids'])
+        graph._index = {spotify_id: i for i, spotify_id in enumerate(graph._ids)}
+        graph._track_names = decode_strings(arrays['track_names'])
+        credits = [graph._intern_artists(names.split(ARTIST_SEPARATOR))
+                   for names in decode_strings(arrays['artist_credits'])]
+        graph._artist_names = [credits[k] for k in arrays['song_credits'].tolist()]
+        graph._traits = arrays['traits']
+        graph._storage = type(graph._storage).from_arrays(arrays, len(graph._ids))
+        return graph
 
     def __contains__(self, spotify_id: str) -> bool:
         """Determine whether a song with the given spotify_id is part of this music graph.
@@ -60,56 +374,362 @@ class MusicGraph:
         Preconditions:
             - spotify_id is a valid Spotify song ID
         """
-        return spotify_id in self._songs
+        return spotify_id in self._index
 
     def __getitem__(self, spotify_id: str) -> Song:
         """Return the Song with the given spotify_id in this music graph.
 
+        The returned Song is a view built from this music graph: its edges lead to views of its
+        neighbour songs, and changes made to it are not reflected in this music graph.
+
         Raise ValueError if the given spotify_id is not in this music graph.
 
         Preconditions:
             - spotify_id is a valid Spotify song ID
         """
-        if spotify_id in self._songs:
-            return self._songs[spotify_id]
+        if spotify_id in self._index:
+            i = self._index[spotify_id]
+            song = self._song_view(i)
+            neighbours, scores = self._neighbours(i)
+            for j, score in zip(neighbours.tolist(), scores.tolist()):
+                Edge(song, self._song_view(j), score)
+            return song
         else:
             raise ValueError
 
     def get_spotify_id(self, track_name: str, artist_name: str) -> str:
         """Return the Spotify ID of a Song with the given track name and artist name.
 
+        Names are matched ignoring case and extra whitespace. If several songs match, a song whose
+        names match exactly is preferred, and otherwise the song that was added first is returned.
+
+        Raise ValueError if no song in this music graph has the given track name and artist name.
+        """
+        matches = self._find_songs(track_name, artist_name)
+        if not matches:
+            raise ValueError(f'There is no song called {track_name!r} by {artist_name!r}.')
+
+        exact_matches = [i for i in matches
+                         if self._track_names[i] == track_name and artist_name in self._artist_names[i]]
+        return self._ids[(exact_matches or matches)[0]]
+
+    def find_spotify_ids(self, track_name: str, artist_name: str) -> list[str]:
+        """Return the Spotify IDs of all the Songs with the given track name and artist name, in the
+        order they were added, matching names as get_spotify_id does.
+
+        Return an empty list if there is no such Song.
+        """
+        return [self._ids[i] for i in self._find_songs(track_name, artist_name)]
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[str, str, list[str]]]:
+        """Return up to limit songs whose track name or artist name best matches the (partial,
+        possibly misspelled) query, as (spotify_id, track name, artist names) tuples, best match first.
+
+        The search index is built on the first search after songs are added. See SongSearchIndex.search
+        for how matches are ranked.
+
         Preconditions:
-         - any(track_name == self._songs[u].track_name for u in self._songs)
-         - any(artist_name in self._songs[u].artist_names for u in self._songs)
+            - limit >= 0
         """
-        for u in self._songs:
-            if track_name == self._songs[u].track_name and artist_name in self._songs[u].artist_names:
-                return self._songs[u].spotify_id
+        if self._search_index is None:
+            self._search_index = SongSearchIndex(self._ids, self._track_names, self._artist_names)
+
+        return self._search_index.search(query, limit)
+
+    def set_cache_limits(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: Optional[float] = None) -> None:
+        """Replace the cache of get_recommendations with an empty one that holds the results for at
+        most max_entries songs, each for at most ttl seconds (or until the song gets a new edge, if
+        ttl is None). A max_entries of 0 turns the cache off.
 
-        # we will never reach this branch because of precondition, it's for code correctness
-        return ''
+        Preconditions:
+            - max_entries >= 0
+            - ttl is None or ttl > 0
+        """
+        self._cache = RecommendationCache(max_entries, ttl)
 
-    def get_recommendations(self, song_id: str, num_recs: int) -> list[tuple[str, int]]:
+    def get_cache_stats(self) -> dict[str, int]:
+        """Return the hit, miss and eviction counters of the cache of get_recommendations, along
+        with its number of entries."""
+        return self._cache.get_stats()
+
+    def get_query_stats(self) -> dict[str, float]:
+        """Return the counters of the multi-hop recommendations answered by this music graph:
+        'multi_hop_queries', and for every hop h, 'hop_<h>_seconds', the time spent on hop h, and
+        'hop_<h>_songs', the number of songs first reached at hop h, over all the queries."""
+        return dict(self._query_stats)
+
+    def get_recommendations(self, song_id: str, num_recs: int, hops: int = 1, decay: float = HOP_DECAY,
+                            fan_out: int = NEIGHBOUR_INDEX_DEPTH) -> list[tuple[str, int]]:
         """Given a song input, return a list of num_recs recommended songs in (song name, similarity score)
-        form."""
-        song = self._songs[song_id]
-        list_of_edges = list(song.edges.values())
-        # sort list of edges by similarity score
-        list_of_edges.sort(key=lambda edge: edge.get_similarity_score())
+        form.
+
+        If hops is greater than 1, songs up to hops edges away are recommended too (see
+        _get_multi_hop_recommendations), and the results are not cached.
+
+        The recommendations are the song's neighbours with the highest similarity scores, best first,
+        and among equal scores, the most recently created edge first (see EdgeStorage.get_best_edges).
+        The results are cached (see set_cache_limits), and a cached result for more recommendations
+        of the same song also answers a request for fewer.
+
+        Preconditions:
+            - song_id in self._index
+            - num_recs >= 0 and hops >= 1 and 0.0 < decay <= 1.0 and fan_out >= 1
+        """
+        if hops > 1:
+            return self._get_multi_hop_recommendations(self._index[song_id], num_recs, hops, decay, fan_out)
+
+        cached = self._cache.get(song_id, num_recs)
+        if cached is not None:
+            return cached
+
+        neighbours, scores = self._get_best_neighbours(self._index[song_id], num_recs)
+        neighbours, scores = neighbours.tolist(), scores.tolist()
+        recommendations = [(self._track_names[j], int(round(score, 2) * 100)) for j, score in zip(neighbours, scores)]
+        self._cache.put(song_id, num_recs, recommendations)
+        return recommendations
+
+    def _get_multi_hop_recommendations(self, i: int, num_recs: int, hops: int, decay: float,
+                                       fan_out: int) -> list[tuple[str, int]]:
+        """Return get_recommendations for the song with index i, with songs up to hops edges away.
+
+        The score of a path is the product of the scores of its edges, multiplied by decay for every
+        edge after the first, and a song's score is that of its best path with as few edges as
+        possible. So the song's neighbours keep their own scores, and the other songs are
+        recommended along with them, best first (and among equal scores, the closest first).
+
+        Each hop is a sparse matrix-vector product, in the (max, *) semiring, of the adjacency
+        with the scores of the frontier: the fan_out best songs first reached at the previous hop,
+        through the fan_out best edges of each of them, which bounds the work done per hop. The
+        time spent on each hop is added to the query stats (see get_query_stats).
+        """
+        start = time.perf_counter()
+        neighbours, scores = self._get_best_neighbours(i, max(num_recs, fan_out))
+        reached = numpy.concatenate([[i], self._neighbours(i)[0]])
+        found = [(neighbours[:num_recs], scores[:num_recs].astype(numpy.float64))]
+        frontier, frontier_scores = neighbours[:fan_out], scores[:fan_out].astype(numpy.float64)
+        self._count_hop(1, start, len(reached) - 1)
+
+        for hop in range(2, hops + 1):
+            start = time.perf_counter()
+            rows, neighbours, scores = self._storage.get_best_edges(frontier, fan_out)
+            path_scores = frontier_scores[rows] * scores * decay
+            new = ~numpy.isin(neighbours, reached)
+            neighbours, path_scores = neighbours[new], path_scores[new]
+
+            # keep the best path to each song, and rank the songs by it, and among equal scores, by index
+            order = numpy.lexsort((-path_scores, neighbours))
+            neighbours, path_scores = neighbours[order], path_scores[order]
+            best = numpy.ones(len(neighbours), dtype=bool)
+            best[1:] = neighbours[1:] != neighbours[:-1]
+            neighbours, path_scores = neighbours[best], path_scores[best]
+            order = numpy.lexsort((neighbours, -path_scores))
+            neighbours, path_scores = neighbours[order], path_scores[order]
+
+            found.append((neighbours[:num_recs], path_scores[:num_recs]))
+            reached = numpy.concatenate([reached, neighbours])
+            frontier, frontier_scores = neighbours[:fan_out], path_scores[:fan_out]
+            self._count_hop(hop, start, len(neighbours))
+
+        self._query_stats['multi_hop_queries'] = self._query_stats.get('multi_hop_queries', 0) + 1
+        neighbours = numpy.concatenate([songs for songs, _ in found])
+        scores = numpy.concatenate([path_scores for _, path_scores in found])
+        hop_numbers = numpy.repeat(numpy.arange(len(found)), [len(songs) for songs, _ in found])
+        # lexsort is stable, so the songs found at the same hop with equal scores keep their order
+        best = numpy.lexsort((hop_numbers, -scores))[:num_recs]
+        return [(self._track_names[j], int(round(score, 2) * 100))
+                for j, score in zip(neighbours[best].tolist(), scores[best].tolist())]
+
+    def _count_hop(self, hop: int, start: float, num_songs: int) -> None:
+        """Add a hop of a multi-hop query, which started at time.perf_counter() start and first reached
+        num_songs songs, to the query stats."""
+        seconds_key, songs_key = f'hop_{hop}_seconds', f'hop_{hop}_songs'
+        self._query_stats[seconds_key] = self._query_stats.get(seconds_key, 0.0) + time.perf_counter() - start
+        self._query_stats[songs_key] = self._query_stats.get(songs_key, 0) + num_songs
+
+    def recommend_batch(self, seed_ids: Iterable[str], num_recs: int, continuation: bool = False,
+                        workers: int = 1, chunk_size: int = BATCH_CHUNK_SIZE) -> Iterator[list[tuple[str, int]]]:
+        """Return an iterator over the recommendations for many seed songs, answered together.
+
+        By default, yield get_recommendations(seed_id, num_recs) for each seed_id in seed_ids, in
+        order. The seeds are answered chunk_size at a time: with edge storage, the scores of a chunk's
+        edges are gathered from the neighbour index (or, for more than NEIGHBOUR_INDEX_DEPTH
+        recommendations, the adjacency) with vectorized indexing, and each seed's best neighbours are
+        picked with numpy.argpartition, instead of sorting the edges of one seed at a time.
+
+        If continuation is True, seed_ids are the songs of a playlist to continue, and a single list
+        is yielded: the num_recs songs (that are not seeds) with the highest mean similarity score
+        to the seeds, counting 0 for the seeds they are not adjacent to, best first, and among equal
+        scores, by index.
+
+        With incidence storage, the edges of each seed are scored one seed at a time.
+
+        If workers is greater than 1, the chunks are answered by a pool of that many processes, each
+        with its own copy of this graph, and yielded in order as they come back. At most 2 * workers
+        chunks are in flight at once, so the results are streamed even for very large batches.
+
+        Preconditions:
+            - all(seed_id in self._index for seed_id in seed_ids)
+            - num_recs >= 0 and workers >= 1 and chunk_size >= 1
+        """
+        if continuation:
+            yield self._continue_playlist(self.get_indices(list(seed_ids)), num_recs)
+            return
+
+        seed_ids = iter(seed_ids)
+        chunks = iter(lambda: list(islice(seed_ids, chunk_size)), [])
+        if workers <= 1:
+            for chunk in chunks:
+                yield from self._recommend_chunk(self.get_indices(chunk), num_recs)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(self.to_arrays(),)) as executor:
+            in_flight = deque()
+            for chunk in chunks:
+                in_flight.append(executor.submit(_recommend_chunk_in_worker, chunk, num_recs))
+                if len(in_flight) >= 2 * workers:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+
+    def _recommend_chunk(self, seeds: numpy.ndarray, num_recs: int) -> list[list[tuple[str, int]]]:
+        """Return get_recommendations for the songs with the indices in seeds, computed together."""
+        rows, neighbours, scores = self._storage.get_best_edges(seeds, num_recs)
+        counts = numpy.bincount(rows, minlength=len(seeds))
+
+        names = [self._track_names[j] for j in neighbours.tolist()]
+        percentages = _get_percentages(scores).tolist()
+        recommendations, start = [], 0
+        for count in counts.tolist():
+            recommendations.append(list(zip(names[start:start + count], percentages[start:start + count])))
+            start += count
+
+        return recommendations
+
+    def _continue_playlist(self, seeds: numpy.ndarray, num_recs: int) -> list[tuple[str, int]]:
+        """Return the recommendations that continue the playlist of the songs with the indices in
+        seeds, as described in recommend_batch."""
+        if len(seeds) == 0:
+            return []
+
+        _, neighbours, scores = self._storage.get_edges(seeds)
+        means = numpy.bincount(neighbours, weights=scores, minlength=len(self._ids)) / len(seeds)
+
+        candidates = numpy.unique(neighbours)
+        candidates = candidates[~numpy.isin(candidates, seeds)]
+        # reversed, so that among equal scores, the lowest index is the one further right
+        reversed_candidates = candidates[::-1]
+        best = reversed_candidates[get_top_k_mask(means[reversed_candidates][None, :], num_recs)[0]]
+        best = best[numpy.lexsort((best, -means[best]))]
+        return [(self._track_names[j], int(round(score, 2) * 100))
+                for j, score in zip(best.tolist(), means[best].tolist())]
+
+    def _find_songs(self, track_name: str, artist_name: str) -> list[int]:
+        """Return the indices of the songs with the given track name and artist name, building the
+        name index first if needed."""
+        if self._name_index is None:
+            self._name_index = {}
+            for i in range(len(self._ids)):
+                self._index_names(i)
+
+        return self._name_index.get((normalize_name(track_name), normalize_name(artist_name)), [])
+
+    def _index_names(self, i: int) -> None:
+        """Add the song with index i to the name index, once for each of its artists."""
+        track_name = normalize_name(self._track_names[i])
+        for artist_name in dict.fromkeys(normalize_name(name) for name in self._artist_names[i]):
+            self._name_index.setdefault((track_name, artist_name), []).append(i)
+
+    def get_catalogue_recommendations(self, song_id: str, num_recs: int,
+                                      n_probe: int = DEFAULT_N_PROBE) -> list[tuple[str, int]]:
+        """Given a song input, return a list of num_recs recommended songs from the whole catalogue in
+        (song name, similarity score) form, like get_recommendations.
+
+        Unlike get_recommendations, the recommended songs do not need to share a playlist with the
+        input song: they are the songs whose traits are the most similar to its traits, found
+        approximately with an IVFIndex that looks at n_probe of its lists. The similarity score is
+        computed as for an edge. The index is built on the first call after the traits change.
+
+        Preconditions:
+            - num_recs >= 0 and n_probe >= 1
+        """
+        if self._ann_index is None:
+            self._ann_index = IVFIndex(self.get_all_traits())
+
+        i = self._index[song_id]
+        neighbours, similarities = self._ann_index.search(self._traits[i], num_recs, n_probe, exclude=i)
+        return [(self._track_names[j], int(round((1.0 + similarity) / 2.0, 2) * 100))
+                for j, similarity in zip(neighbours.tolist(), similarities.tolist())]
+
+    def _song_view(self, i: int) -> Song:
+        """Return a new Song (without any edges) for the song with index i, whose numerical traits
+        are a read-only view of its row of the trait matrix."""
+        traits = self._traits[i]
+        traits.flags.writeable = False
+        return Song(
+            spotify_id=self._ids[i],
+            track_name=self._track_names[i],
+            artist_names=list(self._artist_names[i]),
+            numerical_traits=traits
+        )
+
+    def _intern_artists(self, artist_names: list[str]) -> tuple[str, ...]:
+        """Return the tuple of the given artist names from the artist table, adding it first if needed."""
+        credit = tuple(artist_names)
+        interned = self._artist_credits.get(credit)
+        if interned is None:
+            interned = tuple(sys.intern(name) for name in credit)
+            self._artist_credits[interned] = interned
+        return interned
+
+    def _neighbours(self, i: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the indices of the neighbours of the song with index i and the similarity scores of
+        the edges leading to them, in the order the edges were created."""
+        _, neighbours, scores = self._storage.get_edges(numpy.array([i]))
+        return neighbours, scores
+
+    def _get_best_neighbours(self, i: int, num_recs: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the indices of the num_recs best neighbours of the song with index i and the
+        similarity scores of the edges leading to them, ranked like get_recommendations ranks them."""
+        _, neighbours, scores = self._storage.get_best_edges(numpy.array([i]), num_recs)
+        return neighbours, scores
+
+
+def _get_percentages(scores: numpy.ndarray) -> numpy.ndarray:
+    """Return int(round(score, 2) * 100) for every score in the float32 array scores, computed at once.
+
+    Every float32 value times 100 is exact as a float64, so rounding it to an integer rounds the
+    score to 2 decimal places exactly as round does.
+
+    >>> _get_percentages(numpy.array([0.29, 0.625, 0.999], dtype=numpy.float32)).tolist()
+    [28, 62, 100]
+    """
+    return (numpy.rint(scores.astype(numpy.float64) * 100) / 100 * 100).astype(numpy.int64)
+
+
+# A copy of the MusicGraph that recommend_batch sent to this process, if it is one of its workers.
+_batch_worker_graph = None
+
+
+def _init_batch_worker(arrays: dict[str, numpy.ndarray]) -> None:
+    """Set up a worker process of recommend_batch with the music graph given by arrays."""
+    global _batch_worker_graph
+    _batch_worker_graph = MusicGraph.from_arrays(arrays)
+
+
+def _recommend_chunk_in_worker(seed_ids: list[str], num_recs: int) -> list[list[tuple[str, int]]]:
+    """Return get_recommendations for each of seed_ids in the music graph of this worker process."""
+    return list(_batch_worker_graph.recommend_batch(seed_ids, num_recs, chunk_size=len(seed_ids)))
+
 
-        # make sure the list of edges is sorted properly
-        assert all(list_of_edges[i].get_similarity_score() <= list_of_edges[i + 1].get_similarity_score()
-                   for i in range(len(list_of_edges) - 1))
+def encode_strings(strings: list[str]) -> numpy.ndarray:
+    """Return the given strings as a single array of UTF-8 bytes, each one terminated by a null character."""
+    return numpy.frombuffer(''.join(string + '\x00' for string in strings).encode('utf-8'), dtype=numpy.uint8)
 
-        results = []
-        j = len(list_of_edges) - 1
-        while j > (len(list_of_edges) - 1) - num_recs and j >= 0:
-            edge = list_of_edges[j]
-            results.append((edge.get_other_endpoint(song).track_name, int(
-                round(edge.get_similarity_score(), 2) * 100)))
-            j -= 1
 
-        return results
+def decode_strings(data: numpy.ndarray) -> list[str]:
+    """Return the list of strings encoded in data by encode_strings."""
+    return data.tobytes().decode('utf-8').split('\x00')[:-1]
 
 
 if __name__ == '__main__':
@@ -121,7 +741,9 @@ if __name__ == '__main__':
 
     python_ta.check_all(config={
         # the names (strs) of imported modules
-        'extra-imports': ['music_graph_components'],
+        'extra-imports': ['sys', 'time', 'collections', 'concurrent.futures', 'itertools', 'typing', 'ann_index',
+                          'edge_scoring', 'edge_storage', 'incidence_storage', 'music_graph_components',
+                          'recommendation_cache', 'song_search', 'numpy'],
         # the names (strs) of functions that call print/open/input
         'allowed-io': [],
         'max-line-length': 120
@@ -15,6 +15,8 @@ This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu
 """
 from __future__ import annotations
 
+from typing import Optional, Sequence
+
 # from python_ta.contracts import check_contracts
 
 
@@ -22,11 +24,16 @@ from __future__ import annotations
 class Song:
     """A song from Spotify.
 
+    Songs use __slots__ instead of an instance dictionary, since a MusicGraph creates one for every
+    song it returns (see MusicGraph.__getitem__).
+
     Instance Attributes:
         - spotify_id: The Spotify ID of this song.
         - track_name: The name of this song.
         - artist_names: The name(s) of the artist(s) of this song.
-        - numerical_traits: A list containing the numerically-quantified traits of this song.
+        - numerical_traits:
+            The numerically-quantified traits of this song. For the Songs returned by a MusicGraph,
+            this is a read-only view of the song's row of the graph's trait matrix.
         - edges:
             A mapping containing the songs that are adjacent to this song.
             Each key in the mapping is the Spotify ID of a neighbour song,
@@ -42,14 +49,15 @@ class Song:
         - all(name != '' for name in self.artist_names)
         - len(self.numerical_traits) == 13
     """
+    __slots__ = ('spotify_id', 'track_name', 'artist_names', 'numerical_traits', 'edges')
     spotify_id: str
     track_name: str
     artist_names: list[str]
-    numerical_traits: list[float]
+    numerical_traits: Sequence[float]
     edges: dict[str, Edge]
 
     def __init__(self, spotify_id: str, track_name: str, artist_names: list[str],
-                 numerical_traits: list[float]) -> None:
+                 numerical_traits: Sequence[float]) -> None:
         """Initialize a new song with an empty collection of edges, the given Spotify ID, track name,
         album name, artist name(s), release date, genre(s), and numerical trait(s).
         """
@@ -75,12 +83,13 @@ class Edge:
     #     - _similarity_score:
     #         A float that represents the similarity between the two Songs that are linked by this Edge.
     #         The higher this value is, the more similar the two Songs are.
+    __slots__ = ('endpoints', '_similarity_score')
     endpoints: set[Song]
     _similarity_score: float
 
-    def __init__(self, first_song: Song, second_song: Song) -> None:
-        """Initialize an edge with the two given Songs, and
-        set self._similarity_score to a starting value of 0.0.
+    def __init__(self, first_song: Song, second_song: Song, similarity_score: Optional[float] = None) -> None:
+        """Initialize an edge with the two given Songs, and set self._similarity_score to
+        similarity_score, or compute it from the songs' numerical traits if it is not given.
 
         Also add this Edge to first_song and second_song.
 
@@ -91,10 +100,12 @@ class Edge:
         self.endpoints = {first_song, second_song}
         first_song.edges[second_song.spotify_id] = self
         second_song.edges[first_song.spotify_id] = self
-        self._similarity_score = (1.0 + self.cosine_similarity(first_song.numerical_traits,
-                                                               second_song.numerical_traits)) / 2.0
+        if similarity_score is None:
+            similarity_score = (1.0 + self.cosine_similarity(first_song.numerical_traits,
+                                                             second_song.numerical_traits)) / 2.0
+        self._similarity_score = similarity_score
 
-    def cosine_similarity(self, v1: list[float], v2: list[float]) -> float:
+    def cosine_similarity(self, v1: Sequence[float], v2: Sequence[float]) -> float:
         """Returns the cosine similarity between the two input vectors, given that the inputs have length 1.
         (cosine similarity = dot product / lengths)
 
@@ -103,9 +114,7 @@ class Edge:
         Precondition:
          - sum((v1[i] + v1[i]) ** 2 for i in range(0, len(v1))) == 1
          - sum((v2[i] + v2[i]) ** 2 for i in range(0, len(v1))) == 1"""
-        total = sum((v1[i] * v2[i]) for i in range(0, len(v1)))
-        assert -1.0 < total < 1.0
-        return total
+        return sum((v1[i] * v2[i]) for i in range(0, len(v1)))
 
     def get_similarity_score(self) -> float:
         """Return the similarity score of this Edge."""
@@ -133,7 +142,7 @@ if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': [],
+        'extra-imports': ['typing'],
         'allowed-io': [],
         'max-line-length': 120,
         'max-args': 10,
@@ -0,0 +1,162 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the RecommendationCache class, a bounded cache of the results of
+MusicGraph.get_recommendations, so that the recommendations for popular songs are not selected
+again every time they are requested.
+
+The cache holds one entry per song: the recommendations for the largest number of
+recommendations requested so far. A request for fewer recommendations is answered with the start
+of that list, since the best k recommendations are always the first k of the best k' > k.
+Entries are evicted in least recently used order when the cache is full, and expire after a
+time to live, if one is set.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# from python_ta.contracts import check_contracts
+
+# The default number of songs whose recommendations are cached.
+DEFAULT_MAX_ENTRIES = 4096
+
+
+# @check_contracts
+class RecommendationCache:
+    """A least recently used cache of recommendations, by song.
+
+    The cache can be used from several threads at once.
+
+    Instance Attributes:
+        - max_entries: The most songs whose recommendations are cached at once.
+        - ttl: The number of seconds an entry stays valid for, or None if entries never expire.
+        - hits: The number of lookups that were answered from the cache.
+        - misses: The number of lookups that were not.
+        - evictions: The number of entries removed because the cache was full or they expired.
+
+    Representation Invariants:
+        - self.max_entries >= 0
+        - self.ttl is None or self.ttl > 0
+        - len(self._entries) <= self.max_entries
+    """
+    max_entries: int
+    ttl: Optional[float]
+    hits: int
+    misses: int
+    evictions: int
+    # Private Instance Attributes:
+    #     - _entries:
+    #         Maps the Spotify ID of each cached song to (the number of recommendations requested, or
+    #         None if every recommendation of the song is cached, the recommendations, the time the
+    #         entry expires at), from least to most recently used.
+    #     - _lock:
+    #         The lock held while the cache is read or changed.
+    _entries: OrderedDict[str, tuple[Optional[int], list[tuple[str, int]], float]]
+    _lock: threading.Lock
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: Optional[float] = None) -> None:
+        """Initialize an empty cache of the recommendations of at most max_entries songs, whose
+        entries expire after ttl seconds (or never, if ttl is None).
+
+        Preconditions:
+            - max_entries >= 0
+            - ttl is None or ttl > 0
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of songs whose recommendations are cached."""
+        return len(self._entries)
+
+    def get(self, song_id: str, num_recs: int) -> Optional[list[tuple[str, int]]]:
+        """Return the num_recs recommendations for the song with the given Spotify ID, or None if
+        they are not cached.
+
+        >>> cache = RecommendationCache()
+        >>> cache.put('a', 2, [('x', 90), ('y', 80)])
+        >>> cache.get('a', 1)
+        [('x', 90)]
+        >>> cache.get('a', 3) is None
+        True
+        """
+        with self._lock:
+            entry = self._entries.get(song_id)
+            if entry is not None and entry[2] < time.monotonic():
+                del self._entries[song_id]
+                self.evictions += 1
+                entry = None
+
+            if entry is None or (entry[0] is not None and entry[0] < num_recs):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(song_id)
+            self.hits += 1
+            return entry[1][:num_recs]
+
+    def put(self, song_id: str, num_recs: int, recommendations: list[tuple[str, int]]) -> None:
+        """Cache recommendations, the num_recs recommendations for the song with the given Spotify ID.
+
+        An entry for more recommendations of the same song is kept instead.
+        """
+        complete = len(recommendations) < num_recs
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+
+        with self._lock:
+            entry = self._entries.get(song_id)
+            if entry is not None and (entry[0] is None or entry[0] >= num_recs):
+                return
+            if self.max_entries == 0:
+                return
+
+            self._entries[song_id] = (None if complete else num_recs, list(recommendations), expires_at)
+            self._entries.move_to_end(song_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, song_ids: list[str]) -> None:
+        """Remove the cached recommendations of the songs with the given Spotify IDs, if any."""
+        with self._lock:
+            for song_id in song_ids:
+                self._entries.pop(song_id, None)
+
+    def clear(self) -> None:
+        """Remove every cached recommendation."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict[str, int]:
+        """Return the counters of this cache, along with its current number of entries."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries)}
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['threading', 'time', 'collections', 'typing'],
+        'allowed-io': [],
+        'max-line-length': 120
+    })
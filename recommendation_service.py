@@ -0,0 +1,478 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the RecommendationService class, an HTTP/JSON front-end for a MusicGraph
+built on asyncio, so that MusicMapper can answer queries from a web tier and not only from the GUI.
+It only uses the standard library, and fetch_json is a matching client for local use and testing.
+
+The service answers these requests:
+
+    GET /spotify_id?track=<track name>&artist=<artist name>
+        {"spotify_id": ...}, as returned by MusicGraph.get_spotify_id
+    GET /recommendations?song_id=<Spotify ID>&num_recs=<number>&hops=<number>
+        {"recommendations": [[track name, score], ...]}, as returned by MusicGraph.get_recommendations,
+        with songs up to hops (1 by default, and at most MAX_HOPS) edges away
+    POST /recommendations/batch with {"seed_ids": [...], "num_recs": <number>, "continuation": <bool>}
+        {"recommendations": [[[track name, score], ...], ...]}, as returned by MusicGraph.recommend_batch
+    GET /health
+        {"status": "ok", "songs": <number of songs>}
+    GET /stats
+        {"cache": {...}, "queries": {...}}, as returned by MusicGraph.get_cache_stats and
+        MusicGraph.get_query_stats
+
+Errors are answered with a status code and {"error": <message>}. Identical queries that arrive
+while the first of them is still being answered share its answer instead of being answered again.
+Batch queries are answered by a pool of worker processes, so they do not hold up the other
+requests. The workers share the arrays of the graph through shared memory (see shared_graph)
+instead of each holding a copy of them, and swap_graph makes the service and its workers answer
+queries about a newly built graph without restarting them.
+
+Running this module with command-line arguments serves the graph of the given data directory until
+interrupted (--help lists the options); without arguments, it runs the doctests and python_ta.
+For example:
+
+    python recommendation_service.py --data data --port 8111
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+# from python_ta.contracts import check_contracts
+from graph_snapshot import load_music_graph
+from music_graph import MusicGraph
+from shared_graph import SharedGraphManager, SharedGraphReader
+
+# The default address the service listens on.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8111
+
+# The most hops a /recommendations request may ask for.
+MAX_HOPS = 3
+
+# The largest request body (in bytes) the service accepts.
+MAX_BODY_SIZE = 1 << 24
+
+# The reason phrases of the status codes the service answers with.
+STATUS_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                  413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+# @check_contracts
+class ServiceError(Exception):
+    """Raised while answering a request to make the service answer with the given status code.
+
+    Instance Attributes:
+        - status: The HTTP status code of the answer.
+    """
+    status: int
+
+    def __init__(self, status: int, message: str) -> None:
+        """Initialize a new error with the given status code and message."""
+        super().__init__(message)
+        self.status = status
+
+
+# @check_contracts
+class RecommendationService:
+    """An asyncio HTTP/JSON service that answers queries about a MusicGraph.
+
+    Representation Invariants:
+        - self._batch_workers >= 0
+    """
+    # Private Instance Attributes:
+    #     - _music_graph:
+    #         The graph the queries are about.
+    #     - _batch_workers:
+    #         The number of worker processes that answer batch queries. If it is 0, they are
+    #         answered by a thread of this process instead.
+    #     - _executor:
+    #         The pool that answers batch queries, or None while the service is not running.
+    #     - _shared_graph:
+    #         The manager of the shared memory the worker processes read the graph from, or None
+    #         while the service is not running or if it has no worker processes.
+    #     - _server:
+    #         The asyncio server accepting connections, or None while the service is not running.
+    #     - _in_flight:
+    #         Maps the key of each query that is being answered to the future of its answer.
+    _music_graph: MusicGraph
+    _batch_workers: int
+    _executor: Optional[Executor]
+    _shared_graph: Optional[SharedGraphManager]
+    _server: Optional[asyncio.AbstractServer]
+    _in_flight: dict[tuple, asyncio.Future]
+
+    def __init__(self, music_graph: MusicGraph, batch_workers: int = 0) -> None:
+        """Initialize a service for music_graph that answers batch queries with batch_workers
+        worker processes (or with a thread of this process, if batch_workers is 0).
+
+        Preconditions:
+            - batch_workers >= 0
+        """
+        self._music_graph = music_graph
+        self._batch_workers = batch_workers
+        self._executor = None
+        self._shared_graph = None
+        self._server = None
+        self._in_flight = {}
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> tuple[str, int]:
+        """Start accepting connections on host and port, and return the address the service listens on.
+
+        A port of 0 picks a free port.
+        """
+        if self._batch_workers > 0:
+            self._shared_graph = SharedGraphManager()
+            self._shared_graph.publish(self._music_graph)
+            self._executor = ProcessPoolExecutor(max_workers=self._batch_workers, initializer=_init_worker,
+                                                 initargs=(self._shared_graph.control_name,))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self) -> None:
+        """Answer requests until the task running this coroutine is cancelled.
+
+        Preconditions:
+            - the service has been started
+        """
+        await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        """Stop accepting connections, shut the worker pool down, and free the shared memory of its graph."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._shared_graph is not None:
+            self._shared_graph.close()
+            self._shared_graph = None
+
+    def swap_graph(self, music_graph: MusicGraph) -> None:
+        """Answer the queries that arrive from now on about music_graph instead, without restarting
+        the service or its worker processes.
+
+        The worker processes swap music_graph in before their next batch query, so a batch query
+        that is still waiting for a worker may be answered about music_graph. Queries that are
+        already being answered are not shared with identical queries that arrive from now on.
+        """
+        if self._shared_graph is not None:
+            self._shared_graph.publish(music_graph)
+        self._music_graph = music_graph
+        self._in_flight = {}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer the requests sent over one connection, until the client closes it."""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+
+                status, answer = await self._answer(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(_format_response(status, answer, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ServiceError as error:
+            # the request could not be read, so the connection cannot be used for another one
+            writer.write(_format_response(error.status, {'error': str(error)}, False))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, method: str, target: str, body: bytes) -> tuple[int, Any]:
+        """Return the status code and JSON value that answer a request."""
+        url = urlsplit(target)
+        query = dict(parse_qsl(url.query))
+        routes = {
+            '/health': ('GET', self._get_health),
+            '/stats': ('GET', self._get_stats),
+            '/spotify_id': ('GET', self._get_spotify_id),
+            '/recommendations': ('GET', self._get_recommendations),
+            '/recommendations/batch': ('POST', self._get_batch_recommendations)
+        }
+
+        try:
+            if url.path not in routes:
+                raise ServiceError(404, f'no such path: {url.path}')
+            route_method, handler = routes[url.path]
+            if method != route_method:
+                raise ServiceError(405, f'{url.path} only answers {route_method} requests')
+            return 200, await handler(query, body)
+        except ServiceError as error:
+            return error.status, {'error': str(error)}
+        except Exception as error:  # pylint: disable=broad-except
+            return 500, {'error': f'{type(error).__name__}: {error}'}
+
+    async def _get_health(self, _query: dict[str, str], _body: bytes) -> dict:
+        """Answer a /health request."""
+        return {'status': 'ok', 'songs': len(self._music_graph.get_all_traits())}
+
+    async def _get_stats(self, _query: dict[str, str], _body: bytes) -> dict:
+        """Answer a /stats request."""
+        return {'cache': self._music_graph.get_cache_stats(), 'queries': self._music_graph.get_query_stats()}
+
+    async def _get_spotify_id(self, query: dict[str, str], _body: bytes) -> dict:
+        """Answer a /spotify_id request."""
+        track, artist = _get_parameter(query, 'track'), _get_parameter(query, 'artist')
+
+        def find() -> dict:
+            try:
+                return {'spotify_id': self._music_graph.get_spotify_id(track, artist)}
+            except ValueError as error:
+                raise ServiceError(404, str(error)) from error
+
+        return await self._coalesce(('spotify_id', track, artist), lambda: _run_now(find))
+
+    async def _get_recommendations(self, query: dict[str, str], _body: bytes) -> dict:
+        """Answer a /recommendations request."""
+        song_id = _get_parameter(query, 'song_id')
+        num_recs = _get_count(query.get('num_recs', '10'), 'num_recs')
+        hops = _get_count(query.get('hops', '1'), 'hops')
+        if not 1 <= hops <= MAX_HOPS:
+            raise ServiceError(400, f'hops must be between 1 and {MAX_HOPS}')
+        if song_id not in self._music_graph:
+            raise ServiceError(404, f'no song has the Spotify ID {song_id}')
+
+        def recommend() -> dict:
+            return {'recommendations': self._music_graph.get_recommendations(song_id, num_recs, hops)}
+
+        return await self._coalesce(('recommendations', song_id, num_recs, hops), lambda: _run_now(recommend))
+
+    async def _get_batch_recommendations(self, _query: dict[str, str], body: bytes) -> dict:
+        """Answer a /recommendations/batch request, with the worker pool."""
+        try:
+            request = json.loads(body)
+            seed_ids = [str(seed_id) for seed_id in request['seed_ids']]
+        except (ValueError, KeyError, TypeError) as error:
+            raise ServiceError(400, 'the body must be a JSON object with a list of seed_ids') from error
+
+        num_recs = _get_count(request.get('num_recs', 10), 'num_recs')
+        continuation = bool(request.get('continuation', False))
+        missing = [seed_id for seed_id in seed_ids if seed_id not in self._music_graph]
+        if missing:
+            raise ServiceError(404, f'no song has the Spotify ID {missing[0]}')
+
+        if self._batch_workers > 0:
+            call = (_recommend_batch_in_worker, seed_ids, num_recs, continuation)
+        else:
+            call = (_recommend_batch, self._music_graph, seed_ids, num_recs, continuation)
+        key = ('batch', tuple(seed_ids), num_recs, continuation)
+        recommendations = await self._coalesce(
+            key, lambda: asyncio.get_running_loop().run_in_executor(self._executor, *call))
+        return {'recommendations': recommendations}
+
+    async def _coalesce(self, key: tuple, start: Callable[[], Awaitable]) -> Any:
+        """Return the answer of the query with the given key, which start() starts answering,
+        unless an identical query is already being answered, in which case its answer is shared.
+
+        The answer keeps being computed for the other requests waiting for it even if the request
+        that started it goes away.
+        """
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(start())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._forget(key, future))
+
+        return await asyncio.shield(future)
+
+    def _forget(self, key: tuple, future: asyncio.Future) -> None:
+        """Stop sharing the answer of the query with the given key, if future is still its answer."""
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+
+# @check_contracts
+async def fetch_json(host: str, port: int, method: str, target: str, body: Any = None) -> tuple[int, Any]:
+    """Send one request to a RecommendationService at host and port, and return the status code
+    and JSON value of its answer. If body is not None, it is sent as JSON.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        writer.write(f'{method} {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n'
+                     f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n'.encode('latin-1') + data)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        headers = await _read_headers(reader)
+        answer = await reader.readexactly(int(headers.get('content-length', '0')))
+        return int(status_line.split()[1]), json.loads(answer)
+    finally:
+        writer.close()
+
+
+# @check_contracts
+async def run_service(data_dir: str, snapshot_dir: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                      batch_workers: int = 0) -> None:
+    """Load the MusicGraph for data_dir (see graph_snapshot.load_music_graph) and serve it until cancelled."""
+    service = RecommendationService(load_music_graph(data_dir, snapshot_dir), batch_workers)
+    await service.start(host, port)
+    try:
+        await service.serve_forever()
+    finally:
+        await service.stop()
+
+
+# @check_contracts
+async def _read_request(reader: asyncio.StreamReader) -> Optional[tuple[str, str, dict[str, str], bytes]]:
+    """Read an HTTP request from reader and return its method, target, headers (with lowercase
+    names) and body, or None if the connection was closed before a new request started.
+
+    Raise ServiceError if the request is malformed or its body is too large.
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise ServiceError(400, 'malformed request line')
+
+    headers = await _read_headers(reader)
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError as error:
+        raise ServiceError(400, 'malformed Content-Length') from error
+    if length > MAX_BODY_SIZE:
+        raise ServiceError(413, f'the body is larger than {MAX_BODY_SIZE} bytes')
+
+    return parts[0], parts[1], headers, await reader.readexactly(length)
+
+
+# @check_contracts
+async def _read_headers(reader: asyncio.StreamReader) -> dict[str, str]:
+    """Read HTTP headers from reader, up to the blank line that ends them, and return them with
+    lowercase names."""
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            return headers
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+# @check_contracts
+def _format_response(status: int, answer: Any, keep_alive: bool) -> bytes:
+    """Return the HTTP response with the given status code and JSON value answer."""
+    body = json.dumps(answer).encode('utf-8')
+    return (f'HTTP/1.1 {status} {STATUS_REASONS[status]}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+            ).encode('latin-1') + body
+
+
+# @check_contracts
+def _get_parameter(query: dict[str, str], name: str) -> str:
+    """Return the query parameter with the given name, raising ServiceError if it is missing."""
+    if name not in query:
+        raise ServiceError(400, f'missing query parameter: {name}')
+    return query[name]
+
+
+# @check_contracts
+def _get_count(value: Any, name: str) -> int:
+    """Return value (the parameter with the given name) as a non-negative int, raising
+    ServiceError if it is not one.
+
+    >>> _get_count('5', 'num_recs')
+    5
+    """
+    try:
+        count = int(value)
+    except (ValueError, TypeError) as error:
+        raise ServiceError(400, f'{name} must be an integer') from error
+    if count < 0:
+        raise ServiceError(400, f'{name} must not be negative')
+    return count
+
+
+# @check_contracts
+async def _run_now(function: Callable[[], Any]) -> Any:
+    """Return function(), called in the event loop (for queries that take too little time to be
+    worth sending to another thread or process)."""
+    return function()
+
+
+# @check_contracts
+def _recommend_batch(music_graph: MusicGraph, seed_ids: list[str], num_recs: int,
+                     continuation: bool) -> list[list[tuple[str, int]]]:
+    """Return the results of music_graph.recommend_batch as a list."""
+    return list(music_graph.recommend_batch(seed_ids, num_recs, continuation))
+
+
+# The reader of the shared MusicGraph of the service, in each of its worker processes.
+_worker_reader = None
+
+
+# @check_contracts
+def _init_worker(control_name: str) -> None:
+    """Set up a worker process of a RecommendationService to read the music graphs published by the
+    SharedGraphManager whose control segment has the given name."""
+    global _worker_reader
+    _worker_reader = SharedGraphReader(control_name)
+
+
+# @check_contracts
+def _recommend_batch_in_worker(seed_ids: list[str], num_recs: int, continuation: bool) -> list[list[tuple[str, int]]]:
+    """Return the results of recommend_batch for the current music graph of this worker process."""
+    return _recommend_batch(_worker_reader.get_graph(), seed_ids, num_recs, continuation)
+
+
+# @check_contracts
+def main(argv: list[str]) -> int:
+    """Serve the MusicGraph of the data directory given by the command-line arguments argv until
+    interrupted, and return the exit status."""
+    parser = argparse.ArgumentParser(description='Serve MusicMapper recommendations over HTTP/JSON.')
+    parser.add_argument('--data', default='data', help='the data directory to build the graph from')
+    parser.add_argument('--snapshot', default='data_snapshot', help='the directory of the saved snapshot')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='the address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='the port to listen on')
+    parser.add_argument('--batch-workers', type=int, default=0, help='number of processes for batch queries')
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(run_service(args.data, args.snapshot, args.host, args.port, args.batch_workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    # with command-line arguments, run the service; without, check this module like every other one
+    if len(sys.argv) > 1:
+        sys.exit(main(sys.argv[1:]))
+
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['argparse', 'asyncio', 'json', 'sys', 'concurrent.futures', 'typing', 'urllib.parse',
+                          'graph_snapshot', 'music_graph', 'shared_graph'],
+        'allowed-io': [],
+        'max-line-length': 120
+    })
@@ -0,0 +1,271 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the SharedGraphManager and SharedGraphReader classes, which share a
+MusicGraph between processes through multiprocessing.shared_memory segments, so that several
+worker processes can answer queries about the same graph without each holding a private copy of
+its arrays.
+
+Each published graph (a "generation") is a single segment holding every array returned by
+MusicGraph.to_arrays (the trait matrix, the encoded ID and name tables, and the adjacency or
+incidence arrays), after a JSON header describing where each array is. A reader builds its
+MusicGraph with MusicGraph.from_arrays over read-only views of the segment, so the arrays are never
+copied: only the Python lists and dictionaries of Spotify IDs and names are decoded by each reader,
+just like when a snapshot is loaded (see graph_snapshot).
+
+A second, fixed-size control segment names the segment of the current generation. Publishing a
+new graph writes its segment, points the control segment to it, and unlinks the segment of the
+previous generation. A reader checks the control segment whenever it is asked for the graph, and
+swaps the new generation in when there is one, so the workers never need to be restarted. Since
+an unlinked segment stays mapped until every process that attached to it closes it, the readers
+that are still answering a query about the previous generation are not disturbed.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import json
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Optional
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+from music_graph import MusicGraph
+
+# The number of bytes of the control segment that hold the name of the current generation's segment.
+MAX_NAME_LENGTH = 248
+
+# The alignment (in bytes) of every array in a generation's segment.
+ALIGNMENT = 64
+
+# The number of bytes at the start of a generation's segment that hold the length of its header.
+HEADER_LENGTH_SIZE = 8
+
+
+# @check_contracts
+class SharedGraphManager:
+    """The owner of the shared memory segments of the graphs published to a group of readers.
+
+    A manager can be used as a context manager, which closes it on exit.
+
+    Instance Attributes:
+        - control_name: The name of the control segment, which readers attach to (see SharedGraphReader).
+        - generation: The number of graphs published so far.
+
+    Representation Invariants:
+        - self.generation >= 0
+        - (self.generation == 0) == (self._segment is None)
+    """
+    control_name: str
+    generation: int
+    # Private Instance Attributes:
+    #     - _control:
+    #         The control segment. It holds an int64 sequence number, which is odd while the name
+    #         is being written and 2 * generation otherwise, followed by the null-padded name of
+    #         the segment of the current generation.
+    #     - _segment:
+    #         The segment of the current generation, or None if no graph was published yet.
+    _control: SharedMemory
+    _segment: Optional[SharedMemory]
+
+    def __init__(self) -> None:
+        """Initialize a manager with a new control segment and no published graph."""
+        self._control = SharedMemory(create=True, size=HEADER_LENGTH_SIZE + MAX_NAME_LENGTH)
+        self._control.buf[:] = bytes(len(self._control.buf))
+        self.control_name = self._control.name
+        self.generation = 0
+        self._segment = None
+
+    def __enter__(self) -> SharedGraphManager:
+        """Return this manager."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close this manager."""
+        self.close()
+
+    def publish(self, music_graph: MusicGraph) -> int:
+        """Copy music_graph into a new segment, make it the current generation, and return the
+        number of that generation. The segment of the previous generation is unlinked.
+        """
+        segment = _create_segment(music_graph.to_arrays())
+        name = segment.name.encode('ascii')
+
+        # the sequence number is odd while the name is written, so a reader never uses half a name
+        sequence = numpy.ndarray((1,), dtype=numpy.int64, buffer=self._control.buf)
+        sequence[0] += 1
+        self._control.buf[HEADER_LENGTH_SIZE:] = name.ljust(MAX_NAME_LENGTH, b'\x00')
+        sequence[0] += 1
+        del sequence
+
+        if self._segment is not None:
+            _release(self._segment)
+        self._segment = segment
+        self.generation += 1
+        return self.generation
+
+    def close(self) -> None:
+        """Unlink the segment of the current generation and the control segment.
+
+        Readers that are still attached keep their graph, but cannot swap a new generation in.
+        """
+        if self._segment is not None:
+            _release(self._segment)
+            self._segment = None
+        _release(self._control)
+
+
+# @check_contracts
+class SharedGraphReader:
+    """A view of the graphs published by a SharedGraphManager, for a worker process.
+
+    Instance Attributes:
+        - generation: The generation of the graph this reader currently holds, or 0 if none.
+    """
+    generation: int
+    # Private Instance Attributes:
+    #     - _control:
+    #         The control segment of the manager.
+    #     - _segment:
+    #         The segment of the generation this reader holds, or None if it holds none.
+    #     - _music_graph:
+    #         The graph built over read-only views of _segment, or None if this reader holds none.
+    #     - _retired:
+    #         Segments of earlier generations that could not be closed yet, because some arrays
+    #         of their graphs were still in use when they were swapped out.
+    _control: SharedMemory
+    _segment: Optional[SharedMemory]
+    _music_graph: Optional[MusicGraph]
+    _retired: list[SharedMemory]
+
+    def __init__(self, control_name: str) -> None:
+        """Initialize a reader of the graphs published by the manager whose control segment has the
+        given name. No graph is attached until get_graph is called."""
+        self._control = SharedMemory(name=control_name)
+        self.generation = 0
+        self._segment = None
+        self._music_graph = None
+        self._retired = []
+
+    def get_graph(self) -> MusicGraph:
+        """Return the graph of the current generation, attaching to its segment first if a new
+        generation was published since the last call.
+
+        Raise ValueError if no graph has been published yet.
+        """
+        while True:
+            generation, name = self._read_control()
+            if generation == 0:
+                raise ValueError('no music graph has been published yet')
+            if generation == self.generation:
+                return self._music_graph
+
+            try:
+                segment = SharedMemory(name=name)
+            except FileNotFoundError:
+                # the generation was replaced (and its segment unlinked) since the control was read
+                continue
+
+            old_segment = self._segment
+            self._segment, self._music_graph = segment, MusicGraph.from_arrays(_get_arrays(segment))
+            self.generation = generation
+            if old_segment is not None:
+                self._retired.append(old_segment)
+            self._close_retired()
+
+    def close(self) -> None:
+        """Drop the graph of this reader and close every segment it attached to."""
+        self._music_graph = None
+        if self._segment is not None:
+            self._retired.append(self._segment)
+            self._segment = None
+        self._close_retired()
+        self._control.close()
+
+    def _read_control(self) -> tuple[int, str]:
+        """Return the generation and the segment name that the control segment currently holds."""
+        sequence = numpy.ndarray((1,), dtype=numpy.int64, buffer=self._control.buf)
+        try:
+            while True:
+                before = int(sequence[0])
+                name = bytes(self._control.buf[HEADER_LENGTH_SIZE:]).rstrip(b'\x00').decode('ascii')
+                if before % 2 == 0 and int(sequence[0]) == before:
+                    return before // 2, name
+        finally:
+            del sequence
+
+    def _close_retired(self) -> None:
+        """Close the retired segments whose arrays are no longer in use."""
+        still_used = []
+        for segment in self._retired:
+            try:
+                segment.close()
+            except BufferError:
+                still_used.append(segment)
+        self._retired = still_used
+
+
+# @check_contracts
+def _create_segment(arrays: dict[str, numpy.ndarray]) -> SharedMemory:
+    """Return a new shared memory segment holding the given arrays, after a JSON header mapping the
+    name of each array to its (offset, dtype, shape) in the segment.
+
+    Preconditions:
+        - all(array.dtype.kind in 'biuf' for array in arrays.values())
+    """
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = (offset, array.dtype.str, list(array.shape))
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = json.dumps(layout).encode('utf-8')
+    start = -(-(HEADER_LENGTH_SIZE + len(header)) // ALIGNMENT) * ALIGNMENT
+    segment = SharedMemory(create=True, size=max(start + offset, 1))
+    segment.buf[:HEADER_LENGTH_SIZE] = len(header).to_bytes(HEADER_LENGTH_SIZE, 'little')
+    segment.buf[HEADER_LENGTH_SIZE:HEADER_LENGTH_SIZE + len(header)] = header
+
+    for name, array in arrays.items():
+        view = numpy.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf, offset=start + layout[name][0])
+        view[...] = array
+        del view
+    return segment
+
+
+# @check_contracts
+def _get_arrays(segment: SharedMemory) -> dict[str, numpy.ndarray]:
+    """Return read-only views of the arrays in a segment written by _create_segment."""
+    header_length = int.from_bytes(segment.buf[:HEADER_LENGTH_SIZE], 'little')
+    layout = json.loads(bytes(segment.buf[HEADER_LENGTH_SIZE:HEADER_LENGTH_SIZE + header_length]))
+    start = -(-(HEADER_LENGTH_SIZE + header_length) // ALIGNMENT) * ALIGNMENT
+
+    arrays = {}
+    for name, (offset, dtype, shape) in layout.items():
+        arrays[name] = numpy.ndarray(tuple(shape), dtype=numpy.dtype(dtype), buffer=segment.buf, offset=start + offset)
+        arrays[name].flags.writeable = False
+    return arrays
+
+
+# @check_contracts
+def _release(segment: SharedMemory) -> None:
+    """Close and unlink a segment created by this process."""
+    segment.close()
+    segment.unlink()
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'multiprocessing.shared_memory', 'typing', 'numpy', 'music_graph'],
+        'allowed-io': [],
+        'max-line-length': 120
+    })
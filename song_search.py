@@ -0,0 +1,268 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains the SongSearchIndex class, which is used to search the songs of a
+MusicGraph by (partial, possibly misspelled) track or artist name, for example to autocomplete
+the song entered in the GUI.
+
+A search first looks for names that start with the query in a sorted array of normalized names
+(whole track names, each word of a track name onwards, and artist names), using binary search.
+If that does not find enough songs (for example, none, because of a typo in any word of the
+query), it falls back to a trigram index, which finds names that
+share most of their three-character substrings with the query, so that typos are tolerated. Each
+distinct track or artist name is scored on its own, by the fraction of the query's trigrams it
+shares, and a song is scored by its best name, so that songs credited to many artists do not
+match every query.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import bisect
+import unicodedata
+from typing import Sequence
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+
+# The kinds of names in the prefix index, and the score a prefix match of each kind is given.
+# An exact match of a whole name scores one more than a prefix match of the same kind. An artist
+# name outscores a word of a track name, so that songs by an artist rank above songs featuring them.
+TRACK_NAME, TRACK_WORD, ARTIST_NAME = 0, 1, 2
+PREFIX_SCORES = numpy.array([4.0, 2.0, 3.0])
+
+# The most entries of the prefix index a single search looks at, so that very short queries
+# (which match a large part of the index) stay fast.
+MAX_PREFIX_CANDIDATES = 2000
+
+# The longest posting of the trigram index a search finds candidate names in. The names that only
+# share such common trigrams with the query are not found, but the common trigrams still count
+# towards the similarity of the names found through the other trigrams.
+MAX_TRIGRAM_POSTINGS = 20000
+
+# The smallest fraction of the trigrams of the query a single name must share to be a fuzzy match.
+MIN_TRIGRAM_SIMILARITY = 0.4
+
+
+# @check_contracts
+class SongSearchIndex:
+    """An index for searching songs by track name and artist name.
+
+    Representation Invariants:
+        - len(self._track_names) == len(self._artist_names) == len(self._ids)
+        - len(self._name_indptr) == len(self._name_trigram_counts) + 1
+        - self._prefix_keys == sorted(self._prefix_keys)
+        - len(self._prefix_keys) == len(self._prefix_songs) == len(self._prefix_kinds)
+    """
+    # Private Instance Attributes:
+    #     - _ids, _track_names, _artist_names:
+    #         The Spotify ID, track name and artist name(s) of each song, by index.
+    #     - _track_lengths:
+    #         The length of the track name of each song, by index, used to break ties between matches.
+    #     - _prefix_keys:
+    #         The sorted normalized names in the prefix index.
+    #     - _prefix_songs, _prefix_kinds:
+    #         The index of the song each name in _prefix_keys belongs to, and which kind of name it is.
+    #     - _name_trigram_counts:
+    #         The number of trigrams of each distinct normalized track or artist name, by name index.
+    #     - _name_indptr, _name_songs:
+    #         The indices of the songs with each name are
+    #         _name_songs[_name_indptr[name]:_name_indptr[name + 1]], in increasing order.
+    #     - _trigrams:
+    #         Maps each trigram to a sorted array of the indices of the names that contain it.
+    _ids: list[str]
+    _track_names: list[str]
+    _artist_names: list[Sequence[str]]
+    _track_lengths: numpy.ndarray
+    _prefix_keys: list[str]
+    _prefix_songs: numpy.ndarray
+    _prefix_kinds: numpy.ndarray
+    _name_trigram_counts: numpy.ndarray
+    _name_indptr: numpy.ndarray
+    _name_songs: numpy.ndarray
+    _trigrams: dict[str, numpy.ndarray]
+
+    def __init__(self, ids: list[str], track_names: list[str], artist_names: list[Sequence[str]]) -> None:
+        """Initialize a search index of the songs with the given Spotify IDs, track names and
+        artist names (by index).
+
+        Preconditions:
+            - len(ids) == len(track_names) == len(artist_names)
+        """
+        self._ids = ids
+        self._track_names = track_names
+        self._artist_names = artist_names
+        self._track_lengths = numpy.array([len(name) for name in track_names], dtype=numpy.int32)
+
+        entries = []
+        name_indices = {}  # maps each distinct normalized name to its index
+        name_trigram_counts = []
+        pairs = []  # the (name index, song index) pairs
+        trigram_names = {}
+        for i in range(len(ids)):
+            track_name = normalize_name(track_names[i])
+            names = [track_name] + [normalize_name(name) for name in artist_names[i]]
+
+            entries.append((track_name, i, TRACK_NAME))
+            word_starts = [k + 1 for k in range(len(track_name)) if track_name[k] == ' ']
+            entries.extend((track_name[k:], i, TRACK_WORD) for k in word_starts)
+            entries.extend((name, i, ARTIST_NAME) for name in names[1:])
+
+            for name in names:
+                if name not in name_indices:
+                    name_indices[name] = len(name_indices)
+                    trigrams = _get_trigrams(name)
+                    name_trigram_counts.append(len(trigrams))
+                    for trigram in trigrams:
+                        trigram_names.setdefault(trigram, []).append(name_indices[name])
+                pairs.append((name_indices[name], i))
+
+        entries.sort()
+        self._prefix_keys = [entry[0] for entry in entries]
+        self._prefix_songs = numpy.array([entry[1] for entry in entries], dtype=numpy.int32)
+        self._prefix_kinds = numpy.array([entry[2] for entry in entries], dtype=numpy.int8)
+        self._trigrams = {trigram: numpy.array(names, dtype=numpy.int32)
+                          for trigram, names in trigram_names.items()}
+
+        pairs = numpy.unique(numpy.array(pairs, dtype=numpy.int32).reshape(-1, 2), axis=0)
+        self._name_trigram_counts = numpy.array(name_trigram_counts, dtype=numpy.int32)
+        self._name_indptr = numpy.zeros(len(name_indices) + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(pairs[:, 0], minlength=len(name_indices)), out=self._name_indptr[1:])
+        self._name_songs = numpy.ascontiguousarray(pairs[:, 1])
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[str, str, list[str]]]:
+        """Return up to limit songs that best match query, as (spotify_id, track name, artist names)
+        tuples, best match first.
+
+        Songs with a track name, an artist name, or a word of a track name that starts with the
+        query rank first (in that order, with exact matches before prefix matches). If there are
+        fewer than limit of them, they are followed by songs whose names share most of their
+        trigrams with the query, however many words it has. Ties are broken by shorter track name,
+        then by index.
+
+        >>> index = SongSearchIndex(['a', 'b', 'c'],
+        ...                         ['Nothing Breaks Like a Heart (feat. Miley Cyrus)', 'Flowers', 'Blinding Lights'],
+        ...                         [['Mark Ronson'], ['Miley Cyrus'], ['The Weeknd']])
+        >>> [track_name for _, track_name, _ in index.search('Miley')]
+        ['Flowers', 'Nothing Breaks Like a Heart (feat. Miley Cyrus)']
+        >>> [track_name for _, track_name, _ in index.search('blinding ligths')]
+        ['Blinding Lights']
+
+        Preconditions:
+            - limit >= 0
+        """
+        query = normalize_name(query)
+        if query == '' or limit == 0:
+            return []
+
+        songs, scores = self._search_prefixes(query)
+        if len(songs) < limit:
+            fuzzy_songs, similarities = self._search_trigrams(query)
+            new = ~numpy.isin(fuzzy_songs, songs)
+            songs = numpy.concatenate([songs, fuzzy_songs[new]])
+            scores = numpy.concatenate([scores, similarities[new]])
+
+        best = numpy.lexsort((songs, self._track_lengths[songs], -scores))[:limit]
+        return [(self._ids[i], self._track_names[i], list(self._artist_names[i])) for i in songs[best].tolist()]
+
+    def _search_prefixes(self, query: str) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the indices of the songs with a name starting with query, and the score of the best
+        such name of each song."""
+        # every name that starts with query sorts between query and query followed by the last code point
+        start = bisect.bisect_left(self._prefix_keys, query)
+        end = min(bisect.bisect_left(self._prefix_keys, query + '\U0010ffff', lo=start),
+                  start + MAX_PREFIX_CANDIDATES)
+
+        # names equal to query sort before all the other names that start with it
+        exact_end = start
+        while exact_end < end and self._prefix_keys[exact_end] == query:
+            exact_end += 1
+
+        scores = PREFIX_SCORES[self._prefix_kinds[start:end]]
+        scores[:exact_end - start] += 1.0
+        return _best_per_song(self._prefix_songs[start:end], scores)
+
+    def _search_trigrams(self, query: str) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the indices of the songs with a name that shares at least MIN_TRIGRAM_SIMILARITY of
+        the query's trigrams, and the highest such fraction of each song.
+
+        Only the names sharing a trigram whose posting is not longer than MAX_TRIGRAM_POSTINGS with
+        the query are found, but all the trigrams they share with the query count.
+        """
+        query_trigrams = _get_trigrams(query)
+        postings = [self._trigrams[t] for t in query_trigrams if t in self._trigrams]
+        short = [posting for posting in postings if len(posting) <= MAX_TRIGRAM_POSTINGS]
+        if not short:
+            return numpy.zeros(0, dtype=numpy.int32), numpy.zeros(0)
+
+        names, shared = numpy.unique(numpy.concatenate(short), return_counts=True)
+        for posting in postings:
+            if len(posting) > MAX_TRIGRAM_POSTINGS:
+                positions = numpy.minimum(numpy.searchsorted(posting, names), len(posting) - 1)
+                shared += posting[positions] == names
+
+        similarities = shared / len(query_trigrams)
+        matches = similarities >= MIN_TRIGRAM_SIMILARITY
+        names, similarities = names[matches], similarities[matches]
+
+        # expand each matching name to its songs
+        starts, ends = self._name_indptr[names], self._name_indptr[names + 1]
+        lengths = ends - starts
+        offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        songs = self._name_songs[numpy.repeat(starts, lengths) + offsets]
+        return _best_per_song(songs, numpy.repeat(similarities, lengths))
+
+
+# @check_contracts
+def _best_per_song(songs: numpy.ndarray, scores: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Return the distinct values in songs, and for each one, the highest of its scores.
+
+    >>> _best_per_song(numpy.array([3, 1, 3]), numpy.array([1.0, 2.0, 5.0]))
+    (array([1, 3]), array([2., 5.]))
+    """
+    order = numpy.lexsort((-scores, songs))
+    songs, scores = songs[order], scores[order]
+    first = numpy.ones(len(songs), dtype=bool)
+    first[1:] = songs[1:] != songs[:-1]
+    return songs[first], scores[first]
+
+
+# @check_contracts
+def normalize_name(name: str) -> str:
+    """Return name in the form used to look up songs by name: Unicode-normalized, case-folded, and
+    with runs of whitespace replaced by single spaces.
+
+    >>> normalize_name('  Die For  You - REMIX ')
+    'die for you - remix'
+    """
+    return ' '.join(unicodedata.normalize('NFKC', name).casefold().split())
+
+
+# @check_contracts
+def _get_trigrams(name: str) -> set[str]:
+    """Return the set of trigrams of name, padded with spaces so that its start and end count.
+
+    >>> sorted(_get_trigrams('abc'))
+    ['  a', ' ab', 'abc', 'bc ']
+    """
+    padded = '  ' + name + ' '
+    return {padded[k:k + 3] for k in range(len(padded) - 2)}
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['bisect', 'unicodedata', 'typing', 'numpy'],
+        'allowed-io': [],
+        'max-line-length': 120
+    })
@@ -0,0 +1,126 @@
+"""CSC111 Winter 2023 Course Project: MusicMapper
+===============================
+This module contains generate_dataset, which writes a synthetic data directory of playlist CSV
+files in the format created by Exportify.net (see build_music_graph), for benchmarking
+MusicMapper on data sets of any size.
+
+Each genre subfolder has its own pool of songs, and a fraction of every playlist (the overlap) is
+drawn from a pool of songs shared by all the genres instead, like the songs of the real data set
+that are in several genres' playlists. The numerical traits of each genre's songs are drawn around
+the genre's own means, so that standardizing each subfolder does real work.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of the CSC111
+community at the University of Toronto St. George campus.
+
+This file is Copyright (c) 2023 Yibing Ju, Jiya Patel, Pranav Rao, and Bruce Liu.
+"""
+from __future__ import annotations
+
+import csv
+import os
+from typing import Optional
+
+import numpy
+
+# from python_ta.contracts import check_contracts
+
+# The header row of an Exportify.net playlist CSV file.
+HEADER = ['Spotify ID', 'Artist IDs', 'Track Name', 'Album Name', 'Artist Name(s)', 'Release Date', 'Duration (ms)',
+          'Popularity', 'Added By', 'Added At', 'Genres', 'Danceability', 'Energy', 'Key', 'Loudness', 'Mode',
+          'Speechiness', 'Acousticness', 'Instrumentalness', 'Liveness', 'Valence', 'Tempo', 'Time Signature']
+
+# The characters of Spotify IDs.
+ID_CHARACTERS = numpy.array(list('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+
+# The words that track and artist names are made of.
+WORDS = ['love', 'night', 'summer', 'dance', 'heart', 'fire', 'blue', 'gold', 'dream', 'city', 'rain', 'star',
+         'wild', 'young', 'fade', 'light', 'run', 'home', 'sky', 'river', 'echo', 'neon', 'sugar', 'ghost']
+
+# The number of artists in each genre.
+ARTISTS_PER_GENRE = 50
+
+
+# @check_contracts
+def generate_dataset(data_dir: str, num_genres: int = 5, playlists_per_genre: int = 5, playlist_size: int = 50,
+                     overlap: float = 0.2, songs_per_genre: Optional[int] = None, seed: int = 0) -> list[str]:
+    """Write a synthetic data directory to data_dir and return the paths of its CSV files.
+
+    data_dir gets num_genres subfolders, each with playlists_per_genre playlists of playlist_size
+    songs. On average, a fraction overlap of the songs of each playlist come from the pool of songs
+    shared by all the genres, and the rest from the genre's own pool. Both kinds of pools have
+    songs_per_genre songs, which defaults to half the number of song slots of a genre, so songs
+    also repeat between the playlists of a genre. The data set only depends on the arguments.
+
+    Preconditions:
+        - num_genres >= 1 and playlists_per_genre >= 1 and playlist_size >= 1
+        - 0.0 <= overlap <= 1.0
+        - songs_per_genre is None or songs_per_genre >= playlist_size
+    """
+    rng = numpy.random.default_rng(seed)
+    if songs_per_genre is None:
+        songs_per_genre = max(playlist_size, playlists_per_genre * playlist_size // 2)
+
+    shared_pool = _make_songs(rng, songs_per_genre, 'shared', rng.normal(size=11))
+    csv_files = []
+
+    for genre in range(num_genres):
+        genre_name = f'genre_{genre}'
+        genre_pool = _make_songs(rng, songs_per_genre, genre_name, rng.normal(size=11))
+        os.makedirs(os.path.join(data_dir, genre_name), exist_ok=True)
+
+        for playlist in range(playlists_per_genre):
+            from_shared = rng.random(playlist_size) < overlap
+            rows = [shared_pool[k] for k in rng.choice(songs_per_genre, int(from_shared.sum()), replace=False)] + \
+                   [genre_pool[k] for k in rng.choice(songs_per_genre, int((~from_shared).sum()), replace=False)]
+            rows = [rows[k] for k in rng.permutation(len(rows))]
+
+            csv_path = os.path.join(data_dir, genre_name, f'playlist_{playlist}.csv')
+            with open(csv_path, 'w', encoding='utf-8-sig', newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(HEADER)
+                writer.writerows(rows)
+            csv_files.append(csv_path)
+
+    return csv_files
+
+
+# @check_contracts
+def _make_songs(rng: numpy.random.Generator, num_songs: int, pool_name: str, means: numpy.ndarray) -> list[list]:
+    """Return num_songs random CSV rows of songs whose numerical traits (other than popularity and
+    the whole-number ones) are drawn around the given means, for the pool with the given name."""
+    ids = [''.join(chars) for chars in rng.choice(ID_CHARACTERS, (num_songs, 22))]
+    artists = [' '.join(rng.choice(WORDS, 2)).title() + f' {pool_name} {k}' for k in range(ARTISTS_PER_GENRE)]
+    features = 1.0 / (1.0 + numpy.exp(-(means + rng.normal(scale=0.7, size=(num_songs, 11)))))
+
+    rows = []
+    for k in range(num_songs):
+        song_artists = [artists[a] for a in rng.choice(ARTISTS_PER_GENRE, 1 + int(rng.random() < 0.3), replace=False)]
+        track_name = ' '.join(rng.choice(WORDS, 1 + int(rng.integers(3)))).title() + f' {k}'
+        danceability, energy, loudness, speechiness, acousticness, instrumentalness, liveness, valence, tempo, \
+            _, _ = features[k].tolist()
+        rows.append([
+            ids[k], '', track_name, track_name, ','.join(song_artists), '2023-01-01', int(rng.integers(120000, 300000)),
+            int(rng.integers(0, 101)), 'spotify:user:', '2023-03-24T04:00:00Z', pool_name,
+            round(danceability, 3), round(energy, 3), int(rng.integers(12)), round(-30.0 + 28.0 * loudness, 3),
+            int(rng.integers(2)), round(0.5 * speechiness, 4), round(acousticness, 4), round(0.2 * instrumentalness, 6),
+            round(0.6 * liveness, 4), round(valence, 3), round(60.0 + 140.0 * tempo, 3), int(rng.integers(3, 6))
+        ])
+
+    return rows
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod(verbose=True)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['csv', 'os', 'typing', 'numpy'],
+        'allowed-io': ['generate_dataset'],
+        'max-line-length': 120,
+        'max-args': 7
+    })